@@ -4,7 +4,8 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import (
     Funil, Cliente, Tarefa, Atividade, Documento,
-    Email, Nota, Meta, Produto, Proposta, ItemProposta, Tag
+    Email, Nota, Meta, Produto, Proposta, ItemProposta, Tag,
+    ProcessamentoRelatorio, PerfilRequisicao, UploadDocumento
 )
 
 
@@ -59,7 +60,7 @@ class FunilAdmin(admin.ModelAdmin):
 class ClienteAdmin(admin.ModelAdmin):
     list_display = [
         'nome', 'tipo_pessoa', 'empresa', 'telefone', 'email',
-        'funil', 'etapa', 'valor_estimado', 'probabilidade',
+        'funil', 'etapa', 'valor_estimado', 'probabilidade', 'score',
         'status_prazo', 'usuario', 'criado_em'
     ]
     list_filter = [
@@ -73,7 +74,7 @@ class ClienteAdmin(admin.ModelAdmin):
     readonly_fields = [
         'criado_em', 'atualizado_em',
         'data_entrada_etapa', 'ultimo_contato',
-        'tempo_na_etapa_display'
+        'tempo_na_etapa_display', 'score', 'score_revisar_em'
     ]
     filter_horizontal = ['tags']
     
@@ -110,7 +111,7 @@ class ClienteAdmin(admin.ModelAdmin):
         ('Informações Comerciais', {
             'fields': (
                 'valor_estimado', 'probabilidade',
-                'observacoes'
+                'score', 'score_revisar_em', 'observacoes'
             )
         }),
         ('Controle de Funil', {
@@ -367,7 +368,7 @@ class MetaAdmin(admin.ModelAdmin):
         'valor_alvo', 'valor_atual',
         'percentual_atingido_display', 'usuario'
     ]
-    list_filter = ['periodo', 'usuario', 'data_inicio']
+    list_filter = ['periodo', 'origem_valor', 'usuario', 'data_inicio']
     search_fields = ['nome', 'descricao']
     readonly_fields = ['criado_em']
     date_hierarchy = 'data_inicio'
@@ -377,7 +378,7 @@ class MetaAdmin(admin.ModelAdmin):
             'fields': ('nome', 'descricao', 'periodo')
         }),
         ('Valores', {
-            'fields': ('valor_alvo', 'valor_atual')
+            'fields': ('valor_alvo', 'origem_valor', 'valor_atual')
         }),
         ('Período', {
             'fields': ('data_inicio', 'data_fim')
@@ -514,6 +515,36 @@ class PropostaAdmin(admin.ModelAdmin):
     valor_final_display.short_description = 'Valor Final'
 
 
+@admin.register(ProcessamentoRelatorio)
+class ProcessamentoRelatorioAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'usuario', 'status', 'progresso_display', 'criado_em', 'concluido_em', 'expira_em']
+    list_filter = ['status', 'tipo', 'criado_em']
+    search_fields = ['usuario__username', 'chave']
+    readonly_fields = ['chave', 'total_linhas', 'linhas_processadas', 'criado_em', 'iniciado_em', 'sinal_vida_em', 'concluido_em']
+    date_hierarchy = 'criado_em'
+    
+    def progresso_display(self, obj):
+        return f"{obj.progresso()}%"
+    progresso_display.short_description = 'Progresso'
+
+
+
+@admin.register(UploadDocumento)
+class UploadDocumentoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nome', 'cliente', 'usuario', 'recebido', 'tamanho', 'atualizado_em']
+    search_fields = ['nome', 'usuario__username', 'sha256']
+    readonly_fields = ['sha256', 'recebido', 'partes', 'criado_em', 'atualizado_em']
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'metodo', 'caminho', 'view', 'usuario', 'status', 'duracao_ms', 'amostras', 'criado_em']
+    list_filter = ['view', 'criado_em']
+    search_fields = ['caminho', 'usuario__username']
+    readonly_fields = ['criado_em']
+    date_hierarchy = 'criado_em'
+
+
 # Customização do Admin Site
 admin.site.site_header = "CRM Avançado - Administração"
 admin.site.site_title = "CRM Admin"
@@ -0,0 +1,488 @@
+"""
+Análises em lote sobre a carteira de clientes
+
+Em vez de avaliar um cliente por vez, as colunas necessárias são lidas
+uma única vez com values_list e os cálculos (horas na etapa, prazo,
+score, próxima ação) são feitos de forma vetorizada com pandas/NumPy
+sobre toda a população. analisar_cliente aplica as mesmas regras a um
+único cliente em Python puro, para as gravações individuais.
+"""
+
+import math
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Funil
+
+
+# Prazo usado quando a etapa não tem prazo configurado (ver Funil.get_prazo_etapa)
+PRAZO_PADRAO = 24
+
+# Atraso, em horas, a partir do qual o cliente é considerado crítico
+ATRASO_CRITICO = 72
+
+# Antecedência, em horas, para alertar sobre prazo prestes a vencer
+ALERTA_PRAZO = 12
+
+# Score: SCORE_BASE mais os pontos abaixo, limitado a SCORE_MAXIMO. As
+# regras valem para analisar_quadro (lote) e analisar_cliente (um cliente)
+SCORE_BASE = 50
+SCORE_MAXIMO = 100
+
+# Pontos pelo valor do negócio: (valor estimado acima de, pontos), da maior faixa para a menor
+PONTOS_VALOR = [(50000, 20), (20000, 10)]
+
+# Pontos por atraso: acima de ATRASO_CRITICO horas, ou qualquer atraso
+PONTOS_ATRASO_CRITICO = 30
+PONTOS_ATRASADO = 15
+
+# Pontos pelo avanço no funil: posição / total de etapas * PONTOS_AVANCO, arredondado para baixo
+PONTOS_AVANCO = 20
+
+# Bônus de score por contato recente: (dias desde o último contato, pontos)
+BONUS_CONTATO = [(7, 10), (30, 5)]
+
+COLUNAS_CLIENTE = ['id', 'funil_id', 'etapa', 'data_entrada_etapa', 'valor_estimado', 'ultimo_contato']
+
+# Próximas ações, na ordem de prioridade em que são avaliadas
+ACOES = [
+    {'codigo': 'ultima_etapa', 'prioridade': 'ALTA', 'acao': 'Registrar como cliente ativo'},
+    {'codigo': 'atraso_critico', 'prioridade': 'CRÍTICA', 'acao': 'Contato urgente ou marcar como perdido'},
+    {'codigo': 'atrasado', 'prioridade': 'ALTA', 'acao': 'Entrar em contato'},
+    {'codigo': 'prazo_proximo', 'prioridade': 'MÉDIA', 'acao': 'Acompanhar progresso'},
+    {'codigo': 'normal', 'prioridade': 'BAIXA', 'acao': 'Acompanhamento normal'},
+]
+
+
+def quadro_etapas(funis):
+    """
+    Tabela (funil, etapa) com prazo e posição de cada etapa
+
+    Args:
+        funis: Iterable de Funil
+
+    Returns:
+        DataFrame: colunas funil_id, etapa, prazo, posicao, total_etapas
+    """
+    linhas = []
+    for funil in funis:
+        total = len(funil.etapas)
+        for posicao, etapa in enumerate(funil.etapas):
+            linhas.append((funil.id, etapa, funil.prazos.get(etapa, PRAZO_PADRAO), posicao, total))
+    return pd.DataFrame(linhas, columns=['funil_id', 'etapa', 'prazo', 'posicao', 'total_etapas'])
+
+
+def _para_datetime(valor):
+    """Timestamp do pandas (ou NaT) para datetime do Python (ou None)"""
+    return None if pd.isna(valor) else valor.to_pydatetime()
+
+
+def _tipar_quadro(quadro):
+    quadro['valor_estimado'] = quadro['valor_estimado'].astype(float)
+    quadro['data_entrada_etapa'] = pd.to_datetime(quadro['data_entrada_etapa'], utc=True)
+    quadro['ultimo_contato'] = pd.to_datetime(quadro['ultimo_contato'], utc=True)
+    return quadro
+
+
+def quadro_clientes(clientes):
+    """
+    Lê as colunas usadas nas análises de uma só vez
+
+    Args:
+        clientes: QuerySet de Cliente
+
+    Returns:
+        DataFrame: uma linha por cliente (ver COLUNAS_CLIENTE)
+    """
+    linhas = clientes.order_by().values_list(*COLUNAS_CLIENTE)
+    return _tipar_quadro(pd.DataFrame.from_records(list(linhas), columns=COLUNAS_CLIENTE))
+
+
+def quadro_instancias(clientes):
+    """
+    Monta o quadro a partir de clientes já carregados (ou ainda não salvos)
+
+    Args:
+        clientes: list de Cliente
+
+    Returns:
+        DataFrame: uma linha por cliente, na mesma ordem (ver COLUNAS_CLIENTE)
+    """
+    return _tipar_quadro(pd.DataFrame.from_records(
+        [tuple(getattr(cliente, coluna) for coluna in COLUNAS_CLIENTE) for cliente in clientes],
+        columns=COLUNAS_CLIENTE,
+    ))
+
+
+def analisar_quadro(quadro, etapas, agora=None):
+    """
+    Calcula prazo, score e próxima ação para todas as linhas do quadro
+
+    Args:
+        quadro: DataFrame de quadro_clientes
+        etapas: DataFrame de quadro_etapas com os funis envolvidos
+        agora: DateTime (opcional) - referência única para toda a população
+
+    Returns:
+        DataFrame: o quadro acrescido de horas_na_etapa, prazo, horas_restantes,
+        dentro_prazo, horas_atraso, score, score_revisar_em, codigo_acao,
+        prioridade e acao
+    """
+    agora = pd.Timestamp(agora or timezone.now())
+    quadro = quadro.merge(etapas, on=['funil_id', 'etapa'], how='left')
+
+    entrada = quadro['data_entrada_etapa']
+    horas = ((agora - entrada).dt.total_seconds() / 3600).fillna(0).to_numpy()
+    prazo = quadro['prazo'].fillna(PRAZO_PADRAO).to_numpy(dtype=float)
+    restantes = prazo - horas
+    # Prazo 0 significa etapa sem prazo (ver Cliente.esta_atrasado)
+    atrasado = (prazo > 0) & (restantes < 0)
+    atraso = np.where(atrasado, -restantes, 0.0)
+
+    quadro['horas_na_etapa'] = horas
+    quadro['prazo'] = prazo
+    quadro['horas_restantes'] = restantes
+    quadro['dentro_prazo'] = ~atrasado
+    quadro['horas_atraso'] = atraso
+
+    # Score: base 50 + valor do negócio + urgência do prazo + avanço no funil
+    # + contato recente
+    valor = quadro['valor_estimado'].to_numpy()
+    posicao = quadro['posicao'].to_numpy(dtype=float)
+    total_etapas = quadro['total_etapas'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avanco = np.nan_to_num(np.floor(posicao / total_etapas * PONTOS_AVANCO))
+    ultimo_contato = quadro['ultimo_contato']
+    dias_sem_contato = ((agora - ultimo_contato).dt.total_seconds() / 86400).to_numpy()
+    with np.errstate(invalid='ignore'):
+        contato = np.select(
+            [dias_sem_contato <= dias for dias, _ in BONUS_CONTATO],
+            [pontos for _, pontos in BONUS_CONTATO],
+            0,
+        )
+    score = (
+        SCORE_BASE
+        + np.select([valor > limite for limite, _ in PONTOS_VALOR], [pontos for _, pontos in PONTOS_VALOR], 0)
+        + np.select([atraso > ATRASO_CRITICO, atrasado], [PONTOS_ATRASO_CRITICO, PONTOS_ATRASADO], 0)
+        + avanco
+        + contato
+    )
+    quadro['score'] = np.minimum(score, SCORE_MAXIMO).astype(int)
+
+    # Próximo instante em que o score muda só pela passagem do tempo:
+    # vencimento do prazo, atraso crítico ou fim de uma faixa de contato
+    # recente. Vazio quando nada mais muda sem uma alteração no cliente.
+    # As contas são feitas em nanossegundos; datas vazias viram o maior int64.
+    sem_limite = np.iinfo(np.int64).max
+    hora = 3_600_000_000_000
+    agora_ns = agora.value
+
+    def _ns(serie):
+        valores = serie.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        return np.where(serie.isna().to_numpy(), sem_limite, valores)
+
+    entrada_ns = _ns(entrada)
+    contato_ns = _ns(ultimo_contato)
+    com_prazo = (prazo > 0) & (entrada_ns != sem_limite)
+    vencimento = entrada_ns + np.where(com_prazo, prazo, 0).astype(np.int64) * hora
+    limites = [
+        np.where(com_prazo, vencimento, sem_limite),
+        np.where(com_prazo, vencimento + ATRASO_CRITICO * hora, sem_limite),
+    ] + [
+        np.where(contato_ns != sem_limite, contato_ns + dias * 24 * hora, sem_limite)
+        for dias, _ in BONUS_CONTATO
+    ]
+    limites = np.stack(limites, axis=1)
+    proximo = np.where(limites >= agora_ns, limites, sem_limite).min(axis=1)
+    quadro['score_revisar_em'] = pd.to_datetime(
+        np.where(proximo == sem_limite, np.datetime64('NaT'), proximo.astype('datetime64[ns]')),
+        utc=True,
+    )
+
+    ultima_etapa = (posicao == total_etapas - 1)
+    indice_acao = np.select(
+        [ultima_etapa, atraso > ATRASO_CRITICO, atrasado, (prazo > 0) & (restantes < ALERTA_PRAZO)],
+        [0, 1, 2, 3],
+        4,
+    )
+    codigos = np.array([acao['codigo'] for acao in ACOES], dtype=object)
+    prioridades = np.array([acao['prioridade'] for acao in ACOES], dtype=object)
+    textos = np.array([acao['acao'] for acao in ACOES], dtype=object)
+    quadro['codigo_acao'] = codigos[indice_acao]
+    quadro['prioridade'] = prioridades[indice_acao]
+    quadro['acao'] = textos[indice_acao]
+
+    return quadro
+
+
+def analisar_clientes(clientes, agora=None):
+    """
+    Analisa um QuerySet inteiro de clientes
+
+    Args:
+        clientes: QuerySet de Cliente
+        agora: DateTime (opcional)
+
+    Returns:
+        DataFrame indexado pelo id do cliente (ver analisar_quadro)
+    """
+    quadro = quadro_clientes(clientes)
+    funis = Funil.objects.filter(id__in=quadro['funil_id'].unique().tolist())
+    return analisar_quadro(quadro, quadro_etapas(funis), agora).set_index('id')
+
+
+def analisar_cliente(cliente, agora=None):
+    """
+    Aplica as regras do lote a um único cliente já carregado
+
+    Mesmas contas e constantes de analisar_quadro, em Python puro: montar
+    um DataFrame para uma linha custaria mais do que a própria análise, e
+    isto roda a cada Cliente.save(). tests.AnaliseClienteTests confere que
+    os dois caminhos concordam.
+
+    Args:
+        cliente: Instância de Cliente
+        agora: DateTime (opcional)
+
+    Returns:
+        dict: As colunas calculadas por analisar_quadro, com score como int
+        e score_revisar_em como datetime (ou None)
+    """
+    agora = agora or timezone.now()
+    funil = cliente.funil
+    if cliente.etapa in funil.etapas:
+        prazo = float(funil.prazos.get(cliente.etapa, PRAZO_PADRAO))
+        posicao, total_etapas = funil.etapas.index(cliente.etapa), len(funil.etapas)
+    else:
+        prazo, posicao, total_etapas = float(PRAZO_PADRAO), None, None
+
+    entrada = cliente.data_entrada_etapa
+    horas = (agora - entrada).total_seconds() / 3600 if entrada else 0.0
+    restantes = prazo - horas
+    # Prazo 0 significa etapa sem prazo (ver Cliente.esta_atrasado)
+    atrasado = prazo > 0 and restantes < 0
+    atraso = -restantes if atrasado else 0.0
+
+    valor = float(cliente.valor_estimado or 0)
+    ultimo_contato = cliente.ultimo_contato
+    contato = 0
+    if ultimo_contato:
+        dias_sem_contato = (agora - ultimo_contato).total_seconds() / 86400
+        contato = next((pontos for dias, pontos in BONUS_CONTATO if dias_sem_contato <= dias), 0)
+    score = (
+        SCORE_BASE
+        + next((pontos for limite, pontos in PONTOS_VALOR if valor > limite), 0)
+        + (PONTOS_ATRASO_CRITICO if atraso > ATRASO_CRITICO else PONTOS_ATRASADO if atrasado else 0)
+        + (math.floor(posicao / total_etapas * PONTOS_AVANCO) if total_etapas else 0)
+        + contato
+    )
+
+    # Como em analisar_quadro, o prazo entra em horas inteiras
+    limites = []
+    if prazo > 0 and entrada:
+        vencimento = entrada + timedelta(hours=int(prazo))
+        limites += [vencimento, vencimento + timedelta(hours=ATRASO_CRITICO)]
+    if ultimo_contato:
+        limites += [ultimo_contato + timedelta(days=dias) for dias, _ in BONUS_CONTATO]
+    revisar_em = min((limite for limite in limites if limite >= agora), default=None)
+
+    if posicao is not None and posicao == total_etapas - 1:
+        acao = ACOES[0]
+    elif atraso > ATRASO_CRITICO:
+        acao = ACOES[1]
+    elif atrasado:
+        acao = ACOES[2]
+    elif prazo > 0 and restantes < ALERTA_PRAZO:
+        acao = ACOES[3]
+    else:
+        acao = ACOES[4]
+
+    return {
+        'horas_na_etapa': horas,
+        'prazo': prazo,
+        'horas_restantes': restantes,
+        'dentro_prazo': not atrasado,
+        'horas_atraso': atraso,
+        'score': min(score, SCORE_MAXIMO),
+        'score_revisar_em': revisar_em,
+        'codigo_acao': acao['codigo'],
+        'prioridade': acao['prioridade'],
+        'acao': acao['acao'],
+    }
+
+
+def descrever_acao(linha):
+    """
+    Texto explicativo da próxima ação de uma linha analisada
+
+    Args:
+        linha: dict ou Series com codigo_acao, horas_atraso e horas_restantes
+
+    Returns:
+        str
+    """
+    codigo = linha['codigo_acao']
+    if codigo == 'ultima_etapa':
+        return 'Cliente chegou na última etapa do funil'
+    if codigo in ('atraso_critico', 'atrasado'):
+        return f"Cliente atrasado há {linha['horas_atraso']:.0f} horas"
+    if codigo == 'prazo_proximo':
+        return f"Prazo vence em {linha['horas_restantes']:.0f} horas"
+    return f"{linha['horas_restantes']:.0f} horas restantes no prazo"
+
+
+
+def recalcular_scores(clientes, agora=None, tamanho_lote=50_000):
+    """
+    Recalcula score e score_revisar_em em lote, gravando só o que mudou
+
+    Os clientes são lidos em lotes por id para limitar a memória; cada
+    lote é analisado de forma vetorizada e apenas as linhas cujo score
+    ou próxima revisão mudou são atualizadas.
+
+    Args:
+        clientes: QuerySet de Cliente
+        agora: DateTime (opcional)
+        tamanho_lote: int
+
+    Returns:
+        tuple: (clientes analisados, clientes atualizados)
+    """
+    from .models import Cliente
+
+    agora = agora or timezone.now()
+    etapas = quadro_etapas(Funil.objects.filter(
+        id__in=clientes.order_by().values('funil_id').distinct()
+    ))
+    colunas = COLUNAS_CLIENTE + ['score', 'score_revisar_em']
+    analisados = atualizados = 0
+    ultimo_id = 0
+
+    while True:
+        linhas = list(
+            clientes.filter(id__gt=ultimo_id).order_by('id').values_list(*colunas)[:tamanho_lote]
+        )
+        if not linhas:
+            break
+        ultimo_id = linhas[-1][0]
+        analisados += len(linhas)
+
+        quadro = pd.DataFrame.from_records(linhas, columns=colunas)
+        quadro = quadro.rename(columns={'score': 'score_salvo', 'score_revisar_em': 'revisar_salvo'})
+        quadro['revisar_salvo'] = pd.to_datetime(quadro['revisar_salvo'], utc=True)
+        analise = analisar_quadro(_tipar_quadro(quadro), etapas, agora)
+
+        mudou = (analise['score'] != analise['score_salvo']) | ~(
+            (analise['score_revisar_em'] == analise['revisar_salvo'])
+            | (analise['score_revisar_em'].isna() & analise['revisar_salvo'].isna())
+        )
+        alterados = analise.loc[mudou, ['id', 'score', 'score_revisar_em']]
+        Cliente.objects.bulk_update(
+            [
+                Cliente(
+                    id=cliente_id,
+                    score=score,
+                    score_revisar_em=_para_datetime(revisar_em),
+                )
+                for cliente_id, score, revisar_em in alterados.itertuples(index=False)
+            ],
+            ['score', 'score_revisar_em'],
+            batch_size=1000,
+        )
+        atualizados += len(alterados)
+
+    return analisados, atualizados
+
+
+def atribuir_scores(clientes, etapas, agora=None):
+    """
+    Preenche score e score_revisar_em de vários clientes sem salvá-los
+
+    Usado antes de bulk_create, que não passa por Cliente.save().
+
+    Args:
+        clientes: list de Cliente
+        etapas: DataFrame de quadro_etapas com os funis dos clientes
+        agora: DateTime (opcional)
+    """
+    if not clientes:
+        return
+    analise = analisar_quadro(quadro_instancias(clientes), etapas, agora)
+    for cliente, score, revisar_em in zip(clientes, analise['score'], analise['score_revisar_em']):
+        cliente.score = int(score)
+        cliente.score_revisar_em = _para_datetime(revisar_em)
+
+
+# Ordem da fila de ações: score (que já soma atraso, avanço no funil e
+# contato recente), depois quem está há mais tempo sem contato e há mais
+# tempo na etapa. Coberta pelo índice crm_cliente_fila_acoes_idx, criado
+# com a mesma expressão (NULLS FIRST).
+ORDEM_FILA = ['-score', F('ultimo_contato').asc(nulls_first=True), 'data_entrada_etapa']
+
+
+def fila_acoes(usuario, pagina=1, por_pagina=25, funil_id=None, agora=None):
+    """
+    Clientes que mais precisam de atenção, já com a próxima ação sugerida
+
+    A ordenação usa o score persistido e indexado, então só a página pedida
+    é lida do banco. Os scores com revisão vencida são atualizados pelo
+    worker (processar_relatorios) ou pelo comando recalcular_scores, não
+    aqui: a consulta não grava nada.
+
+    Args:
+        usuario: User
+        pagina: int - a partir de 1
+        por_pagina: int
+        funil_id: int (opcional)
+        agora: DateTime (opcional)
+
+    Returns:
+        dict: total, pagina, por_pagina, paginas e itens
+    """
+    from .models import Cliente
+
+    agora = agora or timezone.now()
+    clientes = Cliente.objects.filter(usuario=usuario)
+    if funil_id:
+        clientes = clientes.filter(funil_id=funil_id)
+
+    total = clientes.count()
+    inicio = (pagina - 1) * por_pagina
+    pagina_clientes = list(
+        clientes.select_related('funil').order_by(*ORDEM_FILA)[inicio:inicio + por_pagina]
+    )
+
+    itens = []
+    if pagina_clientes:
+        funis = {cliente.funil_id: cliente.funil for cliente in pagina_clientes}
+        analise = analisar_quadro(quadro_instancias(pagina_clientes), quadro_etapas(funis.values()), agora)
+        for cliente, linha in zip(pagina_clientes, analise.to_dict('records')):
+            dias_sem_contato = None
+            if cliente.ultimo_contato:
+                dias_sem_contato = (agora - cliente.ultimo_contato).total_seconds() / 86400
+            itens.append({
+                'cliente_id': cliente.id,
+                'nome': cliente.nome,
+                'empresa': cliente.empresa,
+                'funil': cliente.funil.nome,
+                'etapa': cliente.etapa,
+                'score': cliente.score,
+                'horas_na_etapa': round(linha['horas_na_etapa'], 1),
+                'horas_atraso': round(linha['horas_atraso'], 1),
+                'dias_sem_contato': round(dias_sem_contato, 1) if dias_sem_contato is not None else None,
+                'prioridade': linha['prioridade'],
+                'acao': linha['acao'],
+                'descricao': descrever_acao(linha),
+            })
+
+    return {
+        'total': total,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': (total + por_pagina - 1) // por_pagina,
+        'itens': itens,
+    }
@@ -0,0 +1,178 @@
+"""
+Armazenamento dos documentos por conteúdo
+
+Cada arquivo é gravado uma única vez em documentos/conteudo/ab/cd/<sha256>;
+documentos com o mesmo conteúdo (a mesma proposta anexada a vários
+clientes) apontam para o mesmo arquivo. O número de referências é o número
+de Documentos com aquele arquivo.
+
+O arquivo que perde a última referência não é apagado na hora: um upload
+do mesmo conteúdo pode estar reaproveitando-o naquele instante. Ele só
+tem a data de modificação renovada, e remover_orfaos (worker
+processar_relatorios e comando deduplicar_documentos) apaga os arquivos
+sem documento há mais de CARENCIA_ORFAOS. Reaproveitar um arquivo também
+renova a data, então um arquivo em uso nunca está velho e sem referência
+ao mesmo tempo.
+
+O hash é calculado enquanto o upload chega, pelos upload handlers deste
+módulo (settings.FILE_UPLOAD_HANDLERS); arquivos vindos de outro lugar são
+lidos uma vez para o cálculo. Conteúdo já existente não é gravado de novo.
+"""
+
+import hashlib
+import os
+from datetime import timedelta
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.utils import timezone
+
+from .models import Documento
+
+
+PREFIXO = 'documentos/conteudo'
+
+# Tempo mínimo sem referência antes de o arquivo sair do storage
+CARENCIA_ORFAOS = timedelta(hours=1)
+
+
+class _HashUploadMixin:
+    """Calcula o SHA-256 dos blocos que o handler guarda e o anota no arquivo"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        repassado = super().receive_data_chunk(raw_data, start)
+        if repassado is None:
+            self.sha256.update(raw_data)
+        return repassado
+
+    def file_complete(self, file_size):
+        arquivo = super().file_complete(file_size)
+        if arquivo is not None:
+            arquivo.sha256 = self.sha256.hexdigest()
+        return arquivo
+
+
+class HashMemoriaUploadHandler(_HashUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashTemporarioUploadHandler(_HashUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def storage_documentos():
+    return Documento._meta.get_field('arquivo').storage
+
+
+def hash_conteudo(arquivo):
+    """SHA-256 de um File, lido em blocos"""
+    sha256 = hashlib.sha256()
+    arquivo.seek(0)
+    for bloco in arquivo.chunks():
+        sha256.update(bloco)
+    arquivo.seek(0)
+    return sha256.hexdigest()
+
+
+def caminho_conteudo(hash_sha256):
+    return f'{PREFIXO}/{hash_sha256[:2]}/{hash_sha256[2:4]}/{hash_sha256}'
+
+
+def _renovar(storage, nome):
+    """Atualiza a data de modificação do arquivo (storages locais)"""
+    try:
+        os.utime(storage.path(nome))
+    except (NotImplementedError, FileNotFoundError):
+        pass
+
+
+def conteudo_existente(hash_sha256, tamanho=None):
+    """
+    Nome do arquivo com esse conteúdo, se já está no storage
+
+    O arquivo tem a data renovada, para remover_orfaos não apagá-lo
+    enquanto o novo documento é gravado.
+
+    Returns:
+        str ou None
+    """
+    nome = caminho_conteudo(hash_sha256)
+    storage = storage_documentos()
+    if not storage.exists(nome) or (tamanho is not None and storage.size(nome) != tamanho):
+        return None
+    _renovar(storage, nome)
+    return nome
+
+
+def guardar_conteudo(arquivo):
+    """
+    Grava o conteúdo de um File no storage, se ainda não estiver lá
+
+    Returns:
+        tuple: (nome no storage, sha256, se o arquivo foi gravado agora)
+    """
+    hash_sha256 = getattr(arquivo, 'sha256', None) or hash_conteudo(arquivo)
+    existente = conteudo_existente(hash_sha256)
+    if existente:
+        return existente, hash_sha256, False
+    nome = caminho_conteudo(hash_sha256)
+    storage = storage_documentos()
+    arquivo.seek(0)
+    # Dois uploads simultâneos do mesmo conteúdo podem gerar um nome com
+    # sufixo; o documento continua correto, só sem compartilhar o arquivo
+    return storage.save(nome, arquivo), hash_sha256, True
+
+
+def liberar_conteudo(nome):
+    """
+    Chamado quando um documento deixa de usar o arquivo
+
+    Arquivos de conteúdo sem referência só têm a data renovada e ficam
+    para remover_orfaos; os de caminho antigo (documentos/%Y/%m/), que
+    nunca são reaproveitados, saem na hora.
+    """
+    if not nome or Documento.objects.filter(arquivo=nome).exists():
+        return
+    storage = storage_documentos()
+    if nome.startswith(f'{PREFIXO}/'):
+        _renovar(storage, nome)
+    else:
+        storage.delete(nome)
+
+
+def remover_orfaos(carencia=CARENCIA_ORFAOS):
+    """
+    Apaga os arquivos de conteúdo sem documento há mais de `carencia`
+
+    Returns:
+        int: Quantidade de arquivos removidos
+    """
+    storage = storage_documentos()
+    limite = timezone.now() - carencia
+    referenciados = set(
+        Documento.objects.filter(arquivo__startswith=f'{PREFIXO}/').values_list('arquivo', flat=True)
+    )
+    removidos = 0
+    pastas = [PREFIXO]
+    while pastas:
+        pasta = pastas.pop()
+        try:
+            subpastas, arquivos = storage.listdir(pasta)
+        except FileNotFoundError:
+            continue
+        pastas.extend(f'{pasta}/{subpasta}' for subpasta in subpastas)
+        for arquivo in arquivos:
+            nome = f'{pasta}/{arquivo}'
+            if nome in referenciados:
+                continue
+            # Referências conferidas antes da data: um reaproveitamento
+            # posterior à conferência já terá renovado a data
+            if Documento.objects.filter(arquivo=nome).exists():
+                continue
+            if storage.get_modified_time(nome) < limite:
+                storage.delete(nome)
+                removidos += 1
+    return removidos
@@ -0,0 +1,182 @@
+"""
+Registro de consultas lentas com o plano de execução
+
+Toda consulta feita durante uma requisição passa por um execute_wrapper;
+as que passam de settings.CRM_CONSULTAS_LENTAS_MS são agrupadas pela
+impressão digital do SQL (literais, parâmetros e listas de IN trocados
+por "?"). Na primeira ocorrência de cada impressão digital o plano é
+capturado (EXPLAIN QUERY PLAN no SQLite, EXPLAIN nos demais bancos).
+
+Os grupos ficam em um buffer circular em memória, com no máximo
+CRM_CONSULTAS_LENTAS_MAXIMO entradas: a consulta lenta vista há mais tempo
+sai primeiro. O buffer é por processo; com vários workers, cada um
+mostra as consultas que ele executou.
+"""
+
+import contextvars
+import hashlib
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from itertools import groupby
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+
+_requisicao = contextvars.ContextVar('requisicao_consultas_lentas', default=None)
+_explicando = contextvars.ContextVar('explicando_consulta', default=False)
+
+_trava = threading.Lock()
+_registro = OrderedDict()
+
+_LITERAIS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s|\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+# Trechos do plano que indicam leitura da tabela inteira
+_VARREDURA = re.compile(r'\bSCAN\b|Seq Scan')
+_CODIGO_PROJETO = str(Path(settings.BASE_DIR) / 'apps')
+# Camadas de medição que aparecem na pilha mas não originam consultas
+_IGNORADOS = ('consultas_lentas.py', 'instrumentacao.py', 'middleware.py')
+
+
+def impressao_digital(sql):
+    """SQL normalizado e seu hash curto"""
+    normalizado = sql
+    for padrao, troca in _LITERAIS:
+        normalizado = padrao.sub(troca, normalizado)
+    normalizado = normalizado.strip()
+    return hashlib.md5(normalizado.encode()).hexdigest()[:12], normalizado
+
+
+def _formato_parametros(params, many):
+    """Tipos dos parâmetros, sem os valores (ex.: "int, str×3")"""
+    if many:
+        return 'executemany'
+    if not params:
+        return ''
+    if isinstance(params, dict):
+        return ', '.join(f'{chave}: {type(valor).__name__}' for chave, valor in params.items())
+    tipos = [type(valor).__name__ for valor in params]
+    return ', '.join(
+        tipo if quantidade == 1 else f'{tipo}×{quantidade}'
+        for tipo, quantidade in ((tipo, len(list(grupo))) for tipo, grupo in groupby(tipos))
+    )
+
+
+def _origem_codigo():
+    """Última chamada dentro do código do projeto (arquivo:linha em função)"""
+    for quadro in reversed(traceback.extract_stack()):
+        if quadro.filename.startswith(_CODIGO_PROJETO) and not quadro.filename.endswith(_IGNORADOS):
+            return f'{Path(quadro.filename).relative_to(settings.BASE_DIR)}:{quadro.lineno} em {quadro.name}'
+    return None
+
+
+def _plano(conexao, sql, params):
+    """Plano de execução da consulta (só SELECT; o EXPLAIN não a executa)"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefixo = 'EXPLAIN QUERY PLAN ' if conexao.vendor == 'sqlite' else 'EXPLAIN '
+    token = _explicando.set(True)
+    try:
+        # Savepoint: um EXPLAIN com erro não pode estragar a transação da view
+        with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+            cursor.execute(prefixo + sql, params)
+            linhas = cursor.fetchall()
+    except DatabaseError as e:
+        return f'Erro ao obter o plano: {e}'
+    finally:
+        _explicando.reset(token)
+    return '\n'.join(str(linha[-1]) for linha in linhas)
+
+
+def _registrar(sql, params, many, duracao, conexao):
+    chave, normalizado = impressao_digital(sql)
+    request = _requisicao.get()
+    correspondencia = getattr(request, 'resolver_match', None)
+    with _trava:
+        entrada = _registro.get(chave)
+        if entrada is not None:
+            _registro.move_to_end(chave)
+    if entrada is None:
+        plano = None if many else _plano(conexao, sql, params)
+        entrada = {
+            'impressao_digital': chave,
+            'sql': normalizado,
+            'exemplo': sql,
+            'parametros': _formato_parametros(params, many),
+            'plano': plano,
+            'varredura': bool(plano and _VARREDURA.search(plano)),
+            'banco': conexao.alias,
+            'ocorrencias': 0,
+            'total_ms': 0.0,
+            'maximo_ms': 0.0,
+        }
+        with _trava:
+            entrada = _registro.setdefault(chave, entrada)
+            while len(_registro) > settings.CRM_CONSULTAS_LENTAS_MAXIMO:
+                _registro.popitem(last=False)
+    with _trava:
+        entrada['ocorrencias'] += 1
+        entrada['total_ms'] += duracao
+        entrada['maximo_ms'] = max(entrada['maximo_ms'], duracao)
+        entrada['view'] = correspondencia.view_name if correspondencia else None
+        entrada['caminho'] = request.path if request else None
+        entrada['origem'] = _origem_codigo()
+        entrada['visto_em'] = timezone.now()
+
+
+def _monitorar(execute, sql, params, many, context):
+    if _explicando.get():
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    resultado = execute(sql, params, many, context)
+    duracao = (time.perf_counter() - inicio) * 1000
+    if duracao >= settings.CRM_CONSULTAS_LENTAS_MS:
+        _registrar(sql, params, many, duracao, context['connection'])
+    return resultado
+
+
+@contextmanager
+def monitorar_consultas_lentas(request=None):
+    """Registra as consultas lentas feitas dentro do bloco"""
+    if settings.CRM_CONSULTAS_LENTAS_MS is None:
+        yield
+        return
+    token = _requisicao.set(request)
+    try:
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(_monitorar))
+            yield
+    finally:
+        _requisicao.reset(token)
+
+
+def consultas_lentas():
+    """
+    Grupos de consultas lentas, do maior tempo total para o menor
+
+    Returns:
+        list: dicts com impressao_digital, sql (normalizado), exemplo,
+        parametros, plano, varredura, ocorrencias, total_ms, maximo_ms,
+        medio_ms, view, caminho, origem e visto_em
+    """
+    with _trava:
+        entradas = [dict(entrada) for entrada in _registro.values()]
+    for entrada in entradas:
+        entrada['medio_ms'] = entrada['total_ms'] / entrada['ocorrencias']
+    return sorted(entradas, key=lambda entrada: entrada['total_ms'], reverse=True)
+
+
+def limpar_consultas_lentas():
+    with _trava:
+        _registro.clear()
@@ -0,0 +1,381 @@
+"""
+Medição de desempenho das views mais acessadas
+
+Cada tamanho de base tem o próprio usuário (bench<N>_1, com N clientes),
+gerado uma vez por geracao.gerar_dados e reaproveitado nas execuções
+seguintes. Os endpoints são chamados pelo django.test.Client: a primeira
+chamada com o cache do usuário invalidado (fria), depois as repetições
+aquecidas. Tempo e consultas SQL saem das chamadas normais; o pico de
+memória vem de uma chamada extra sob tracemalloc, que deixaria os tempos
+mais lentos.
+
+O relatório é um dict serializável em JSON; dois relatórios (por exemplo
+de commits diferentes) são comparados por comparar_relatorios.
+
+ORCAMENTOS declara o limite de consultas e de tempo de cada endpoint; os
+testes (tests.py) medem cada um no banco de testes em duas bases de
+tamanhos diferentes e acusam, além dos estouros, consultas que crescem
+com o número de linhas (N+1).
+"""
+
+import json
+import platform
+import re
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .geracao import criar_usuarios, gerar_dados
+from .models import Cliente, Funil
+from .previsao import invalidar_dados
+
+
+VERSAO_RELATORIO = 1
+REPETICOES = 5
+TOLERANCIA = 0.2
+# Diferenças de tempo abaixo disto são ruído, mesmo que grandes em %
+TOLERANCIA_MINIMA_MS = 5
+
+NOMES_ENDPOINTS = [
+    'dashboard', 'funil_vendas', 'tarefas_list', 'busca_global', 'calendario_tarefas', 'tarefas_mes',
+    'api_tarefas_stats', 'api_pipeline_stats', 'api_pipeline_previsao', 'api_fila_acoes',
+    'api_funil_simulacao', 'cliente_detalhes', 'api_cliente_info', 'mover_cliente',
+]
+
+# Orçamento por endpoint: consultas SQL com o cache frio, consultas ao
+# cache (SQL só com o DatabaseCache; contadas à parte), quantas consultas
+# a mais a base grande pode fazer em relação à pequena (0 = não cresce com
+# o número de linhas) e tempo da chamada aquecida na base grande, com folga
+# para máquinas mais lentas
+ORCAMENTOS = {
+    'dashboard': {'consultas': 35, 'cache': 0, 'crescimento': 0, 'tempo_ms': 500},
+    'funil_vendas': {'consultas': 35, 'cache': 0, 'crescimento': 0, 'tempo_ms': 1000},
+    'tarefas_list': {'consultas': 12, 'cache': 0, 'crescimento': 0, 'tempo_ms': 500},
+    'busca_global': {'consultas': 8, 'cache': 0, 'crescimento': 0, 'tempo_ms': 200},
+    'calendario_tarefas': {'consultas': 6, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'tarefas_mes': {'consultas': 4, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'api_tarefas_stats': {'consultas': 6, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'api_pipeline_stats': {'consultas': 5, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'api_pipeline_previsao': {'consultas': 5, 'cache': 5, 'crescimento': 0, 'tempo_ms': 100},
+    'api_fila_acoes': {'consultas': 8, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'api_funil_simulacao': {'consultas': 5, 'cache': 5, 'crescimento': 0, 'tempo_ms': 100},
+    'cliente_detalhes': {'consultas': 12, 'cache': 0, 'crescimento': 0, 'tempo_ms': 200},
+    'api_cliente_info': {'consultas': 4, 'cache': 0, 'crescimento': 0, 'tempo_ms': 100},
+    'mover_cliente': {'consultas': 10, 'cache': 6, 'crescimento': 0, 'tempo_ms': 100},
+}
+TAMANHOS_ORCAMENTO = (50, 500)
+
+
+def requisicoes(usuario):
+    """
+    Endpoints medidos para um usuário
+
+    Returns:
+        list: (nome, método, url, dados); dados pode ser uma função da
+        repetição, para requisições que alteram o estado (mover_cliente
+        alterna o cliente entre duas etapas)
+    """
+    hoje = timezone.localdate()
+    funil = Funil.objects.filter(usuario=usuario).order_by('id').first()
+    # Um cliente do meio da base, com o volume típico de registros relacionados
+    clientes = Cliente.objects.filter(usuario=usuario, funil=funil).order_by('id')
+    cliente = clientes[clientes.count() // 2] if clientes.exists() else None
+
+    def mover(repeticao):
+        return {'cliente_id': cliente.id, 'nova_etapa': funil.etapas[repeticao % 2]}
+
+    mes = {'mes': hoje.month, 'ano': hoje.year}
+    chamadas = [
+        ('dashboard', 'get', reverse('crm:dashboard'), None),
+        ('funil_vendas', 'get', reverse('crm:funil_vendas'), None),
+        ('tarefas_list', 'get', reverse('crm:tarefas_list'), None),
+        ('busca_global', 'get', reverse('crm:busca_global'), {'q': 'Silva'}),
+        ('calendario_tarefas', 'get', reverse('calendario:calendario'), mes),
+        ('tarefas_mes', 'get', reverse('calendario:tarefas_mes'), mes),
+        ('api_tarefas_stats', 'get', reverse('crm:api_tarefas_stats'), None),
+        ('api_pipeline_stats', 'get', reverse('crm:api_pipeline_stats'), None),
+        ('api_pipeline_previsao', 'get', reverse('crm:api_pipeline_previsao'), None),
+        ('api_fila_acoes', 'get', reverse('crm:api_fila_acoes'), None),
+    ]
+    if funil:
+        chamadas.append((
+            'api_funil_simulacao', 'get', reverse('crm:api_funil_simulacao', args=[funil.id]),
+            {'semente': 1},
+        ))
+    if cliente:
+        chamadas += [
+            ('cliente_detalhes', 'get', reverse('crm:cliente_detalhes', args=[cliente.id]), None),
+            ('api_cliente_info', 'get', reverse('crm:api_cliente_info', args=[cliente.id]), None),
+            ('mover_cliente', 'post', reverse('crm:mover_cliente'), mover),
+        ]
+    return chamadas
+
+
+_SAVEPOINT = re.compile(r'\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+def _tabela_cache():
+    """Tabela do DatabaseCache de settings.CACHES, ou None com outro backend"""
+    configuracao = settings.CACHES['default']
+    return configuracao['LOCATION'] if configuracao['BACKEND'].endswith('.DatabaseCache') else None
+
+
+def _chamar(cliente_http, metodo, url, dados):
+    """
+    Faz uma requisição e devolve (status, segundos, consultas SQL, consultas do cache)
+
+    Com o DatabaseCache, as leituras e gravações do cache também são SQL;
+    elas são contadas à parte, e não entre as consultas da view. Savepoints
+    não contam: dentro da transação de um TestCase cada atomic() vira um
+    SAVEPOINT, que em produção (autocommit) não passa pelo cursor.
+    """
+    consultas = consultas_cache = 0
+    tabela_cache = _tabela_cache()
+
+    # Contador em vez de CaptureQueriesContext, que guarda só as últimas 9000
+    def contar(execute, sql, params, many, context):
+        nonlocal consultas, consultas_cache
+        if _SAVEPOINT.match(sql):
+            pass
+        elif tabela_cache and tabela_cache in sql:
+            consultas_cache += 1
+        else:
+            consultas += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(contar):
+        inicio = time.perf_counter()
+        if metodo == 'post':
+            resposta = cliente_http.post(url, json.dumps(dados), content_type='application/json')
+        else:
+            resposta = cliente_http.get(url, dados)
+        if resposta.streaming:
+            for _ in resposta.streaming_content:
+                pass
+        segundos = time.perf_counter() - inicio
+    return resposta.status_code, segundos, consultas, consultas_cache
+
+
+def medir_endpoint(cliente_http, usuario, metodo, url, dados, repeticoes=REPETICOES):
+    """
+    Mede um endpoint: chamada fria, repetições aquecidas e pico de memória
+
+    Returns:
+        dict: status, fria_ms, mediana_ms, p95_ms, minimo_ms, consultas,
+        consultas_fria, consultas_cache, consultas_cache_fria e
+        memoria_pico_kb
+    """
+    def chamar(repeticao):
+        return _chamar(cliente_http, metodo, url, dados(repeticao) if callable(dados) else dados)
+
+    invalidar_dados(usuario.id)
+    status, fria, consultas_fria, consultas_cache_fria = chamar(0)
+    tempos = []
+    for repeticao in range(1, repeticoes + 1):
+        status, segundos, consultas, consultas_cache = chamar(repeticao)
+        tempos.append(segundos * 1000)
+
+    tracemalloc.start()
+    try:
+        chamar(repeticoes + 1)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    tempos.sort()
+    return {
+        'status': status,
+        'fria_ms': round(fria * 1000, 2),
+        'mediana_ms': round(statistics.median(tempos), 2),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 2),
+        'minimo_ms': round(tempos[0], 2),
+        'consultas': consultas,
+        'consultas_fria': consultas_fria,
+        'consultas_cache': consultas_cache,
+        'consultas_cache_fria': consultas_cache_fria,
+        'memoria_pico_kb': pico // 1024,
+    }
+
+
+def preparar_base(tamanho, semente=42):
+    """
+    Usuário com `tamanho` clientes para as medições, gerado se necessário
+
+    Uma base incompleta (execução interrompida) é excluída e gerada de novo.
+
+    Returns:
+        User
+    """
+    prefixo = f'bench{tamanho}_'
+    existente = User.objects.filter(username=f'{prefixo}1').first()
+    if existente:
+        if Cliente.objects.filter(usuario=existente).count() == tamanho:
+            return existente
+        existente.delete()
+    usuarios = criar_usuarios(1, prefixo)
+    gerar_dados(usuarios, tamanho, semente=semente)
+    return usuarios[0]
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanhos, repeticoes=REPETICOES, endpoints=None, semente=42, avancar=None):
+    """
+    Roda as medições para cada tamanho de base
+
+    Args:
+        tamanhos: list de int - clientes por base
+        repeticoes: int - chamadas aquecidas por endpoint
+        endpoints: list (opcional) - nomes em NOMES_ENDPOINTS; padrão: todos
+        semente: int - usada só ao gerar uma base nova
+        avancar: callable (opcional) - avancar(tamanho, nome, resultado)
+
+    Returns:
+        dict: relatório serializável em JSON
+    """
+    relatorio = {
+        'versao': VERSAO_RELATORIO,
+        'commit': _commit(),
+        'gerado_em': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'banco': connection.vendor,
+        'repeticoes': repeticoes,
+        'tamanhos': {},
+    }
+    for tamanho in tamanhos:
+        usuario = preparar_base(tamanho, semente)
+        # Views com erro entram no relatório com o status 500 em vez de interromper
+        cliente_http = Client(raise_request_exception=False)
+        cliente_http.force_login(usuario)
+        resultados = {}
+        for nome, metodo, url, dados in requisicoes(usuario):
+            if endpoints and nome not in endpoints:
+                continue
+            resultados[nome] = medir_endpoint(cliente_http, usuario, metodo, url, dados, repeticoes)
+            if avancar:
+                avancar(tamanho, nome, resultados[nome])
+        relatorio['tamanhos'][str(tamanho)] = {
+            'base_gerada_em': usuario.date_joined.isoformat(),
+            'endpoints': resultados,
+        }
+    return relatorio
+
+
+def comparar_relatorios(anterior, atual, tolerancia=TOLERANCIA):
+    """
+    Compara dois relatórios endpoint a endpoint
+
+    É regressão a mediana ou o pico de memória crescer mais que a
+    tolerância (com tempos acima de TOLERANCIA_MINIMA_MS de diferença),
+    qualquer aumento no número de consultas ou um endpoint que passou a
+    responder com erro.
+
+    Returns:
+        list: dicts com tamanho, endpoint, metrica, antes, depois, variacao
+        (fração) e regressao
+    """
+    linhas = []
+    for tamanho, dados in atual['tamanhos'].items():
+        antes_tamanho = anterior['tamanhos'].get(tamanho, {}).get('endpoints', {})
+        for endpoint, depois in dados['endpoints'].items():
+            antes = antes_tamanho.get(endpoint)
+            if not antes:
+                continue
+            if antes['status'] < 400 <= depois['status']:
+                linhas.append({
+                    'tamanho': tamanho, 'endpoint': endpoint, 'metrica': 'status',
+                    'antes': antes['status'], 'depois': depois['status'], 'variacao': 0.0, 'regressao': True,
+                })
+            for metrica in ('mediana_ms', 'consultas', 'memoria_pico_kb'):
+                valor_antes, valor_depois = antes[metrica], depois[metrica]
+                variacao = (valor_depois - valor_antes) / valor_antes if valor_antes else 0.0
+                if metrica == 'consultas':
+                    regressao = valor_depois > valor_antes
+                elif metrica == 'mediana_ms':
+                    regressao = variacao > tolerancia and valor_depois - valor_antes > TOLERANCIA_MINIMA_MS
+                else:
+                    regressao = variacao > tolerancia
+                linhas.append({
+                    'tamanho': tamanho, 'endpoint': endpoint, 'metrica': metrica,
+                    'antes': valor_antes, 'depois': valor_depois,
+                    'variacao': round(variacao, 4), 'regressao': regressao,
+                })
+    return linhas
+
+
+def medir_orcamento(cliente_http, usuario, metodo, url, dados, medir_tempo=False):
+    """
+    Mede um endpoint para conferir o orçamento
+
+    As consultas são contadas com o cache do usuário invalidado, as do
+    cache à parte; o tempo, se pedido, é o menor de três chamadas aquecidas.
+
+    Returns:
+        dict: status, consultas, consultas_cache e tempo_ms (None sem medir_tempo)
+    """
+    def chamar(repeticao):
+        return _chamar(cliente_http, metodo, url, dados(repeticao) if callable(dados) else dados)
+
+    invalidar_dados(usuario.id)
+    status, _, consultas, consultas_cache = chamar(0)
+    tempo_ms = None
+    if medir_tempo:
+        tempo_ms = round(min(chamar(repeticao)[1] for repeticao in range(1, 4)) * 1000, 2)
+    return {'status': status, 'consultas': consultas, 'consultas_cache': consultas_cache, 'tempo_ms': tempo_ms}
+
+
+def violacoes_orcamento(nome, pequena, grande, orcamentos=None):
+    """
+    Confere um endpoint medido nas duas bases com o seu orçamento
+
+    Um endpoint que responde com erro conta como violação: o número de
+    consultas da página de erro não diz nada sobre a view.
+
+    Args:
+        nome: str - chave em ORCAMENTOS
+        pequena: dict de medir_orcamento na base pequena
+        grande: dict de medir_orcamento na base grande (com tempo_ms)
+        orcamentos: dict (opcional) - padrão: ORCAMENTOS
+
+    Returns:
+        list: textos; vazia se dentro do orçamento
+    """
+    orcamento = (ORCAMENTOS if orcamentos is None else orcamentos).get(nome)
+    status = max(pequena['status'], grande['status'])
+    if status >= 400:
+        return [f'respondeu com status {status}; orçamento não avaliado']
+    if orcamento is None:
+        return ['sem orçamento declarado em ORCAMENTOS']
+
+    violacoes = []
+    if grande['consultas'] > orcamento['consultas']:
+        violacoes.append(f"{grande['consultas']} consultas (máximo {orcamento['consultas']})")
+    consultas_cache = max(pequena['consultas_cache'], grande['consultas_cache'])
+    if consultas_cache > orcamento['cache']:
+        violacoes.append(f"{consultas_cache} consultas ao cache (máximo {orcamento['cache']})")
+    if grande['consultas'] - pequena['consultas'] > orcamento['crescimento']:
+        violacoes.append(
+            f"consultas crescem com a base: {pequena['consultas']} -> {grande['consultas']} "
+            f"(crescimento máximo {orcamento['crescimento']})"
+        )
+    if grande['tempo_ms'] is not None and grande['tempo_ms'] > orcamento['tempo_ms']:
+        violacoes.append(f"{grande['tempo_ms']} ms (máximo {orcamento['tempo_ms']} ms)")
+    return violacoes
@@ -0,0 +1,159 @@
+"""
+Download de arquivos do storage sem carregar o arquivo na memória
+
+O arquivo é lido em blocos pelo FileResponse. Requisições condicionais
+(If-None-Match, If-Modified-Since, If-Match) usam um ETag derivado do
+nome, tamanho e data do arquivo; um cabeçalho Range de um único intervalo
+devolve 206 só com o trecho pedido (If-Range é respeitado). Sem data,
+vale só o ETag: os documentos ficam no storage pelo hash do conteúdo, e
+um arquivo trocado muda de nome.
+
+Com settings.CRM_DOWNLOAD_OFFLOAD a view só confere a permissão e devolve
+um cabeçalho para o proxy servir o arquivo:
+
+- 'x-accel' (nginx): X-Accel-Redirect com CRM_DOWNLOAD_ACCEL_PREFIXO +
+  nome do arquivo no storage, apontando para uma location "internal"
+  cujo alias é o MEDIA_ROOT;
+- 'x-sendfile' (Apache mod_xsendfile, lighttpd): X-Sendfile com o caminho
+  do arquivo no disco.
+
+Nos dois casos o proxy cuida de Range e das requisições condicionais.
+"""
+
+import hashlib
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _Trecho:
+    """Arquivo limitado a `restante` bytes a partir da posição atual"""
+
+    def __init__(self, arquivo, restante):
+        self.arquivo = arquivo
+        self.restante = restante
+
+    def read(self, tamanho=-1):
+        if self.restante <= 0:
+            return b''
+        if tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self.arquivo.read(tamanho)
+        self.restante -= len(dados)
+        return dados
+
+    def close(self):
+        self.arquivo.close()
+
+
+class _RespostaArquivo(FileResponse):
+    block_size = 64 * 1024
+
+
+def _intervalo(request, tamanho, etag, ultima_modificacao):
+    """
+    Intervalo pedido no cabeçalho Range
+
+    Returns:
+        tuple: (inicio, fim) inclusivos; None para devolver o arquivo
+        inteiro (sem Range, vários intervalos, sintaxe inválida ou If-Range
+        que não confere); (None, None) se o intervalo não é satisfazível
+    """
+    cabecalho = request.headers.get('Range')
+    encontrado = _RANGE.match(cabecalho.strip()) if cabecalho else None
+    if encontrado is None or not any(encontrado.groups()):
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        data = parse_http_date_safe(if_range)
+        if if_range != etag and (
+            ultima_modificacao is None or data is None or data < int(ultima_modificacao.timestamp())
+        ):
+            return None
+
+    inicio, fim = encontrado.groups()
+    if not inicio:
+        # "bytes=-N": os últimos N bytes
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio = int(inicio)
+        fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return None, None
+    return inicio, fim
+
+
+def _offload(campo, nome, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.CRM_DOWNLOAD_OFFLOAD == 'x-accel':
+        response['X-Accel-Redirect'] = quote(settings.CRM_DOWNLOAD_ACCEL_PREFIXO + campo.name)
+    else:
+        response['X-Sendfile'] = campo.path
+    response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(nome)}"
+    return response
+
+
+def servir_arquivo(request, campo, nome, ultima_modificacao=None):
+    """
+    Resposta de download de um FileField, com Range e requisições condicionais
+
+    Args:
+        campo: FieldFile com o arquivo
+        nome: nome sugerido ao navegador
+        ultima_modificacao: datetime em que o arquivo foi gravado (arquivos
+            do storage não são alterados depois de salvos), ou None para não
+            enviar Last-Modified quando o registro pode trocar de arquivo
+
+    Returns:
+        HttpResponse
+    """
+    content_type = (
+        mimetypes.guess_type(nome)[0] or mimetypes.guess_type(campo.name)[0] or 'application/octet-stream'
+    )
+    if settings.CRM_DOWNLOAD_OFFLOAD:
+        return _offload(campo, nome, content_type)
+
+    try:
+        tamanho = campo.size
+    except OSError:
+        raise Http404('Arquivo não disponível')
+    data = int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+    etag = '"{}"'.format(hashlib.md5(f'{campo.name}:{tamanho}:{data or ""}'.encode()).hexdigest())
+    condicional = get_conditional_response(request, etag=etag, last_modified=data)
+    if condicional is not None:
+        return condicional
+
+    intervalo = _intervalo(request, tamanho, etag, ultima_modificacao)
+    if intervalo == (None, None):
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamanho}'
+        return response
+
+    arquivo = campo.open('rb')
+    if intervalo is None:
+        response = _RespostaArquivo(arquivo, as_attachment=True, filename=nome, content_type=content_type)
+    else:
+        inicio, fim = intervalo
+        arquivo.seek(inicio)
+        response = _RespostaArquivo(
+            _Trecho(arquivo, fim - inicio + 1), status=206,
+            as_attachment=True, filename=nome, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        response['Content-Length'] = str(fim - inicio + 1)
+    response['Accept-Ranges'] = 'bytes'
+    # Arquivos de usuários: o navegador pode guardar, mas revalida pelo ETag
+    response['Cache-Control'] = 'private, no-cache'
+    response['ETag'] = etag
+    if data is not None:
+        response['Last-Modified'] = http_date(data)
+    return response
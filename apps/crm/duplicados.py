@@ -0,0 +1,269 @@
+"""
+Detecção e mesclagem de clientes duplicados
+
+Em vez de comparar todos os clientes entre si, cada cliente gera chaves
+de bloqueio (email normalizado, dígitos do telefone, dígitos do CPF/CNPJ
+e nome + empresa sem acentos). Só clientes do mesmo usuário que
+compartilham uma chave viram pares candidatos, que recebem uma
+pontuação conforme as chaves em comum e a semelhança dos nomes.
+"""
+
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Atividade, Cliente, Documento, Email, HistoricoEtapa, Nota, Proposta, Tarefa, UploadDocumento
+from .previsao import chave_cache, obter_cache
+from .utils import limpar_dados_telefone
+
+
+COLUNAS_DUPLICADOS = [
+    'id', 'usuario_id', 'nome', 'empresa', 'cpf_cnpj',
+    'telefone', 'telefone_alternativo', 'email', 'email_alternativo',
+]
+
+# Pontos por tipo de chave em comum; a semelhança dos nomes soma até BONUS_NOME
+PESOS = {
+    'documento': 60,
+    'email': 45,
+    'telefone': 30,
+    'nome_empresa': 25,
+}
+TIPOS = list(PESOS)
+BONUS_NOME = 20
+PONTUACAO_MINIMA = 50
+
+# Chaves compartilhadas por muitos clientes (ex.: telefone da central de
+# uma empresa) não discriminam nada e gerariam pares demais
+TAMANHO_MAXIMO_BLOCO = 50
+
+# Modelos cujas linhas passam para o cliente mantido na mesclagem
+RELACIONADOS = [Atividade, Tarefa, Nota, Documento, Email, Proposta, UploadDocumento]
+
+# Campos copiados do duplicado quando o cliente mantido não os tem
+CAMPOS_COMPLEMENTARES = [
+    'cpf_cnpj', 'telefone', 'telefone_alternativo', 'email', 'email_alternativo',
+    'endereco', 'cidade', 'estado', 'cep', 'empresa', 'cargo', 'setor',
+    'linkedin', 'facebook', 'instagram',
+]
+
+
+def _dobrar(serie):
+    """Minúsculas, sem acentos e só com letras/números separados por espaço"""
+    return (
+        serie.fillna('')
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('ascii')
+        .str.lower()
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def _digitos(serie):
+    return serie.fillna('').str.replace(r'\D', '', regex=True)
+
+
+def chaves_bloqueio(quadro):
+    """
+    Gera as chaves de bloqueio de um lote de clientes
+
+    Args:
+        quadro: DataFrame com COLUNAS_DUPLICADOS
+
+    Returns:
+        DataFrame: id, usuario_id, tipo (índice em TIPOS) e hash da chave
+    """
+    partes = []
+
+    def adicionar(tipo, serie):
+        valido = serie.notna() & (serie != '')
+        partes.append(pd.DataFrame({
+            'id': quadro['id'][valido],
+            'usuario_id': quadro['usuario_id'][valido],
+            'tipo': np.int8(TIPOS.index(tipo)),
+            'chave': tipo + ':' + serie[valido],
+        }))
+
+    for coluna in ('email', 'email_alternativo'):
+        adicionar('email', quadro[coluna].fillna('').str.strip().str.lower())
+
+    for coluna in ('telefone', 'telefone_alternativo'):
+        # Mesmo número com ou sem o código do país
+        telefone = _digitos(quadro[coluna]).str.replace(r'^55(?=\d{10,11}$)', '', regex=True)
+        adicionar('telefone', telefone.where(telefone.str.len() >= 10))
+
+    documento = _digitos(quadro['cpf_cnpj'])
+    adicionar('documento', documento.where(documento.str.len().isin([11, 14])))
+
+    nome = _dobrar(quadro['nome'])
+    adicionar('nome_empresa', (nome + '|' + _dobrar(quadro['empresa'])).where(nome != ''))
+
+    chaves = pd.concat(partes, ignore_index=True)
+    # Só o hash de 64 bits fica em memória, não o texto da chave
+    chaves['hash'] = pd.util.hash_array(chaves['chave'].to_numpy(dtype=object))
+    return chaves.drop(columns='chave').drop_duplicates(['id', 'hash'])
+
+
+def _semelhanca_nomes(pares, nomes):
+    return np.array([
+        SequenceMatcher(None, nomes.get(id_a, ''), nomes.get(id_b, '')).ratio()
+        for id_a, id_b in zip(pares['id_a'], pares['id_b'])
+    ])
+
+
+def detectar_duplicados(clientes, pontuacao_minima=PONTUACAO_MINIMA, tamanho_lote=100_000):
+    """
+    Encontra pares de clientes provavelmente duplicados
+
+    Os clientes são lidos em lotes por id; só as chaves de bloqueio
+    (inteiros) ficam em memória até o agrupamento final.
+
+    Args:
+        clientes: QuerySet de Cliente
+        pontuacao_minima: int - de 0 a 100
+        tamanho_lote: int
+
+    Returns:
+        DataFrame: usuario_id, id_a, id_b, pontuacao e motivos (chaves em
+        comum), da maior pontuação para a menor
+    """
+    colunas_resultado = ['usuario_id', 'id_a', 'id_b', 'pontuacao', 'motivos']
+    lotes = []
+    ultimo_id = 0
+    while True:
+        linhas = list(
+            clientes.filter(id__gt=ultimo_id).order_by('id')
+            .values_list(*COLUNAS_DUPLICADOS)[:tamanho_lote]
+        )
+        if not linhas:
+            break
+        ultimo_id = linhas[-1][0]
+        lotes.append(chaves_bloqueio(pd.DataFrame.from_records(linhas, columns=COLUNAS_DUPLICADOS)))
+
+    if not lotes:
+        return pd.DataFrame(columns=colunas_resultado)
+    chaves = pd.concat(lotes, ignore_index=True)
+
+    tamanho = chaves.groupby(['usuario_id', 'hash'])['id'].transform('size')
+    blocos = chaves[(tamanho > 1) & (tamanho <= TAMANHO_MAXIMO_BLOCO)]
+    pares = blocos.merge(blocos, on=['usuario_id', 'hash', 'tipo'], suffixes=('_a', '_b'))
+    pares = pares[pares['id_a'] < pares['id_b']].drop_duplicates(['id_a', 'id_b', 'tipo'])
+    if pares.empty:
+        return pd.DataFrame(columns=colunas_resultado)
+
+    pesos = np.array([PESOS[tipo] for tipo in TIPOS])
+    pares = pares.assign(peso=pesos[pares['tipo']], bit=np.left_shift(1, pares['tipo']))
+    pares = pares.groupby(['usuario_id', 'id_a', 'id_b'], as_index=False).agg(
+        pontuacao=('peso', 'sum'), bits=('bit', 'sum')
+    )
+
+    # Semelhança dos nomes só para os candidatos, não para a base inteira
+    ids = np.union1d(pares['id_a'], pares['id_b']).tolist()
+    nomes = {}
+    for inicio in range(0, len(ids), 10_000):
+        lote = Cliente.objects.filter(id__in=ids[inicio:inicio + 10_000]).values_list('id', 'nome')
+        nomes.update((cliente_id, nome) for cliente_id, nome in lote)
+    nomes = dict(zip(nomes, _dobrar(pd.Series(list(nomes.values()), dtype=object))))
+    pares['pontuacao'] = np.minimum(
+        pares['pontuacao'] + np.rint(_semelhanca_nomes(pares, nomes) * BONUS_NOME), 100
+    ).astype(int)
+
+    pares = pares[pares['pontuacao'] >= pontuacao_minima].copy()
+    pares['motivos'] = [
+        [tipo for posicao, tipo in enumerate(TIPOS) if bits & (1 << posicao)]
+        for bits in pares['bits']
+    ]
+    return pares.sort_values(['pontuacao', 'id_a'], ascending=[False, True])[colunas_resultado]
+
+
+def duplicados_usuario(usuario, pontuacao_minima=PONTUACAO_MINIMA, limite=500):
+    """
+    Pares duplicados do usuário, com cache até que seus clientes mudem
+
+    Returns:
+        list: dicts no formato das linhas de detectar_duplicados
+    """
+    chave = chave_cache('duplicados', usuario.id, pontuacao_minima, limite)
+    return obter_cache(
+        'duplicados',
+        chave,
+        lambda: detectar_duplicados(
+            Cliente.objects.filter(usuario=usuario), pontuacao_minima
+        ).head(limite).to_dict('records'),
+        settings.CRM_DUPLICADOS_TTL,
+    )
+
+
+def mesclar_clientes(principal, duplicado):
+    """
+    Junta o duplicado ao cliente principal e exclui o duplicado
+
+    Atividades, tarefas, notas, documentos, emails e propostas passam para
+    o principal com um UPDATE por modelo; as tags são somadas e os campos
+    vazios do principal são completados com os do duplicado. Do histórico
+    de etapas só passam as etapas em que o principal nunca esteve: as
+    demais contariam a mesma pessoa duas vezes em metricas_funil e
+    tempos_por_etapa, e são excluídas com o duplicado.
+
+    Args:
+        principal: Cliente mantido
+        duplicado: Cliente excluído
+
+    Returns:
+        dict: {nome do modelo: linhas transferidas}
+    """
+    if principal.pk == duplicado.pk:
+        raise ValueError('Um cliente não pode ser mesclado com ele mesmo')
+    if principal.usuario_id != duplicado.usuario_id:
+        raise ValueError('Só é possível mesclar clientes do mesmo usuário')
+
+    transferidos = {}
+    with transaction.atomic():
+        # A passagem aberta do duplicado é encerrada; a do principal continua
+        duplicado.historico_etapas.filter(data_saida__isnull=True).update(data_saida=timezone.now())
+        for modelo in RELACIONADOS:
+            transferidos[modelo._meta.verbose_name_plural] = modelo.objects.filter(
+                cliente=duplicado
+            ).update(cliente=principal)
+
+        historico = duplicado.historico_etapas.all()
+        for funil_id, etapa in principal.historico_etapas.values_list('funil_id', 'etapa').distinct():
+            historico = historico.exclude(funil_id=funil_id, etapa=etapa)
+        transferidos[HistoricoEtapa._meta.verbose_name_plural] = historico.update(cliente=principal)
+
+        Cliente.tags.through.objects.bulk_create(
+            [
+                Cliente.tags.through(cliente_id=principal.pk, tag_id=tag_id)
+                for tag_id in duplicado.tags.values_list('id', flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+
+        for campo in CAMPOS_COMPLEMENTARES:
+            if not getattr(principal, campo) and getattr(duplicado, campo):
+                setattr(principal, campo, getattr(duplicado, campo))
+        emails = {(principal.email or '').strip().lower(), (principal.email_alternativo or '').strip().lower()}
+        if duplicado.email and duplicado.email.strip().lower() not in emails:
+            principal.email_alternativo = principal.email_alternativo or duplicado.email
+        # Compara só DDD + número, ignorando formatação e código do país
+        telefones = {
+            limpar_dados_telefone(principal.telefone)[-11:],
+            limpar_dados_telefone(principal.telefone_alternativo)[-11:],
+        }
+        if duplicado.telefone and limpar_dados_telefone(duplicado.telefone)[-11:] not in telefones:
+            principal.telefone_alternativo = principal.telefone_alternativo or duplicado.telefone
+        if duplicado.observacoes and duplicado.observacoes != principal.observacoes:
+            principal.observacoes = '\n\n'.join(filter(None, [principal.observacoes, duplicado.observacoes]))
+        principal.ultimo_contato = max(
+            filter(None, [principal.ultimo_contato, duplicado.ultimo_contato]), default=None
+        )
+
+        principal.save()
+        duplicado.delete()
+    return transferidos
@@ -0,0 +1,239 @@
+"""
+Exportação de dados do CRM em CSV por streaming
+"""
+
+import csv
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Value
+from django.utils import timezone
+
+from .models import Atividade, Cliente, Proposta, Tarefa
+
+
+TAMANHO_LOTE = 2000
+
+
+def _horas_desde(campo):
+    def expressao(agora):
+        return ExpressionWrapper(
+            Value(agora, output_field=DateTimeField()) - F(campo),
+            output_field=DurationField(),
+        )
+    return expressao
+
+
+# Colunas exportáveis por conjunto de dados. Cada coluna é um lookup do ORM
+# (inclusive através de FKs) ou o nome de uma anotação em 'anotacoes'.
+# 'campo_alteracao' é o timestamp usado pela exportação incremental.
+EXPORTACOES = {
+    'clientes': {
+        'modelo': Cliente,
+        'rotulo': 'Clientes',
+        'filtro_usuario': 'usuario',
+        'ordem': 'id',
+        'campo_alteracao': 'atualizado_em',
+        'colunas': {
+            'id': 'ID',
+            'nome': 'Nome',
+            'tipo_pessoa': 'Tipo Pessoa',
+            'cpf_cnpj': 'CPF/CNPJ',
+            'telefone': 'Telefone',
+            'telefone_alternativo': 'Telefone Alternativo',
+            'email': 'Email',
+            'email_alternativo': 'Email Alternativo',
+            'endereco': 'Endereço',
+            'cidade': 'Cidade',
+            'estado': 'Estado',
+            'cep': 'CEP',
+            'empresa': 'Empresa',
+            'cargo': 'Cargo',
+            'setor': 'Setor',
+            'valor_estimado': 'Valor Estimado',
+            'probabilidade': 'Probabilidade',
+            'origem': 'Origem',
+            'funil__nome': 'Funil',
+            'etapa': 'Etapa',
+            'data_entrada_etapa': 'Data Entrada',
+            'horas_na_etapa': 'Horas na Etapa',
+            'ultimo_contato': 'Último Contato',
+            'observacoes': 'Observações',
+            'criado_em': 'Criado em',
+            'atualizado_em': 'Atualizado em',
+        },
+        'anotacoes': {
+            'horas_na_etapa': _horas_desde('data_entrada_etapa'),
+        },
+        'padrao': [
+            'nome', 'telefone', 'email', 'empresa', 'setor', 'valor_estimado',
+            'funil__nome', 'etapa', 'horas_na_etapa', 'data_entrada_etapa', 'observacoes',
+        ],
+    },
+    'tarefas': {
+        'modelo': Tarefa,
+        'rotulo': 'Tarefas',
+        'filtro_usuario': 'usuario',
+        'ordem': 'id',
+        'campo_alteracao': 'atualizado_em',
+        'colunas': {
+            'id': 'ID',
+            'titulo': 'Título',
+            'descricao': 'Descrição',
+            'tipo': 'Tipo',
+            'status': 'Status',
+            'prioridade': 'Prioridade',
+            'cliente__nome': 'Cliente',
+            'responsavel__username': 'Responsável',
+            'data_vencimento': 'Vencimento',
+            'data_conclusao': 'Conclusão',
+            'tempo_estimado': 'Tempo Estimado (min)',
+            'tempo_gasto': 'Tempo Gasto (min)',
+            'criado_em': 'Criado em',
+        },
+        'padrao': [
+            'titulo', 'tipo', 'status', 'prioridade', 'cliente__nome',
+            'data_vencimento', 'data_conclusao',
+        ],
+    },
+    'atividades': {
+        'modelo': Atividade,
+        'rotulo': 'Atividades',
+        'filtro_usuario': 'usuario',
+        'ordem': 'id',
+        'campo_alteracao': 'criado_em',
+        'colunas': {
+            'id': 'ID',
+            'tipo': 'Tipo',
+            'titulo': 'Título',
+            'descricao': 'Descrição',
+            'resultado': 'Resultado',
+            'cliente__nome': 'Cliente',
+            'duracao_minutos': 'Duração (min)',
+            'data_atividade': 'Data',
+            'criado_em': 'Criado em',
+        },
+        'padrao': ['data_atividade', 'tipo', 'titulo', 'resultado', 'cliente__nome', 'duracao_minutos'],
+    },
+    'propostas': {
+        'modelo': Proposta,
+        'rotulo': 'Propostas',
+        'filtro_usuario': 'usuario',
+        'ordem': 'id',
+        'campo_alteracao': 'criado_em',
+        'colunas': {
+            'id': 'ID',
+            'numero': 'Número',
+            'titulo': 'Título',
+            'status': 'Status',
+            'cliente__nome': 'Cliente',
+            'valor_total': 'Valor Total',
+            'desconto': 'Desconto',
+            'data_validade': 'Validade',
+            'data_aceite': 'Aceite',
+            'criado_em': 'Criado em',
+        },
+        'padrao': ['numero', 'titulo', 'status', 'cliente__nome', 'valor_total', 'desconto', 'data_validade'],
+    },
+}
+
+
+class Eco:
+    """Buffer que apenas devolve o que recebe, para o csv.writer gerar linhas sob demanda"""
+
+    def write(self, valor):
+        return valor
+
+
+def formatar_valor(valor):
+    """
+    Converte um valor do banco no texto usado no CSV
+
+    Args:
+        valor: Valor retornado por values_list
+
+    Returns:
+        str: Valor formatado
+    """
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, timedelta):
+        return f"{valor.total_seconds() / 3600:.1f}"
+    if isinstance(valor, Decimal):
+        return f"{valor:.2f}"
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    return str(valor)
+
+
+def colunas_validas(conjunto, colunas=None):
+    """
+    Filtra as colunas pedidas mantendo só as exportáveis do conjunto
+
+    Args:
+        conjunto: str - chave em EXPORTACOES
+        colunas: list (opcional) - colunas pedidas; vazio usa o padrão
+
+    Returns:
+        list: Colunas válidas na ordem pedida
+    """
+    definicao = EXPORTACOES[conjunto]
+    colunas = [coluna for coluna in (colunas or []) if coluna in definicao['colunas']]
+    return colunas or list(definicao['padrao'])
+
+
+def consulta_exportacao(conjunto, usuario=None, colunas=None, filtros=None):
+    """
+    Monta o values_list da exportação
+
+    Args:
+        conjunto: str - chave em EXPORTACOES
+        usuario: User (opcional) - restringe aos registros do usuário
+        colunas: list (opcional)
+        filtros: dict (opcional) - filtros extras do ORM
+
+    Returns:
+        tuple: (colunas, queryset de tuplas)
+    """
+    definicao = EXPORTACOES[conjunto]
+    colunas = colunas_validas(conjunto, colunas)
+
+    queryset = definicao['modelo'].objects.all()
+    if usuario is not None:
+        queryset = queryset.filter(**{definicao['filtro_usuario']: usuario})
+    if filtros:
+        queryset = queryset.filter(**filtros)
+
+    anotacoes = definicao.get('anotacoes', {})
+    agora = timezone.now()
+    usadas = {nome: anotacoes[nome](agora) for nome in colunas if nome in anotacoes}
+    if usadas:
+        queryset = queryset.annotate(**usadas)
+
+    return colunas, queryset.order_by(definicao['ordem']).values_list(*colunas)
+
+
+def linhas_csv(conjunto, usuario=None, colunas=None, filtros=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera o CSV linha a linha, sem materializar o resultado
+
+    O cabeçalho é produzido antes de a consulta ser executada, e as
+    linhas são lidas do cursor em lotes de tamanho_lote.
+
+    Yields:
+        str: Linhas CSV já terminadas em quebra de linha
+    """
+    definicao = EXPORTACOES[conjunto]
+    colunas, linhas = consulta_exportacao(conjunto, usuario, colunas, filtros)
+    escritor = csv.writer(Eco())
+
+    # BOM para o Excel reconhecer UTF-8
+    yield '\ufeff' + escritor.writerow([definicao['colunas'][coluna] for coluna in colunas])
+    for linha in linhas.iterator(chunk_size=tamanho_lote):
+        yield escritor.writerow([formatar_valor(valor) for valor in linha])
@@ -0,0 +1,164 @@
+"""
+Exportação colunar (Parquet) do CRM para análise offline
+
+Os arquivos preservam os tipos do banco (Decimal, datas com fuso, durações)
+e são gravados em row groups direto do cursor, sem materializar a tabela.
+Requer pyarrow; sem ele as funções levantam ImportError com a instrução
+de instalação.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+from .exportacao import EXPORTACOES, TAMANHO_LOTE, consulta_exportacao
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # dependência opcional
+    pa = pq = None
+
+
+# Linhas por row group: grande o bastante para boa compressão e leitura
+# rápida por coluna, pequeno o bastante para caber com folga na memória
+LINHAS_POR_GRUPO = 100_000
+
+
+def parquet_disponivel():
+    """Indica se o pyarrow está instalado"""
+    return pa is not None
+
+
+def _exigir_pyarrow():
+    if pa is None:
+        raise ImportError('A exportação Parquet requer o pacote pyarrow (pip install pyarrow)')
+
+
+def _campo_do_lookup(modelo, lookup):
+    """Segue um lookup do ORM (ex.: 'funil__nome') até o campo final"""
+    *relacoes, nome = lookup.split(LOOKUP_SEP)
+    for relacao in relacoes:
+        modelo = modelo._meta.get_field(relacao).related_model
+    return modelo._meta.get_field(nome)
+
+
+def _tipo_arrow(campo):
+    """Tipo pyarrow equivalente a um campo do Django"""
+    if isinstance(campo, models.ForeignKey):
+        return pa.int64()
+    if isinstance(campo, models.DecimalField):
+        return pa.decimal128(campo.max_digits, campo.decimal_places)
+    if isinstance(campo, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(campo, models.DateField):
+        return pa.date32()
+    if isinstance(campo, models.DurationField):
+        return pa.duration('us')
+    if isinstance(campo, models.BooleanField):
+        return pa.bool_()
+    if isinstance(campo, models.FloatField):
+        return pa.float64()
+    if isinstance(campo, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def esquema_exportacao(conjunto, colunas):
+    """
+    Monta o schema pyarrow das colunas de um conjunto
+
+    Args:
+        conjunto: str - chave em EXPORTACOES
+        colunas: list - colunas já validadas
+
+    Returns:
+        pyarrow.Schema
+    """
+    _exigir_pyarrow()
+    definicao = EXPORTACOES[conjunto]
+    anotacoes = definicao.get('anotacoes', {})
+    agora = timezone.now()
+
+    campos = []
+    for coluna in colunas:
+        if coluna in anotacoes:
+            campo = anotacoes[coluna](agora).output_field
+        else:
+            try:
+                campo = _campo_do_lookup(definicao['modelo'], coluna)
+            except FieldDoesNotExist:
+                campo = models.TextField()
+        campos.append(pa.field(coluna, _tipo_arrow(campo)))
+
+    metadados = {f'rotulo.{coluna}': definicao['colunas'][coluna] for coluna in colunas}
+    return pa.schema(campos, metadata=metadados)
+
+
+def escrever_parquet(conjunto, destino, usuario=None, colunas=None, filtros=None,
+                     desde=None, ate=None, compressao='zstd',
+                     linhas_por_grupo=LINHAS_POR_GRUPO, avancar=None):
+    """
+    Grava um conjunto de dados em Parquet, um row group por lote
+
+    Sem colunas informadas, exporta todas as colunas do conjunto. Com
+    desde/ate, exporta só as linhas cujo 'campo_alteracao' está em
+    (desde, ate] - usado pela exportação incremental.
+
+    Args:
+        conjunto: str - chave em EXPORTACOES
+        destino: str ou arquivo binário
+        usuario: User (opcional)
+        colunas: list (opcional)
+        filtros: dict (opcional) - filtros extras do ORM
+        desde: DateTime (opcional)
+        ate: DateTime (opcional)
+        compressao: str - codec do Parquet (zstd, snappy, gzip, none)
+        linhas_por_grupo: int
+        avancar: callable (opcional) - recebe a quantidade de linhas gravadas a cada row group
+
+    Returns:
+        int: Total de linhas gravadas
+    """
+    _exigir_pyarrow()
+    definicao = EXPORTACOES[conjunto]
+    filtros = dict(filtros or {})
+    campo_alteracao = definicao['campo_alteracao']
+    if desde is not None:
+        filtros[f'{campo_alteracao}__gt'] = desde
+    if ate is not None:
+        filtros[f'{campo_alteracao}__lte'] = ate
+
+    colunas, linhas = consulta_exportacao(
+        conjunto, usuario, colunas or list(definicao['colunas']), filtros
+    )
+    esquema = esquema_exportacao(conjunto, colunas)
+
+    total = 0
+    with pq.ParquetWriter(destino, esquema, compression=compressao) as escritor:
+        lote = []
+        for linha in linhas.iterator(chunk_size=TAMANHO_LOTE):
+            lote.append(linha)
+            if len(lote) == linhas_por_grupo:
+                escritor.write_batch(_lote_arrow(lote, esquema))
+                total += len(lote)
+                if avancar:
+                    avancar(len(lote))
+                lote = []
+        if lote:
+            escritor.write_batch(_lote_arrow(lote, esquema))
+            total += len(lote)
+            if avancar:
+                avancar(len(lote))
+
+    return total
+
+
+def _lote_arrow(lote, esquema):
+    """Transpõe as tuplas do values_list em arrays tipados"""
+    colunas = zip(*lote)
+    return pa.record_batch(
+        [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+        schema=esquema,
+    )
@@ -0,0 +1,267 @@
+"""
+Extração do texto dos documentos para a busca
+
+Cada Documento salvo com um arquivo novo ganha um TextoDocumento pendente
+(ver signals). O comando `extrair_textos` reserva lotes limitados em
+quantidade e em bytes, de modo que uma fila grande não faz o worker ler
+arquivos demais de uma vez, e grava o texto extraído. O banco mantém o
+índice de texto completo (migração 0012), então a busca não abre arquivos.
+
+Formatos: TXT, DOCX (lido com zipfile, sem dependências) e PDF, este com
+o pacote opcional pypdf. PDFs digitalizados sem camada de texto resultam
+em texto vazio (não há OCR). Documentos com o mesmo conteúdo (mesmo hash)
+reaproveitam o texto já extraído.
+"""
+
+import re
+import zipfile
+from datetime import timedelta
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Documento, TextoDocumento
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - dependência opcional
+    PdfReader = None
+
+
+_WORD = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_EXTENSOES_TEXTO = ('.txt', '.csv', '.md')
+
+
+def pdf_disponivel():
+    """Indica se o pypdf está instalado para extrair texto de PDFs"""
+    return PdfReader is not None
+
+
+def enfileirar_extracao(documento):
+    """Marca o documento para (re)extração do texto"""
+    TextoDocumento.objects.update_or_create(
+        documento=documento,
+        defaults={'hash': documento.hash, 'status': 'pendente', 'texto': '', 'erro': None},
+    )
+
+
+def _texto_docx(arquivo, limite):
+    partes = []
+    total = 0
+    with zipfile.ZipFile(arquivo) as pacote, pacote.open('word/document.xml') as xml:
+        for _, elemento in ElementTree.iterparse(xml):
+            if elemento.tag == f'{_WORD}t' and elemento.text:
+                partes.append(elemento.text)
+                total += len(elemento.text)
+            elif elemento.tag == f'{_WORD}tab':
+                partes.append('\t')
+            elif elemento.tag in (f'{_WORD}p', f'{_WORD}br'):
+                partes.append('\n')
+                elemento.clear()
+            if total >= limite:
+                break
+    return ''.join(partes)
+
+
+def _texto_pdf(arquivo, limite):
+    if PdfReader is None:
+        raise ValueError('A extração de PDF requer o pacote pypdf (pip install pypdf)')
+    leitor = PdfReader(arquivo)
+    if leitor.is_encrypted and not leitor.decrypt(''):
+        raise ValueError('PDF protegido por senha')
+    partes = []
+    total = 0
+    for pagina in leitor.pages:
+        texto = pagina.extract_text() or ''
+        partes.append(texto)
+        total += len(texto)
+        if total >= limite:
+            break
+    return '\n'.join(partes)
+
+
+def _texto_simples(dados):
+    for codificacao in ('utf-8', 'cp1252'):
+        try:
+            return dados.decode(codificacao)
+        except UnicodeDecodeError:
+            continue
+    return dados.decode('latin-1')
+
+
+def extrair_texto(documento):
+    """
+    Texto do arquivo do documento, limitado a CRM_EXTRACAO_MAXIMO_CARACTERES
+
+    Raises:
+        ValueError: formato não suportado, arquivo grande demais ou pypdf
+            ausente (o documento fica como 'ignorado')
+
+    Returns:
+        str
+    """
+    if documento.tamanho > settings.CRM_EXTRACAO_TAMANHO_MAXIMO:
+        raise ValueError(f'Arquivo maior que {settings.CRM_EXTRACAO_TAMANHO_MAXIMO} bytes')
+    limite = settings.CRM_EXTRACAO_MAXIMO_CARACTERES
+    nome = documento.nome.lower()
+
+    with documento.arquivo.open('rb') as arquivo:
+        inicio = arquivo.read(8)
+        arquivo.seek(0)
+        if inicio.startswith(b'%PDF'):
+            texto = _texto_pdf(arquivo, limite)
+        elif inicio.startswith(b'PK') and zipfile.is_zipfile(arquivo):
+            arquivo.seek(0)
+            try:
+                texto = _texto_docx(arquivo, limite)
+            except KeyError:
+                raise ValueError('Arquivo compactado que não é DOCX')
+        else:
+            dados = arquivo.read(limite * 4)
+            if not nome.endswith(_EXTENSOES_TEXTO) and b'\x00' in dados[:8192]:
+                raise ValueError('Formato não suportado')
+            texto = _texto_simples(dados)
+
+    # O PostgreSQL não aceita NUL em colunas de texto
+    return texto.replace('\x00', '')[:limite]
+
+
+def reservar_lote(quantidade, limite_bytes):
+    """
+    Reserva para este worker até `quantidade` textos pendentes, somando
+    no máximo `limite_bytes` de arquivo (ao menos um é sempre reservado)
+
+    Returns:
+        list: TextoDocumento com status 'processando' e o documento carregado
+    """
+    candidatos = (
+        TextoDocumento.objects.filter(status='pendente')
+        .select_related('documento')
+        .order_by('atualizado_em')[:quantidade]
+    )
+    reservados = []
+    total = 0
+    for texto in candidatos:
+        if reservados and total + texto.documento.tamanho > limite_bytes:
+            break
+        reservado = TextoDocumento.objects.filter(
+            documento_id=texto.documento_id, status='pendente'
+        ).update(status='processando', atualizado_em=timezone.now())
+        if reservado:
+            texto.status = 'processando'
+            reservados.append(texto)
+            total += texto.documento.tamanho
+    return reservados
+
+
+def liberar_travados():
+    """
+    Devolve à fila os textos em processamento há mais de
+    CRM_EXTRACAO_TEMPO_MAXIMO segundos (worker interrompido)
+
+    Returns:
+        int
+    """
+    limite = timezone.now() - timedelta(seconds=settings.CRM_EXTRACAO_TEMPO_MAXIMO)
+    return TextoDocumento.objects.filter(status='processando', atualizado_em__lt=limite).update(
+        status='pendente', atualizado_em=timezone.now()
+    )
+
+
+def processar_texto(texto):
+    """Extrai e grava o texto de um TextoDocumento reservado"""
+    documento = texto.documento
+    texto.hash = documento.hash
+    anterior = None
+    if documento.hash:
+        anterior = (
+            TextoDocumento.objects.filter(hash=documento.hash, status__in=['concluido', 'ignorado'])
+            .exclude(documento_id=documento.id)
+            .only('status', 'texto', 'erro')
+            .first()
+        )
+    if anterior is not None:
+        texto.status, texto.texto, texto.erro = anterior.status, anterior.texto, anterior.erro
+    else:
+        try:
+            texto.texto, texto.status, texto.erro = extrair_texto(documento), 'concluido', None
+        except ValueError as e:
+            texto.texto, texto.status, texto.erro = '', 'ignorado', str(e)
+        except Exception as e:
+            texto.texto, texto.status, texto.erro = '', 'erro', f'{type(e).__name__}: {e}'
+    # Só grava se o documento não foi reenfileirado (arquivo trocado) enquanto isso
+    TextoDocumento.objects.filter(documento_id=documento.id, status='processando').update(
+        hash=texto.hash, status=texto.status, texto=texto.texto, erro=texto.erro, atualizado_em=timezone.now(),
+    )
+
+
+def _trecho(texto, termos, tamanho=160):
+    """Trecho ao redor do primeiro termo encontrado (bancos sem snippet)"""
+    minusculo = texto.lower()
+    posicoes = [posicao for posicao in (minusculo.find(termo.lower()) for termo in termos) if posicao >= 0]
+    inicio = max(min(posicoes, default=0) - tamanho // 3, 0)
+    return ('…' if inicio else '') + texto[inicio:inicio + tamanho].replace('\n', ' ') + '…'
+
+
+def buscar_documentos(usuario, consulta, limite=10):
+    """
+    Documentos do usuário cujo texto contém todas as palavras da consulta
+
+    Returns:
+        list: dicts com documento (com o cliente carregado) e trecho, do
+        mais relevante para o menos relevante
+    """
+    termos = re.findall(r'\w+', consulta)
+    if not termos:
+        return []
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT f.rowid, snippet(crm_textodocumento_fts, 0, '', '', '…', 24)
+                FROM crm_textodocumento_fts f
+                JOIN crm_documento d ON d.id = f.rowid
+                JOIN crm_cliente c ON c.id = d.cliente_id
+                WHERE crm_textodocumento_fts MATCH %s AND c.usuario_id = %s
+                ORDER BY f.rank
+                LIMIT %s
+                """,
+                [' '.join(f'"{termo}"' for termo in termos), usuario.id, limite],
+            )
+            trechos = dict(cursor.fetchall())
+    elif connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+        busca = SearchQuery(' '.join(termos), config='portuguese')
+        vetor = SearchVector('texto', config='portuguese')
+        encontrados = (
+            TextoDocumento.objects.filter(documento__cliente__usuario=usuario)
+            .alias(vetor=vetor)
+            .filter(vetor=busca)
+            .annotate(
+                relevancia=SearchRank(vetor, busca),
+                trecho=SearchHeadline('texto', busca, config='portuguese', start_sel='', stop_sel=''),
+            )
+            .order_by('-relevancia')
+        )
+        trechos = dict(encontrados.values_list('documento_id', 'trecho')[:limite])
+    else:
+        filtro = Q()
+        for termo in termos:
+            filtro &= Q(texto__icontains=termo)
+        encontrados = TextoDocumento.objects.filter(filtro, documento__cliente__usuario=usuario, status='concluido')
+        trechos = {
+            documento_id: _trecho(texto, termos)
+            for documento_id, texto in encontrados.values_list('documento_id', 'texto')[:limite]
+        }
+
+    documentos = Documento.objects.select_related('cliente').in_bulk(list(trechos))
+    return [
+        {'documento': documentos[documento_id], 'trecho': trecho}
+        for documento_id, trecho in trechos.items()
+        if documento_id in documentos
+    ]
@@ -359,7 +359,7 @@ class MetaForm(forms.ModelForm):
         model = Meta
         fields = [
             'nome', 'descricao', 'periodo', 'valor_alvo',
-            'data_inicio', 'data_fim'
+            'origem_valor', 'valor_atual', 'data_inicio', 'data_fim'
         ]
         
         widgets = {
@@ -378,6 +378,12 @@ class MetaForm(forms.ModelForm):
                 'step': '0.01',
                 'min': '0'
             }),
+            'origem_valor': forms.Select(attrs={'class': 'form-select'}),
+            'valor_atual': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'min': '0'
+            }),
             'data_inicio': forms.DateInput(attrs={
                 'class': 'form-control',
                 'type': 'date'
@@ -388,6 +394,11 @@ class MetaForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['valor_atual'].required = False
+        self.fields['valor_atual'].help_text = 'Usado apenas em metas manuais'
+
     def clean(self):
         cleaned_data = super().clean()
         data_inicio = cleaned_data.get('data_inicio')
@@ -397,6 +408,10 @@ class MetaForm(forms.ModelForm):
             if data_fim <= data_inicio:
                 raise ValidationError('A data final deve ser posterior à data inicial.')
         
+        # Só metas manuais aceitam o valor atual digitado
+        if cleaned_data.get('origem_valor') != 'manual' or cleaned_data.get('valor_atual') is None:
+            cleaned_data['valor_atual'] = self.instance.valor_atual or 0
+        
         return cleaned_data
 
 
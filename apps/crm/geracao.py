@@ -0,0 +1,585 @@
+"""
+Geração de dados fictícios em escala para testes de carga e regressão
+
+Tudo é sorteado com numpy a partir de uma semente: cada usuário tem o
+próprio gerador, derivado da semente e do número do usuário, então a
+mesma semente (e o mesmo tamanho de lote) gera os mesmos dados, relativos
+à data de referência, com qualquer quantidade de processos. Os clientes
+são gerados em lotes e cada lote entra com bulk_create junto com
+histórico, tarefas, atividades, notas, propostas e tarefas da agenda
+(app calendario), então a memória não
+cresce com o volume.
+"""
+
+import multiprocessing
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.utils import timezone
+
+from apps.calendario.models import CategoriaTarefa, Tarefa as TarefaAgenda
+
+from .analise import atribuir_scores, quadro_etapas
+from .metas import reconciliar_metas
+from .models import (
+    Atividade, Cliente, Funil, HistoricoEtapa, ItemProposta, Meta, Nota, Produto, Proposta, Tag, Tarefa,
+)
+from .previsao import invalidar_dados
+from .utils import PESOS_CNPJ, PESOS_CPF, digito_verificador_cnpj, digito_verificador_cpf
+
+
+PRIMEIROS_NOMES = [
+    'João', 'Maria', 'Pedro', 'Ana', 'Carlos', 'Juliana', 'Fernando', 'Patrícia', 'Ricardo', 'Camila',
+    'Lucas', 'Amanda', 'Rafael', 'Isabela', 'Marcos', 'Tatiane', 'Eduardo', 'Cristina', 'Roberto', 'Vanessa',
+]
+
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Costa', 'Souza', 'Pereira', 'Lima', 'Rocha', 'Alves', 'Martins',
+    'Ribeiro', 'Carvalho', 'Ferreira', 'Gomes', 'Mendes', 'Araújo', 'Barbosa', 'Cardoso', 'Teixeira', 'Moreira',
+]
+
+EMPRESAS = [
+    'Tech Solutions Ltda', 'Inova Digital SA', 'Global Comércio', 'SoftTech Systems',
+    'AgroBrasil', 'ConstruFort', 'HealthCare Medical', 'EduMax Educação',
+    'Logística Express', 'Alimentos Naturais', 'AutoPeças Center', 'Imobiliária Horizonte',
+    'Moda Fashion', 'Consultoria Avançada', 'Energia Sustentável',
+]
+
+SETORES = [
+    'Tecnologia', 'Saúde', 'Educação', 'Construção Civil', 'Varejo',
+    'Indústria', 'Serviços', 'Agronegócio', 'Financeiro', 'Imobiliário',
+]
+
+# DDD -> (cidade, UF), com peso aproximado pela população
+CIDADES = {
+    11: ('São Paulo', 'SP', 0.30), 21: ('Rio de Janeiro', 'RJ', 0.15), 31: ('Belo Horizonte', 'MG', 0.10),
+    41: ('Curitiba', 'PR', 0.08), 51: ('Porto Alegre', 'RS', 0.08), 61: ('Brasília', 'DF', 0.07),
+    71: ('Salvador', 'BA', 0.07), 81: ('Recife', 'PE', 0.06), 85: ('Fortaleza', 'CE', 0.05),
+    48: ('Florianópolis', 'SC', 0.04),
+}
+
+DOMINIOS_EMAIL = ['gmail.com', 'outlook.com', 'yahoo.com.br', 'empresa.com.br']
+
+PRODUTOS = [
+    ('Sistema ERP Empresarial', 'Software', 1500000, 500000),
+    ('Consultoria em Marketing Digital', 'Consultoria', 800000, 200000),
+    ('Site Institucional', 'Serviço', 500000, 150000),
+    ('Treinamento em Vendas', 'Treinamento', 300000, 80000),
+    ('Suporte Técnico Mensal', 'Serviço', 120000, 40000),
+    ('Software Contábil', 'Software', 900000, 300000),
+    ('App Mobile Corporativo', 'Software', 2500000, 800000),
+]
+
+FUNIS = [
+    ('Funil de Vendas Padrão', '#007bff',
+     ['Contato Inicial', 'Qualificação', 'Apresentação', 'Proposta', 'Negociação', 'Fechamento']),
+    ('Funil Enterprise', '#28a745', ['Lead', 'MQL', 'SQL', 'Proposta', 'Negociação', 'Fechado']),
+    ('Funil B2B', '#dc3545',
+     ['Novo', 'Em Contato', 'Reunião Agendada', 'Proposta Enviada', 'Aguardando Resposta', 'Concluído']),
+]
+
+TAGS = [
+    ('VIP', '#dc3545'), ('Potencial Alto', '#28a745'), ('Reagendar', '#ffc107'), ('Frio', '#6c757d'),
+    ('Quente', '#dc3545'), ('Retornar', '#17a2b8'), ('Proposta Enviada', '#007bff'),
+]
+
+CATEGORIAS_AGENDA = [('Trabalho', '#007bff'), ('Pessoal', '#6f42c1'), ('Financeiro', '#28a745')]
+
+# (rótulo, período, alvo, frequência do pandas para o período corrente)
+METAS = [
+    ('Mensal', 'mensal', 50000, 'M'),
+    ('Trimestral', 'trimestral', 150000, 'Q'),
+    ('Anual', 'anual', 600000, 'Y'),
+]
+
+DESCRICOES_ATIVIDADE = [
+    'Cliente demonstrou interesse', 'Agendada próxima reunião',
+    'Enviada proposta comercial', 'Discutido projeto detalhado',
+]
+TITULOS_TAREFA = ['Contatar', 'Enviar proposta', 'Agendar reunião', 'Follow-up', 'Preparar apresentação']
+TITULOS_NOTA = ['Observação importante', 'Informação adicional', 'Detalhe do contato']
+CONTEUDOS_NOTA = [
+    'Cliente solicitou orçamento detalhado', 'Demonstrou preocupação com prazo',
+    'Solicitou demonstração do produto', 'Foi muito receptivo na reunião',
+]
+
+# Distribuições: contagens por cliente seguem Poisson com estas médias
+PESOS_FUNIL = [0.6, 0.25, 0.15]
+DECAIMENTO_ETAPAS = 0.65  # cada etapa tem ~65% dos clientes da anterior
+MEDIA_ATIVIDADES = 3.0
+MEDIA_TAREFAS = 1.5
+MEDIA_NOTAS = 0.7
+TAREFAS_AVULSAS = 0.1  # tarefas sem cliente, em proporção aos clientes
+TAREFAS_AGENDA = 0.5  # tarefas do calendário, em proporção aos clientes
+CHANCE_RECORRENTE = 0.05
+CHANCE_TAG = 0.15
+CHANCE_DOCUMENTO = 0.8
+CHANCE_PJ = 0.55
+HORAS_ULTIMA_ETAPA = 30 * 24  # tempo médio na etapa final, que não tem prazo
+DIAS_ATIVIDADES = 60  # atividades distribuídas nos últimos N dias
+DIAS_AGENDA = 20  # desvio padrão do vencimento das tarefas em torno da referência
+DIAS_ACEITE = 90
+
+TAMANHO_LOTE = 5000
+
+_NS_HORA = 3600 * 10**9
+_NS_DIA = 24 * _NS_HORA
+
+
+def _escolher(rng, opcoes, quantidade, pesos=None):
+    return np.asarray(opcoes, dtype=object)[rng.choice(len(opcoes), quantidade, p=pesos)]
+
+
+def _rotulos(choices, quantidade, rng, pesos=None):
+    """Sorteia chaves de um *_CHOICES e devolve (chaves, rótulos)"""
+    posicoes = rng.choice(len(choices), quantidade, p=pesos)
+    chaves = np.array([chave for chave, _ in choices], dtype=object)[posicoes]
+    rotulos = np.array([rotulo for _, rotulo in choices], dtype=object)[posicoes]
+    return chaves, rotulos
+
+
+def _datas(ns):
+    """Nanossegundos desde a época para datetimes com fuso (UTC)"""
+    return pd.to_datetime(np.asarray(ns, dtype=np.int64), utc=True).to_pydatetime()
+
+
+def _reais(centavos):
+    return [Decimal(int(valor)).scaleb(-2) for valor in centavos]
+
+
+def _sem_acentos(textos):
+    return np.array([
+        unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+        for texto in textos
+    ], dtype=object)
+
+
+def _documentos(rng, pessoa_juridica):
+    """CPFs (PF) e CNPJs (PJ) válidos, já formatados"""
+    documentos = np.empty(len(pessoa_juridica), dtype=object)
+    for juridica, tamanho, pesos, digito in (
+        (False, 9, PESOS_CPF, digito_verificador_cpf),
+        (True, 12, PESOS_CNPJ, digito_verificador_cnpj),
+    ):
+        posicoes = np.flatnonzero(pessoa_juridica == juridica)
+        matriz = rng.integers(0, 10, (len(posicoes), tamanho))
+        if juridica:
+            matriz[:, 8:12] = [0, 0, 0, 1]  # matriz (filial 0001)
+        for peso in pesos:
+            matriz = np.column_stack([matriz, digito(matriz, peso)])
+        for posicao, numeros in zip(posicoes, matriz):
+            d = ''.join(map(str, numeros))
+            documentos[posicao] = (
+                f'{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}' if juridica
+                else f'{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}'
+            )
+    return documentos
+
+
+def nomes_usuarios(quantidade, prefixo='teste'):
+    return [f'{prefixo}{numero}' for numero in range(1, quantidade + 1)]
+
+
+def criar_usuarios(quantidade, prefixo='teste', senha=None):
+    """
+    Garante os usuários fictícios <prefixo>1..<prefixo>N
+
+    Os que faltam são criados de uma vez, todos com o mesmo hash de senha
+    (padrão: <prefixo>123), para não pagar o custo do hash por usuário.
+
+    Returns:
+        list: User na ordem dos números
+    """
+    nomes = nomes_usuarios(quantidade, prefixo)
+    existentes = set(User.objects.filter(username__in=nomes).values_list('username', flat=True))
+    hash_senha = make_password(senha or f'{prefixo}123')
+    User.objects.bulk_create(
+        [
+            User(username=nome, email=f'{nome}@empresa.com', password=hash_senha, first_name=nome.title())
+            for nome in nomes if nome not in existentes
+        ],
+        batch_size=1000,
+    )
+    usuarios = User.objects.in_bulk(nomes, field_name='username')
+    return [usuarios[nome] for nome in nomes]
+
+
+def _estrutura_usuario(rng, usuario, referencia):
+    """Funis, tags, produtos, metas e categorias da agenda do usuário"""
+    funis = []
+    for nome, cor, etapas in FUNIS:
+        prazos = rng.integers(24, 169, len(etapas))
+        taxas = rng.integers(30, 81, len(etapas) - 1)
+        funis.append(Funil(
+            nome=nome, cor=cor, etapas=etapas, usuario=usuario,
+            # A última etapa é o fechamento: sem prazo
+            prazos={etapa: int(prazo) for etapa, prazo in zip(etapas[:-1], prazos)} | {etapas[-1]: 0},
+            taxas_conversao={etapa: int(taxa) for etapa, taxa in zip(etapas[:-1], taxas)},
+        ))
+    funis = Funil.objects.bulk_create(funis)
+
+    tags = Tag.objects.bulk_create([Tag(nome=nome, cor=cor, usuario=usuario) for nome, cor in TAGS])
+    produtos = Produto.objects.bulk_create([
+        Produto(
+            nome=nome, categoria=categoria, preco=Decimal(preco).scaleb(-2), custo=Decimal(custo).scaleb(-2),
+            codigo=f'PROD-{usuario.id}-{posicao + 1}', usuario=usuario,
+        )
+        for posicao, (nome, categoria, preco, custo) in enumerate(PRODUTOS)
+    ])
+
+    hoje = timezone.localdate(referencia)
+    Meta.objects.bulk_create([
+        Meta(
+            nome=f'Meta de Vendas {rotulo}', descricao=f'Meta de vendas para o período {periodo}',
+            periodo=periodo, valor_alvo=Decimal(alvo), usuario=usuario,
+            data_inicio=pd.Period(hoje, freq).start_time.date(), data_fim=pd.Period(hoje, freq).end_time.date(),
+        )
+        for rotulo, periodo, alvo, freq in METAS
+    ])
+    categorias = CategoriaTarefa.objects.bulk_create([
+        CategoriaTarefa(nome=nome, cor=cor, usuario=usuario) for nome, cor in CATEGORIAS_AGENDA
+    ])
+    return funis, tags, produtos, categorias
+
+
+def _gerar_lote(rng, usuario, funis, etapas, tags, produtos, categorias, quantidade, primeiro, referencia):
+    """Gera e grava um lote de clientes com todos os registros relacionados"""
+    n = quantidade
+    agora_ns = int(pd.Timestamp(referencia).value)
+    contagem = Counter()
+
+    # ---- Clientes ----
+    total_etapas = len(FUNIS[0][2])
+    pesos_etapa = DECAIMENTO_ETAPAS ** np.arange(total_etapas)
+    funil = rng.choice(len(funis), n, p=PESOS_FUNIL)
+    posicao = rng.choice(total_etapas, n, p=pesos_etapa / pesos_etapa.sum())
+    prazos = np.array([[f.prazos[etapa] for etapa in f.etapas] for f in funis], dtype=float)
+    medias = np.where(prazos == 0, HORAS_ULTIMA_ETAPA, prazos)
+    # Tempo na etapa exponencial com média no prazo: ~37% dos clientes atrasados
+    entrada_ns = agora_ns - (rng.exponential(medias[funil, posicao]) * _NS_HORA).astype(np.int64)
+
+    pessoa_juridica = rng.random(n) < CHANCE_PJ
+    primeiros = _escolher(rng, PRIMEIROS_NOMES, n)
+    sobrenomes = _escolher(rng, SOBRENOMES, n)
+    nomes = primeiros + ' ' + sobrenomes
+    empresas = np.where(pessoa_juridica, _escolher(rng, EMPRESAS, n), None)
+    documentos = np.where(rng.random(n) < CHANCE_DOCUMENTO, _documentos(rng, pessoa_juridica), None)
+    dominios = _escolher(rng, DOMINIOS_EMAIL, n)
+    emails = [
+        f'{primeiro}.{sobrenome}{numero}@{dominio}'
+        for primeiro, sobrenome, numero, dominio in zip(
+            _sem_acentos(primeiros), _sem_acentos(sobrenomes), range(primeiro, primeiro + n), dominios
+        )
+    ]
+    ddds = list(CIDADES)
+    ddd = rng.choice(ddds, n, p=[peso for _, _, peso in CIDADES.values()])
+    numeros = rng.integers(0, 10**8, n)
+    valores = np.clip(rng.lognormal(np.log(20000), 0.9, n), 500, 5_000_000)
+    origens, _ = _rotulos(Cliente.ORIGEM_CHOICES, n, rng, [0.2, 0.25, 0.2, 0.1, 0.1, 0.1, 0.05])
+    probabilidades = np.clip(10 + posicao * 15 + rng.integers(-10, 11, n), 0, 100)
+    setores = _escolher(rng, SETORES, n)
+
+    # Atividades vêm antes para definir o último contato de cada cliente
+    por_cliente = rng.poisson(MEDIA_ATIVIDADES, n)
+    atividade_cliente = np.repeat(np.arange(n), por_cliente)
+    m = len(atividade_cliente)
+    atividade_ns = agora_ns - (rng.random(m) * DIAS_ATIVIDADES * _NS_DIA).astype(np.int64)
+    ultimo_ns = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(ultimo_ns, atividade_cliente, atividade_ns)
+    ultimo_contato = np.where(ultimo_ns > np.iinfo(np.int64).min, _datas(np.maximum(ultimo_ns, 0)), None)
+
+    entradas = _datas(entrada_ns)
+    clientes = [
+        Cliente(
+            nome=nomes[i], tipo_pessoa='PJ' if pessoa_juridica[i] else 'PF', cpf_cnpj=documentos[i],
+            telefone=f'({ddd[i]}) 9{numeros[i] // 10000:04d}-{numeros[i] % 10000:04d}',
+            email=emails[i], cidade=CIDADES[ddd[i]][0], estado=CIDADES[ddd[i]][1],
+            empresa=empresas[i], setor=setores[i], valor_estimado=Decimal(f'{valores[i]:.2f}'),
+            origem=origens[i], funil=funis[funil[i]], etapa=funis[funil[i]].etapas[posicao[i]],
+            data_entrada_etapa=entradas[i], probabilidade=int(probabilidades[i]),
+            ultimo_contato=ultimo_contato[i], usuario=usuario,
+        )
+        for i in range(n)
+    ]
+    atribuir_scores(clientes, etapas, referencia)
+    Cliente.objects.bulk_create(clientes, batch_size=TAMANHO_LOTE)
+    ids = np.array([cliente.id for cliente in clientes])
+    contagem['clientes'] += n
+
+    # ---- Tags ----
+    linhas, colunas = np.nonzero(rng.random((n, len(tags))) < CHANCE_TAG)
+    Cliente.tags.through.objects.bulk_create(
+        [Cliente.tags.through(cliente_id=ids[i], tag_id=tags[t].id) for i, t in zip(linhas, colunas)],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['tags de clientes'] += len(linhas)
+
+    # ---- Histórico: passagens encerradas pelas etapas anteriores + a atual ----
+    duracoes = (rng.exponential(medias[funil] * 0.8) * _NS_HORA).astype(np.int64)
+    anteriores = np.arange(total_etapas) < posicao[:, None]
+    duracoes = np.where(anteriores, duracoes, 0)
+    # Entrada na etapa j = entrada na atual menos as durações de j até a atual
+    restantes = np.cumsum(duracoes[:, ::-1], axis=1)[:, ::-1]
+    inicio_ns = entrada_ns[:, None] - restantes
+    cliente_h, etapa_h = np.nonzero(anteriores)
+    inicios = _datas(inicio_ns[cliente_h, etapa_h])
+    saidas = _datas(inicio_ns[cliente_h, etapa_h] + duracoes[cliente_h, etapa_h])
+    historico = [
+        HistoricoEtapa(
+            cliente_id=ids[c], funil=funis[funil[c]], etapa=funis[funil[c]].etapas[e],
+            usuario=usuario, data_entrada=inicio, data_saida=saida,
+        )
+        for c, e, inicio, saida in zip(cliente_h, etapa_h, inicios, saidas)
+    ]
+    historico += [
+        HistoricoEtapa(
+            cliente_id=cliente.id, funil=cliente.funil, etapa=cliente.etapa,
+            usuario=usuario, data_entrada=cliente.data_entrada_etapa,
+        )
+        for cliente in clientes
+    ]
+    HistoricoEtapa.objects.bulk_create(historico, batch_size=TAMANHO_LOTE)
+    contagem['histórico de etapas'] += len(historico)
+
+    # ---- Atividades ----
+    tipos, rotulos = _rotulos(Atividade.TIPO_CHOICES, m, rng)
+    resultados = _escolher(rng, [chave for chave, _ in Atividade.RESULTADO_CHOICES], m)
+    descricoes = _escolher(rng, DESCRICOES_ATIVIDADE, m)
+    duracoes_atividade = rng.integers(5, 121, m)
+    datas_atividade = _datas(atividade_ns)
+    Atividade.objects.bulk_create(
+        [
+            Atividade(
+                tipo=tipos[k], titulo=f'{rotulos[k]} com {nomes[c]}', descricao=descricoes[k],
+                resultado=resultados[k], cliente_id=ids[c], usuario=usuario,
+                duracao_minutos=int(duracoes_atividade[k]), data_atividade=datas_atividade[k],
+            )
+            for k, c in enumerate(atividade_cliente)
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['atividades'] += m
+
+    # ---- Tarefas (inclusive avulsas, que só aparecem na agenda) ----
+    tarefa_cliente = np.concatenate([
+        np.repeat(np.arange(n), rng.poisson(MEDIA_TAREFAS, n)),
+        np.full(rng.poisson(TAREFAS_AVULSAS * n), -1),
+    ])
+    t = len(tarefa_cliente)
+    vencimento_ns = agora_ns + (rng.normal(0, DIAS_AGENDA, t) * _NS_DIA).astype(np.int64)
+    vencidas = vencimento_ns < agora_ns
+    status = np.where(
+        vencidas,
+        _escolher(rng, ['concluida', 'pendente', 'cancelada'], t, [0.7, 0.25, 0.05]),
+        _escolher(rng, ['pendente', 'em_andamento'], t, [0.75, 0.25]),
+    )
+    conclusao_ns = vencimento_ns - (rng.random(t) * 48 * _NS_HORA).astype(np.int64)
+    tipos_tarefa = _escolher(rng, [chave for chave, _ in Tarefa.TIPO_CHOICES], t)
+    prioridades = _escolher(rng, ['baixa', 'media', 'alta', 'urgente'], t, [0.25, 0.45, 0.2, 0.1])
+    titulos = _escolher(rng, TITULOS_TAREFA, t)
+    estimados = rng.integers(15, 181, t)
+    vencimentos = _datas(vencimento_ns)
+    conclusoes = _datas(conclusao_ns)
+    Tarefa.objects.bulk_create(
+        [
+            Tarefa(
+                titulo=f'{titulos[k]} - {nomes[c]}' if c >= 0 else titulos[k],
+                tipo=tipos_tarefa[k], status=status[k], prioridade=prioridades[k],
+                cliente_id=ids[c] if c >= 0 else None, usuario=usuario, responsavel=usuario,
+                data_vencimento=vencimentos[k],
+                data_conclusao=conclusoes[k] if status[k] == 'concluida' else None,
+                tempo_estimado=int(estimados[k]),
+            )
+            for k, c in enumerate(tarefa_cliente)
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['tarefas'] += t
+
+    # ---- Notas ----
+    nota_cliente = np.repeat(np.arange(n), rng.poisson(MEDIA_NOTAS, n))
+    titulos_nota = _escolher(rng, TITULOS_NOTA, len(nota_cliente))
+    conteudos = _escolher(rng, CONTEUDOS_NOTA, len(nota_cliente))
+    fixadas = rng.random(len(nota_cliente)) < 0.2
+    Nota.objects.bulk_create(
+        [
+            Nota(
+                titulo=titulos_nota[k], conteudo=f'Nota sobre {nomes[c]}: {conteudos[k]}',
+                cliente_id=ids[c], usuario=usuario, fixada=bool(fixadas[k]),
+            )
+            for k, c in enumerate(nota_cliente)
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['notas'] += len(nota_cliente)
+
+    # ---- Propostas: mais prováveis nas etapas finais ----
+    com_proposta = np.flatnonzero(rng.random(n) < 0.05 + posicao * 0.12)
+    q = len(com_proposta)
+    status_proposta = _escolher(
+        rng, ['rascunho', 'enviada', 'visualizada', 'aceita', 'rejeitada', 'expirada'], q,
+        [0.1, 0.25, 0.2, 0.25, 0.15, 0.05],
+    )
+    status_proposta[posicao[com_proposta] == total_etapas - 1] = 'aceita'
+    aceite = _datas(agora_ns - (rng.random(q) * DIAS_ACEITE * _NS_DIA).astype(np.int64))
+    validade = rng.integers(15, 61, q)
+
+    itens_por_proposta = rng.integers(1, 5, q)
+    item_proposta = np.repeat(np.arange(q), itens_por_proposta)
+    produto = rng.integers(0, len(produtos), len(item_proposta))
+    quantidades = rng.integers(1, 4, len(item_proposta))
+    precos = np.rint(np.array([PRODUTOS[p][2] for p in produto]) * rng.uniform(0.9, 1.1, len(produto)))
+    descontos_item = np.minimum(rng.integers(0, 100_001, len(produto)), quantidades * precos // 10)
+    totais = np.bincount(item_proposta, quantidades * precos - descontos_item, minlength=q)
+    descontos = np.floor(totais * rng.uniform(0, 0.1, q))
+
+    hoje = timezone.localdate(referencia)
+    propostas = Proposta.objects.bulk_create(
+        [
+            Proposta(
+                numero=f'PROP-{usuario.id}-{ids[c]}',
+                titulo=f'Proposta Comercial - {empresas[c] or nomes[c]}',
+                descricao=f'Proposta comercial para {nomes[c]}',
+                status=status_proposta[k], valor_total=valor, desconto=desconto,
+                cliente_id=ids[c], usuario=usuario,
+                data_validade=hoje + timedelta(days=int(validade[k])),
+                data_aceite=aceite[k] if status_proposta[k] == 'aceita' else None,
+            )
+            for k, (c, valor, desconto) in enumerate(zip(com_proposta, _reais(totais), _reais(descontos)))
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    ItemProposta.objects.bulk_create(
+        [
+            ItemProposta(
+                proposta_id=propostas[k].id, produto_id=produtos[p].id, quantidade=int(quantidade),
+                preco_unitario=preco, desconto=desconto,
+            )
+            for k, p, quantidade, preco, desconto in zip(
+                item_proposta, produto, quantidades, _reais(precos), _reais(descontos_item)
+            )
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['propostas'] += q
+    contagem['itens de proposta'] += len(item_proposta)
+
+    # ---- Tarefas da agenda (app calendario, só com datas) ----
+    a = rng.poisson(TAREFAS_AGENDA * n)
+    dias = np.rint(rng.normal(0, DIAS_AGENDA, a)).astype(int)
+    status_agenda = np.where(
+        dias < 0,
+        _escolher(rng, ['concluida', 'pendente', 'cancelada'], a, [0.7, 0.25, 0.05]),
+        _escolher(rng, ['pendente', 'em_andamento'], a, [0.75, 0.25]),
+    )
+    prioridades_agenda = _escolher(rng, ['baixa', 'media', 'alta'], a, [0.3, 0.5, 0.2])
+    categoria = rng.integers(-1, len(categorias), a)  # -1: sem categoria
+    recorrentes = rng.random(a) < CHANCE_RECORRENTE
+    titulos_agenda = _escolher(rng, TITULOS_TAREFA, a)
+    TarefaAgenda.objects.bulk_create(
+        [
+            TarefaAgenda(
+                titulo=titulos_agenda[k], data_vencimento=hoje + timedelta(days=int(dias[k])),
+                data_conclusao=hoje + timedelta(days=int(dias[k])) if status_agenda[k] == 'concluida' else None,
+                categoria=categorias[categoria[k]] if categoria[k] >= 0 else None,
+                prioridade=prioridades_agenda[k], status=status_agenda[k],
+                recorrente=bool(recorrentes[k]), usuario=usuario, atribuido_a=usuario,
+            )
+            for k in range(a)
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
+    contagem['tarefas da agenda'] += a
+    return contagem
+
+
+def gerar_usuario(usuario_id, numero, clientes, semente=42, referencia=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Gera todos os dados de um usuário
+
+    Args:
+        usuario_id: int
+        numero: int - posição do usuário, usada junto com a semente
+        clientes: int - clientes a gerar
+        semente: int
+        referencia: DateTime (opcional) - "agora" dos dados gerados
+        tamanho_lote: int - clientes gravados por vez
+
+    Returns:
+        Counter: linhas criadas por tipo de registro
+    """
+    referencia = referencia or timezone.now()
+    rng = np.random.default_rng([semente, numero])
+    usuario = User.objects.get(id=usuario_id)
+
+    with transaction.atomic():
+        funis, tags, produtos, categorias = _estrutura_usuario(rng, usuario, referencia)
+    etapas = quadro_etapas(funis)
+
+    contagem = Counter()
+    for inicio in range(0, clientes, tamanho_lote):
+        with transaction.atomic():
+            contagem += _gerar_lote(
+                rng, usuario, funis, etapas, tags, produtos, categorias,
+                min(tamanho_lote, clientes - inicio), inicio + 1, referencia,
+            )
+
+    # bulk_create não dispara os signals: metas e caches são acertados no fim
+    reconciliar_metas(Meta.objects.filter(usuario=usuario))
+    invalidar_dados(usuario.id)
+    return contagem
+
+
+def _gerar_usuario_processo(argumentos):
+    return argumentos[0], gerar_usuario(*argumentos)
+
+
+def gerar_dados(usuarios, clientes, semente=42, referencia=None, tamanho_lote=TAMANHO_LOTE,
+                processos=1, avancar=None):
+    """
+    Gera os dados de vários usuários, opcionalmente em paralelo
+
+    Com processos > 1 cada usuário é gerado em um processo filho (fork);
+    use um banco com escrita concorrente (PostgreSQL) nesse caso.
+
+    Args:
+        usuarios: list de User (ver criar_usuarios)
+        clientes: int - clientes por usuário
+        semente: int
+        referencia: DateTime (opcional)
+        tamanho_lote: int
+        processos: int
+        avancar: callable (opcional) - avancar(usuario_id, contagem) ao terminar cada usuário
+
+    Returns:
+        Counter: linhas criadas por tipo de registro
+    """
+    referencia = referencia or timezone.now()
+    tarefas = [
+        (usuario.id, numero, clientes, semente, referencia, tamanho_lote)
+        for numero, usuario in enumerate(usuarios, start=1)
+    ]
+
+    total = Counter()
+    if processos > 1:
+        # Os filhos abrem as próprias conexões; as herdadas não podem ser usadas
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(processos) as pool:
+            for usuario_id, contagem in pool.imap_unordered(_gerar_usuario_processo, tarefas):
+                total += contagem
+                if avancar:
+                    avancar(usuario_id, contagem)
+    else:
+        for argumentos in tarefas:
+            usuario_id, contagem = _gerar_usuario_processo(argumentos)
+            total += contagem
+            if avancar:
+                avancar(usuario_id, contagem)
+    return total
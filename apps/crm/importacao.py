@@ -0,0 +1,367 @@
+"""
+Importação de clientes em massa a partir de CSV ou XLSX
+
+O arquivo é lido linha a linha e processado em lotes: cada lote é
+validado com as mesmas regras dos campos do modelo (mais CPF/CNPJ,
+telefone, funil e etapa), as tags novas são criadas de uma vez e os
+clientes válidos entram com bulk_create, junto com as tags e a entrada
+no histórico de etapas. As linhas recusadas vão para um relatório CSV
+com o número da linha, o campo e o motivo.
+"""
+
+import csv
+import io
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .analise import atribuir_scores, quadro_etapas
+from .metas import reconciliar_metas
+from .models import Cliente, Funil, HistoricoEtapa, Meta, Tag
+from .previsao import invalidar_dados
+from .utils import formatar_telefone, limpar_dados_telefone, validar_documentos
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - dependência opcional
+    openpyxl = None
+
+
+# Campos do modelo aceitos diretamente como colunas do arquivo
+CAMPOS_IMPORTACAO = [
+    'nome', 'tipo_pessoa', 'cpf_cnpj', 'telefone', 'telefone_alternativo',
+    'email', 'email_alternativo', 'endereco', 'cidade', 'estado', 'cep',
+    'empresa', 'cargo', 'setor', 'valor_estimado', 'origem',
+    'linkedin', 'facebook', 'instagram', 'probabilidade', 'observacoes',
+]
+
+# Colunas tratadas à parte (ver _validar_linha)
+COLUNAS_ESPECIAIS = ['funil', 'etapa', 'tags']
+
+TAMANHO_LOTE = 1000
+
+CABECALHO_RELATORIO = ['Linha', 'Campo', 'Valor', 'Erro']
+
+
+def xlsx_disponivel():
+    """Indica se o openpyxl está instalado para ler planilhas XLSX"""
+    return openpyxl is not None
+
+
+def _normalizar_coluna(nome):
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    return nome.strip().lower().replace(' ', '_')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    return str(valor).strip()
+
+
+def ler_linhas(arquivo, nome_arquivo):
+    """
+    Lê o arquivo sob demanda, uma linha por vez
+
+    Args:
+        arquivo: arquivo binário aberto
+        nome_arquivo: str - a extensão define o formato (.csv ou .xlsx)
+
+    Returns:
+        iterator: tuplas (número da linha no arquivo, dict {coluna
+        normalizada: texto}); linhas em branco do CSV são puladas, mas a
+        numeração segue a do arquivo
+    """
+    if nome_arquivo.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise ValueError('A importação de XLSX requer o pacote openpyxl (pip install openpyxl)')
+        planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            linhas = planilha.active.iter_rows(values_only=True)
+            cabecalho = [_normalizar_coluna(coluna) for coluna in next(linhas, ())]
+            for numero, linha in enumerate(linhas, start=2):
+                yield numero, {coluna: _texto(valor) for coluna, valor in zip(cabecalho, linha) if coluna}
+        finally:
+            planilha.close()
+        return
+
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        # Planilhas exportadas em português costumam usar ";" como separador
+        amostra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+        except csv.Error:
+            dialeto = csv.excel
+        leitor = csv.reader(texto, dialeto)
+        cabecalho = [_normalizar_coluna(coluna) for coluna in next(leitor, [])]
+        # line_num conta linhas físicas (campos entre aspas podem ter quebras)
+        numero = leitor.line_num + 1
+        for linha in leitor:
+            if any(linha):
+                yield numero, {coluna: valor.strip() for coluna, valor in zip(cabecalho, linha) if coluna}
+            numero = leitor.line_num + 1
+    finally:
+        texto.detach()
+
+
+def contar_linhas(arquivo, nome_arquivo):
+    """
+    Estima quantas linhas de dados o arquivo tem, para o progresso
+
+    Args:
+        arquivo: arquivo binário aberto (volta ao início ao final)
+        nome_arquivo: str
+
+    Returns:
+        int
+    """
+    total = 0
+    if nome_arquivo.lower().endswith('.xlsx'):
+        if openpyxl is not None:
+            planilha = openpyxl.load_workbook(arquivo, read_only=True)
+            total = max((planilha.active.max_row or 1) - 1, 0)
+            planilha.close()
+    else:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            total += bloco.count(b'\n')
+        total = max(total - 1, 0)
+    arquivo.seek(0)
+    return total
+
+
+def _valor_decimal(texto):
+    texto = texto.replace('R$', '').replace(' ', '')
+    if ',' in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValidationError('Informe um número válido.')
+
+
+def _documento(digitos, valido, tipo_pessoa):
+    """Tipo de pessoa e documento formatado, a partir do resultado de validar_documentos"""
+    if len(digitos) == 11 and tipo_pessoa in (None, 'PF'):
+        if not valido:
+            raise ValidationError('CPF inválido.')
+        return 'PF', f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+    if len(digitos) == 14 and tipo_pessoa in (None, 'PJ'):
+        if not valido:
+            raise ValidationError('CNPJ inválido.')
+        return 'PJ', f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
+    if tipo_pessoa == 'PF':
+        raise ValidationError('CPF deve ter 11 dígitos.')
+    if tipo_pessoa == 'PJ':
+        raise ValidationError('CNPJ deve ter 14 dígitos.')
+    raise ValidationError('CPF/CNPJ deve ter 11 ou 14 dígitos.')
+
+
+def _telefone(texto):
+    digitos = limpar_dados_telefone(texto)
+    if len(digitos) in (12, 13) and digitos.startswith('55'):
+        digitos = digitos[2:]
+    if len(digitos) not in (10, 11):
+        raise ValidationError('Telefone deve ter DDD e 8 ou 9 dígitos.')
+    return formatar_telefone(digitos)
+
+
+class _Contexto:
+    """Funis e tags do usuário carregados uma vez por importação"""
+
+    def __init__(self, usuario, funil_padrao=None):
+        self.usuario = usuario
+        self.funil_padrao = funil_padrao
+        self.funis = {}
+        for funil in Funil.objects.filter(usuario=usuario):
+            self.funis[str(funil.id)] = funil
+            self.funis.setdefault(funil.nome.strip().lower(), funil)
+        self.etapas = quadro_etapas({funil.id: funil for funil in self.funis.values()}.values())
+        self.tags = dict(Tag.objects.filter(usuario=usuario).values_list('nome', 'id'))
+
+    def garantir_tags(self, nomes):
+        """Cria de uma vez as tags ainda inexistentes do lote"""
+        novas = set(nomes) - self.tags.keys()
+        if not novas:
+            return
+        Tag.objects.bulk_create(
+            [Tag(nome=nome, usuario=self.usuario) for nome in novas],
+            ignore_conflicts=True,
+        )
+        self.tags.update(
+            Tag.objects.filter(usuario=self.usuario, nome__in=novas).values_list('nome', 'id')
+        )
+
+
+def _validar_linha(dados, contexto, documento):
+    """
+    Converte uma linha do arquivo em um Cliente não salvo
+
+    Args:
+        dados: dict da linha (ver ler_linhas)
+        contexto: _Contexto
+        documento: tuple (dígitos, válido) do CPF/CNPJ, já validado com o lote
+
+    Returns:
+        tuple: (Cliente ou None, list de nomes de tags, list de (campo, valor, erro))
+    """
+    erros = []
+    valores = {}
+
+    tipo_pessoa = dados.get('tipo_pessoa', '').upper() or None
+    if tipo_pessoa and tipo_pessoa not in ('PF', 'PJ'):
+        erros.append(('tipo_pessoa', dados['tipo_pessoa'], 'Use PF ou PJ.'))
+        tipo_pessoa = None
+
+    for campo in CAMPOS_IMPORTACAO:
+        texto = dados.get(campo, '')
+        if campo == 'tipo_pessoa' or (not texto and campo != 'nome'):
+            continue
+        try:
+            if campo == 'cpf_cnpj':
+                tipo_pessoa, valor = _documento(*documento, tipo_pessoa)
+            elif campo in ('telefone', 'telefone_alternativo'):
+                valor = _telefone(texto)
+            elif campo == 'valor_estimado':
+                valor = _valor_decimal(texto)
+            elif campo == 'estado':
+                valor = texto.upper()
+            elif campo == 'origem':
+                valor = texto.lower()
+            else:
+                valor = texto
+            valores[campo] = Cliente._meta.get_field(campo).clean(valor, None)
+        except ValidationError as e:
+            erros.append((campo, texto, ' '.join(e.messages)))
+    if tipo_pessoa:
+        valores['tipo_pessoa'] = tipo_pessoa
+
+    funil = contexto.funil_padrao
+    if dados.get('funil'):
+        funil = contexto.funis.get(dados['funil'].strip().lower())
+        if funil is None:
+            erros.append(('funil', dados['funil'], 'Funil não encontrado.'))
+    elif funil is None:
+        erros.append(('funil', '', 'Funil não informado.'))
+
+    etapa = dados.get('etapa', '')
+    if funil is not None:
+        if not etapa:
+            etapa = funil.etapas[0] if funil.etapas else 'Nova'
+        elif etapa not in funil.etapas:
+            erros.append(('etapa', etapa, f'Etapa não existe no funil {funil.nome}.'))
+
+    tags = []
+    for nome in dados.get('tags', '').replace(',', ';').split(';'):
+        nome = nome.strip()
+        if len(nome) > 50:
+            erros.append(('tags', nome, 'Tag com mais de 50 caracteres.'))
+        elif nome and nome not in tags:
+            tags.append(nome)
+
+    if erros:
+        return None, [], erros
+    cliente = Cliente(usuario=contexto.usuario, funil=funil, etapa=etapa, **valores)
+    return cliente, tags, []
+
+
+def _gravar_lote(lote, contexto, agora):
+    """Insere os clientes válidos de um lote, com tags e histórico de etapas"""
+    clientes = [cliente for cliente, _ in lote]
+    contexto.garantir_tags({nome for _, tags in lote for nome in tags})
+    atribuir_scores(clientes, contexto.etapas, agora)
+
+    with transaction.atomic():
+        Cliente.objects.bulk_create(clientes, batch_size=TAMANHO_LOTE)
+        Cliente.tags.through.objects.bulk_create(
+            [
+                Cliente.tags.through(cliente_id=cliente.id, tag_id=contexto.tags[nome])
+                for cliente, tags in lote
+                for nome in tags
+            ],
+            batch_size=TAMANHO_LOTE,
+        )
+        HistoricoEtapa.objects.bulk_create(
+            [
+                HistoricoEtapa(
+                    cliente=cliente,
+                    funil=cliente.funil,
+                    etapa=cliente.etapa,
+                    usuario=cliente.usuario,
+                    data_entrada=cliente.data_entrada_etapa,
+                )
+                for cliente in clientes
+            ],
+            batch_size=TAMANHO_LOTE,
+        )
+
+
+def _processar_lote(linhas, contexto, escritor, agora, resultado):
+    """Valida um lote de linhas, registra as recusadas e grava as válidas"""
+    validos, digitos = validar_documentos([dados.get('cpf_cnpj', '') for _, dados in linhas])
+
+    lote = []
+    for (numero, dados), documento in zip(linhas, zip(digitos, validos)):
+        cliente, tags, erros = _validar_linha(dados, contexto, documento)
+        if erros:
+            resultado['erros'] += 1
+            for campo, valor, mensagem in erros:
+                escritor.writerow([numero, campo, valor, mensagem])
+        else:
+            cliente.data_entrada_etapa = agora
+            lote.append((cliente, tags))
+
+    if lote:
+        _gravar_lote(lote, contexto, agora)
+    resultado['linhas'] += len(linhas)
+    resultado['importados'] += len(lote)
+
+
+def importar_clientes(arquivo, nome_arquivo, usuario, relatorio, funil_padrao=None,
+                      tamanho_lote=TAMANHO_LOTE, avancar=None):
+    """
+    Importa clientes de um CSV/XLSX em lotes com bulk_create
+
+    Args:
+        arquivo: arquivo binário aberto
+        nome_arquivo: str - define o formato pela extensão
+        usuario: User - dono dos clientes importados
+        relatorio: arquivo de texto onde as linhas recusadas são registradas
+        funil_padrao: Funil (opcional) - usado quando a linha não informa o funil
+        tamanho_lote: int - linhas validadas e inseridas por vez
+        avancar: callable (opcional) - avancar(linhas) a cada lote
+
+    Returns:
+        dict: linhas lidas, clientes importados e linhas com erro
+    """
+    contexto = _Contexto(usuario, funil_padrao)
+    escritor = csv.writer(relatorio)
+    escritor.writerow(CABECALHO_RELATORIO)
+    agora = timezone.now()
+    resultado = {'linhas': 0, 'importados': 0, 'erros': 0}
+
+    pendentes = []
+    for numero, dados in ler_linhas(arquivo, nome_arquivo):
+        pendentes.append((numero, dados))
+        if len(pendentes) == tamanho_lote:
+            _processar_lote(pendentes, contexto, escritor, agora, resultado)
+            if avancar:
+                avancar(len(pendentes))
+            pendentes = []
+
+    if pendentes:
+        _processar_lote(pendentes, contexto, escritor, agora, resultado)
+        if avancar:
+            avancar(len(pendentes))
+
+    # bulk_create não dispara os signals: invalida os caches e corrige as
+    # metas que contam clientes na última etapa de uma só vez
+    if resultado['importados']:
+        invalidar_dados(usuario.id)
+        reconciliar_metas(Meta.objects.filter(usuario=usuario))
+    return resultado
@@ -0,0 +1,148 @@
+"""
+Instrumentação de requisições: tempo de SQL, de templates e de Python
+
+Uma fração das requisições (settings.CRM_INSTRUMENTACAO_AMOSTRAGEM) é
+medida: cada consulta passa por um execute_wrapper e a renderização de
+templates é cronometrada. O resultado vai para o cabeçalho Server-Timing
+(visível nas ferramentas de desenvolvedor do navegador) e para uma linha
+JSON no logger deste módulo. As requisições não sorteadas só pagam o
+sorteio.
+
+O estado da medição fica em uma ContextVar, então threads e requisições
+assíncronas simultâneas não se misturam.
+"""
+
+import contextvars
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template import base as template_base
+
+
+logger = logging.getLogger(__name__)
+
+_medicao = contextvars.ContextVar('medicao_requisicao', default=None)
+_render_original = template_base.Template.render
+
+
+class Medicao:
+    """Acumuladores de uma requisição medida"""
+
+    def __init__(self, maximo_lentas):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.sql_no_template = 0.0
+        self.profundidade_template = 0
+        self.maximo_lentas = maximo_lentas
+        self.lentas = []  # heap de (duração, sql): as mais lentas ficam
+
+    def registrar_consulta(self, sql, duracao):
+        self.consultas += 1
+        self.sql += duracao
+        if self.profundidade_template:
+            # QuerySets avaliados pelo template: contam como SQL, não como template
+            self.sql_no_template += duracao
+        item = (duracao, sql[:300])
+        if len(self.lentas) < self.maximo_lentas:
+            heapq.heappush(self.lentas, item)
+        elif self.maximo_lentas:
+            heapq.heappushpop(self.lentas, item)
+
+    def resumo(self):
+        """Tempos em milissegundos; python é o que sobra do total"""
+        total = time.perf_counter() - self.inicio
+        template = max(self.template - self.sql_no_template, 0.0)
+        return {
+            'total_ms': round(total * 1000, 2),
+            'sql_ms': round(self.sql * 1000, 2),
+            'consultas': self.consultas,
+            'template_ms': round(template * 1000, 2),
+            'python_ms': round(max(total - self.sql - template, 0.0) * 1000, 2),
+            'consultas_lentas': [
+                {'ms': round(duracao * 1000, 2), 'sql': sql}
+                for duracao, sql in sorted(self.lentas, reverse=True)
+            ],
+        }
+
+
+def _cronometrar_consulta(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.registrar_consulta(sql, time.perf_counter() - inicio)
+
+
+def _render_cronometrado(self, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return _render_original(self, context)
+    # Só o template mais externo é cronometrado; includes já estão dentro dele
+    externo = medicao.profundidade_template == 0
+    medicao.profundidade_template += 1
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context)
+    finally:
+        medicao.profundidade_template -= 1
+        if externo:
+            medicao.template += time.perf_counter() - inicio
+
+
+def instrumentar_templates():
+    """Passa a cronometrar Template.render (idempotente)"""
+    template_base.Template.render = _render_cronometrado
+
+
+def cabecalho_server_timing(resumo):
+    return ', '.join([
+        f'sql;dur={resumo["sql_ms"]};desc="{resumo["consultas"]} consultas"',
+        f'tpl;dur={resumo["template_ms"]};desc="templates"',
+        f'py;dur={resumo["python_ms"]};desc="python"',
+        f'total;dur={resumo["total_ms"]}',
+    ])
+
+
+def medir_requisicao(request, get_response):
+    """
+    Executa a requisição, medindo-a se for sorteada
+
+    Returns:
+        HttpResponse
+    """
+    if random.random() >= settings.CRM_INSTRUMENTACAO_AMOSTRAGEM:
+        return get_response(request)
+
+    medicao = Medicao(settings.CRM_INSTRUMENTACAO_CONSULTAS_LENTAS)
+    token = _medicao.set(medicao)
+    try:
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(_cronometrar_consulta))
+            response = get_response(request)
+    finally:
+        _medicao.reset(token)
+
+    resumo = medicao.resumo()
+    response['Server-Timing'] = cabecalho_server_timing(resumo)
+    correspondencia = getattr(request, 'resolver_match', None)
+    logger.info(json.dumps({
+        'metodo': request.method,
+        'caminho': request.path,
+        'view': correspondencia.view_name if correspondencia else None,
+        'status': response.status_code,
+        'usuario_id': getattr(getattr(request, 'user', None), 'pk', None),
+        **resumo,
+    }, ensure_ascii=False))
+    return response
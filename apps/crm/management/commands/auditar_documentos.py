@@ -0,0 +1,81 @@
+import csv
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.crm.models import Cliente
+from apps.crm.utils import validar_documentos
+
+
+class Command(BaseCommand):
+    help = 'Audita os CPFs/CNPJs dos clientes e lista os inválidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Restringe aos clientes de um usuário (username)')
+        parser.add_argument('--saida', help='Grava os clientes com problema neste arquivo CSV')
+        parser.add_argument(
+            '--lote', type=int, default=100_000,
+            help='Clientes lidos por lote (padrão: 100000)',
+        )
+
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.exclude(cpf_cnpj__isnull=True).exclude(cpf_cnpj='')
+        if options['usuario']:
+            try:
+                clientes = clientes.filter(usuario=User.objects.get(username=options['usuario']))
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário "{options["usuario"]}" não encontrado')
+
+        arquivo = None
+        escritor = None
+        if options['saida']:
+            arquivo = open(options['saida'], 'w', encoding='utf-8-sig', newline='')
+            escritor = csv.writer(arquivo)
+            escritor.writerow(['ID', 'Usuário', 'Nome', 'Tipo', 'CPF/CNPJ', 'Problema'])
+
+        analisados = 0
+        problemas = {}
+        ultimo_id = 0
+        try:
+            while True:
+                linhas = list(
+                    clientes.filter(id__gt=ultimo_id).order_by('id')
+                    .values_list('id', 'usuario_id', 'nome', 'tipo_pessoa', 'cpf_cnpj')[:options['lote']]
+                )
+                if not linhas:
+                    break
+                ultimo_id = linhas[-1][0]
+                analisados += len(linhas)
+
+                tipos = np.array([linha[3] for linha in linhas], dtype=object)
+                validos, digitos = validar_documentos([linha[4] for linha in linhas])
+                tamanhos = np.array([len(documento) for documento in digitos])
+                esperado = np.where(tipos == 'PJ', 14, 11)
+
+                motivos = np.select(
+                    [~np.isin(tamanhos, (11, 14)), ~validos, tamanhos != esperado],
+                    [
+                        'Quantidade de dígitos inválida',
+                        'Dígitos verificadores inválidos',
+                        'Documento não confere com o tipo de pessoa',
+                    ],
+                    default='',
+                )
+
+                for posicao in np.flatnonzero(motivos != ''):
+                    problemas[motivos[posicao]] = problemas.get(motivos[posicao], 0) + 1
+                    if escritor:
+                        escritor.writerow([*linhas[posicao], motivos[posicao]])
+        finally:
+            if arquivo:
+                arquivo.close()
+
+        total = sum(problemas.values())
+        self.stdout.write(f'{analisados} documento(s) analisado(s)')
+        for motivo, quantidade in sorted(problemas.items(), key=lambda item: -item[1]):
+            self.stdout.write(self.style.WARNING(f'  {motivo}: {quantidade}'))
+        if total:
+            self.stdout.write(self.style.WARNING(f'{total} cliente(s) com documento inválido'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Nenhum documento inválido encontrado'))
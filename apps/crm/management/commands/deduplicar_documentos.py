@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from apps.crm.armazenamento import CARENCIA_ORFAOS, PREFIXO, guardar_conteudo, liberar_conteudo, remover_orfaos
+from apps.crm.models import Documento
+
+
+class Command(BaseCommand):
+    help = (
+        'Move os documentos gravados em documentos/%Y/%m/ para o armazenamento por conteúdo, '
+        'unificando arquivos iguais, e remove arquivos de conteúdo sem documento'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sem-orfaos', action='store_true',
+            help=f'Não remove os arquivos de {PREFIXO}/ sem documento há mais de {CARENCIA_ORFAOS}',
+        )
+
+    def handle(self, *args, **options):
+        migrados = unificados = liberados = 0
+        antigos = Documento.objects.exclude(arquivo__startswith=f'{PREFIXO}/').exclude(arquivo='')
+        for documento in antigos.iterator():
+            nome_antigo = documento.arquivo.name
+            try:
+                with documento.arquivo.open('rb') as arquivo:
+                    nome, hash_sha256, novo = guardar_conteudo(arquivo)
+            except OSError as e:
+                self.stdout.write(self.style.WARNING(f'Documento {documento.id}: {e}'))
+                continue
+            Documento.objects.filter(pk=documento.pk).update(arquivo=nome, hash=hash_sha256)
+            liberar_conteudo(nome_antigo)
+            migrados += 1
+            if not novo:
+                unificados += 1
+                liberados += documento.tamanho
+
+        self.stdout.write(
+            f'{migrados} documento(s) migrado(s); {unificados} eram cópias de outro arquivo '
+            f'({liberados / 1024 / 1024:.1f} MB liberados)'
+        )
+        if options['sem_orfaos']:
+            return
+
+        removidos = remover_orfaos()
+        self.stdout.write(self.style.SUCCESS(f'{removidos} arquivo(s) sem documento removido(s)'))
@@ -0,0 +1,56 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.crm.duplicados import PONTUACAO_MINIMA, detectar_duplicados, mesclar_clientes
+from apps.crm.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Procura clientes duplicados por chaves de bloqueio e, opcionalmente, mescla os pares'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Restringe aos clientes de um usuário (username)')
+        parser.add_argument(
+            '--minimo', type=int, default=PONTUACAO_MINIMA,
+            help=f'Pontuação mínima de 0 a 100 (padrão: {PONTUACAO_MINIMA})',
+        )
+        parser.add_argument('--saida', help='Grava os pares encontrados neste arquivo CSV')
+        parser.add_argument(
+            '--mesclar', type=int, metavar='PONTUACAO',
+            help='Mescla automaticamente os pares com pontuação igual ou maior (mantém o cliente mais antigo)',
+        )
+
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.all()
+        if options['usuario']:
+            try:
+                clientes = clientes.filter(usuario=User.objects.get(username=options['usuario']))
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário "{options["usuario"]}" não encontrado')
+
+        pares = detectar_duplicados(clientes, options['minimo'])
+        self.stdout.write(self.style.SUCCESS(f'{len(pares)} par(es) de possíveis duplicados'))
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8-sig', newline='') as arquivo:
+                escritor = csv.writer(arquivo)
+                escritor.writerow(['Usuário', 'Cliente A', 'Cliente B', 'Pontuação', 'Motivos'])
+                for par in pares.itertuples(index=False):
+                    escritor.writerow([par.usuario_id, par.id_a, par.id_b, par.pontuacao, ', '.join(par.motivos)])
+            self.stdout.write(f'Pares gravados em {options["saida"]}')
+
+        if options['mesclar'] is not None:
+            mesclados = 0
+            excluidos = set()
+            for par in pares[pares['pontuacao'] >= options['mesclar']].itertuples(index=False):
+                # Um cliente já absorvido em outro par não é mesclado de novo
+                if par.id_a in excluidos or par.id_b in excluidos:
+                    continue
+                principal = Cliente.objects.select_related('funil').get(id=par.id_a)
+                duplicado = Cliente.objects.get(id=par.id_b)
+                mesclar_clientes(principal, duplicado)
+                excluidos.add(par.id_b)
+                mesclados += 1
+            self.stdout.write(self.style.SUCCESS(f'{mesclados} par(es) mesclado(s)'))
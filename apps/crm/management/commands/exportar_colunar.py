@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.crm.exportacao import EXPORTACOES
+from apps.crm.exportacao_colunar import escrever_parquet, parquet_disponivel
+
+
+ARQUIVO_ESTADO = '_estado.json'
+
+
+class Command(BaseCommand):
+    help = 'Exporta os dados do CRM em Parquet (completo ou incremental) para análise offline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destino', help='Diretório de saída')
+        parser.add_argument(
+            '--conjuntos', nargs='+', choices=list(EXPORTACOES), default=list(EXPORTACOES),
+            help='Conjuntos a exportar (padrão: todos)',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Exporta só as linhas alteradas desde a última execução',
+        )
+        parser.add_argument('--usuario', help='Restringe aos dados de um usuário (username)')
+        parser.add_argument(
+            '--compressao', default='zstd', choices=['zstd', 'snappy', 'gzip', 'none'],
+            help='Codec de compressão (padrão: zstd)',
+        )
+
+    def handle(self, *args, **options):
+        if not parquet_disponivel():
+            raise CommandError('A exportação Parquet requer o pacote pyarrow (pip install pyarrow)')
+
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f'Usuário "{options["usuario"]}" não encontrado')
+
+        destino = Path(options['destino'])
+        destino.mkdir(parents=True, exist_ok=True)
+
+        # O estado guarda, por conjunto, até onde a última execução exportou
+        caminho_estado = destino / ARQUIVO_ESTADO
+        estado = json.loads(caminho_estado.read_text()) if caminho_estado.exists() else {}
+        chave_estado = options['usuario'] or '*'
+
+        for conjunto in options['conjuntos']:
+            corte = timezone.now()
+            desde = None
+            ultimo = estado.get(chave_estado, {}).get(conjunto)
+            if options['incremental'] and ultimo:
+                desde = datetime.fromisoformat(ultimo)
+
+            if desde is None:
+                arquivo = destino / f'{conjunto}.parquet'
+            else:
+                (destino / conjunto).mkdir(exist_ok=True)
+                arquivo = destino / conjunto / f'{corte:%Y%m%dT%H%M%S}.parquet'
+
+            total = escrever_parquet(
+                conjunto, str(arquivo), usuario=usuario, desde=desde, ate=corte,
+                compressao=options['compressao'],
+            )
+            estado.setdefault(chave_estado, {})[conjunto] = corte.isoformat()
+            caminho_estado.write_text(json.dumps(estado, indent=2))
+
+            modo = 'incremental' if desde else 'completo'
+            self.stdout.write(self.style.SUCCESS(f'{conjunto}: {total} linhas ({modo}) -> {arquivo}'))
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.crm.extracao import liberar_travados, pdf_disponivel, processar_texto, reservar_lote
+from apps.crm.models import TextoDocumento
+
+
+class Command(BaseCommand):
+    help = 'Extrai em segundo plano o texto dos documentos enviados, para a busca'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Esvazia a fila atual e encerra, em vez de continuar aguardando',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 5)',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=20,
+            help='Documentos reservados por vez (padrão: 20)',
+        )
+        parser.add_argument(
+            '--lote-mb', type=float, default=64,
+            help='Soma máxima do tamanho dos arquivos de um lote, em MB (padrão: 64)',
+        )
+        parser.add_argument(
+            '--reprocessar-ignorados', action='store_true',
+            help='Devolve à fila os documentos ignorados (ex.: PDFs antes de instalar o pypdf)',
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0.0,
+            help='Segundos de espera entre lotes, para aliviar banco e storage (padrão: 0)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de extração de texto iniciado')
+        if not pdf_disponivel():
+            self.stdout.write(self.style.WARNING('pypdf não instalado: PDFs serão ignorados'))
+        if options['reprocessar_ignorados']:
+            devolvidos = TextoDocumento.objects.filter(status='ignorado').update(
+                status='pendente', atualizado_em=timezone.now()
+            )
+            self.stdout.write(f'{devolvidos} documento(s) ignorado(s) devolvido(s) à fila')
+        limite_bytes = int(options['lote_mb'] * 1024 * 1024)
+        ultima_limpeza = 0
+
+        while True:
+            if time.monotonic() - ultima_limpeza > 60:
+                travados = liberar_travados()
+                if travados:
+                    self.stdout.write(f'{travados} documento(s) travado(s) devolvido(s) à fila')
+                ultima_limpeza = time.monotonic()
+
+            lote = reservar_lote(options['lote'], limite_bytes)
+            if not lote:
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            for texto in lote:
+                processar_texto(texto)
+                if texto.status != 'concluido':
+                    self.stdout.write(f'Documento {texto.documento_id}: {texto.status} ({texto.erro})')
+            self.stdout.write(f'{len(lote)} documento(s) em {time.monotonic() - inicio:.1f}s')
+            if options['pausa']:
+                time.sleep(options['pausa'])
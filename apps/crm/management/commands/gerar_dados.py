@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.crm.geracao import TAMANHO_LOTE, criar_usuarios, gerar_dados, nomes_usuarios
+from apps.crm.models import Funil
+
+
+class Command(BaseCommand):
+    help = 'Gera dados fictícios (funis, clientes, tarefas, agenda, atividades, notas e propostas) a partir de uma semente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=2, help='Usuários a gerar (padrão: 2)')
+        parser.add_argument('--clientes', type=int, default=20, help='Clientes por usuário (padrão: 20)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente dos sorteios (padrão: 42)')
+        parser.add_argument(
+            '--referencia',
+            help='Data "atual" dos dados no formato AAAA-MM-DD (padrão: agora); fixe para repetir a geração',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help=f'Clientes gravados por vez (padrão: {TAMANHO_LOTE})',
+        )
+        parser.add_argument(
+            '--processos', type=int, default=1,
+            help='Usuários gerados em paralelo (padrão: 1; use com PostgreSQL)',
+        )
+        parser.add_argument('--prefixo', default='teste', help='Prefixo dos usernames (padrão: teste)')
+        parser.add_argument('--senha', help='Senha dos usuários (padrão: <prefixo>123)')
+        parser.add_argument(
+            '--limpar', action='store_true',
+            help='Exclui os usuários <prefixo>1..N e todos os seus dados antes de gerar',
+        )
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['clientes'] < 0 or options['lote'] < 1:
+            raise CommandError('--usuarios e --lote devem ser positivos e --clientes não pode ser negativo')
+        if options['processos'] > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite não aceita escritas concorrentes; os processos vão esperar uns pelos outros'
+            ))
+
+        referencia = None
+        if options['referencia']:
+            try:
+                referencia = timezone.make_aware(datetime.strptime(options['referencia'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--referencia deve estar no formato AAAA-MM-DD')
+
+        nomes = nomes_usuarios(options['usuarios'], options['prefixo'])
+        if options['limpar']:
+            excluidos, _ = User.objects.filter(username__in=nomes).delete()
+            self.stdout.write(f'{excluidos} registro(s) excluído(s)')
+        elif Funil.objects.filter(usuario__username__in=nomes).exists():
+            raise CommandError('Os usuários já possuem dados; use --limpar para gerá-los novamente')
+
+        usuarios = criar_usuarios(options['usuarios'], options['prefixo'], options['senha'])
+        concluidos = 0
+
+        def avancar(usuario_id, contagem):
+            nonlocal concluidos
+            concluidos += 1
+            self.stdout.write(f'{concluidos}/{len(usuarios)} usuário(s)', ending='\r')
+            self.stdout.flush()
+
+        try:
+            total = gerar_dados(
+                usuarios, options['clientes'], semente=options['semente'], referencia=referencia,
+                tamanho_lote=options['lote'], processos=options['processos'], avancar=avancar,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write('')
+        for tipo, quantidade in total.items():
+            self.stdout.write(f'  {tipo}: {quantidade}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Dados gerados para {len(usuarios)} usuário(s): {nomes[0]}..{nomes[-1]} '
+            f'(senha: {options["senha"] or options["prefixo"] + "123"})'
+        ))
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.crm.importacao import TAMANHO_LOTE, contar_linhas, importar_clientes
+from apps.crm.models import Funil
+
+
+class Command(BaseCommand):
+    help = 'Importa clientes em massa de um arquivo CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo .csv ou .xlsx com cabeçalho')
+        parser.add_argument('--usuario', required=True, help='Dono dos clientes importados (username)')
+        parser.add_argument('--funil', help='Funil (id ou nome) para linhas sem a coluna "funil"')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help=f'Linhas validadas e inseridas por vez (padrão: {TAMANHO_LOTE})',
+        )
+        parser.add_argument(
+            '--relatorio',
+            help='CSV com as linhas recusadas (padrão: <arquivo>.erros.csv)',
+        )
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f'Arquivo "{caminho}" não encontrado')
+
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'Usuário "{options["usuario"]}" não encontrado')
+
+        funil = None
+        if options['funil']:
+            funis = Funil.objects.filter(usuario=usuario)
+            if options['funil'].isdigit():
+                funil = funis.filter(id=options['funil']).first()
+            else:
+                funil = funis.filter(nome__iexact=options['funil']).first()
+            if funil is None:
+                raise CommandError(f'Funil "{options["funil"]}" não encontrado')
+
+        destino_relatorio = Path(options['relatorio'] or f'{caminho}.erros.csv')
+        with caminho.open('rb') as arquivo, \
+                destino_relatorio.open('w', encoding='utf-8-sig', newline='') as relatorio:
+            total = contar_linhas(arquivo, caminho.name)
+            processadas = 0
+
+            def avancar(linhas):
+                nonlocal processadas
+                processadas += linhas
+                self.stdout.write(f'{processadas}/{total} linhas', ending='\r')
+                self.stdout.flush()
+
+            try:
+                resultado = importar_clientes(
+                    arquivo, caminho.name, usuario, relatorio, funil,
+                    tamanho_lote=options['lote'], avancar=avancar,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['importados']} cliente(s) importado(s) de {resultado['linhas']} linha(s)"
+        ))
+        if resultado['erros']:
+            self.stdout.write(self.style.WARNING(
+                f"{resultado['erros']} linha(s) recusada(s), detalhes em {destino_relatorio}"
+            ))
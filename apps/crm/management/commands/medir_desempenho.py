@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from apps.crm.desempenho import (
+    NOMES_ENDPOINTS, REPETICOES, TOLERANCIA, comparar_relatorios, executar,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede tempo, consultas SQL e pico de memória das views mais acessadas em bases de vários '
+        'tamanhos e grava um relatório JSON comparável entre commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanhos', type=int, nargs='+', default=[1000],
+            help='Clientes de cada base medida, ex.: --tamanhos 1000 100000 1000000 (padrão: 1000)',
+        )
+        parser.add_argument(
+            '--repeticoes', type=int, default=REPETICOES,
+            help=f'Chamadas aquecidas por endpoint (padrão: {REPETICOES})',
+        )
+        parser.add_argument(
+            '--endpoints', nargs='+', choices=NOMES_ENDPOINTS, help='Mede só estes endpoints (padrão: todos)',
+        )
+        parser.add_argument('--semente', type=int, default=42, help='Semente usada ao gerar uma base nova')
+        parser.add_argument('--saida', default='desempenho.json', help='Relatório JSON (padrão: desempenho.json)')
+        parser.add_argument('--comparar', help='Relatório anterior para comparação; regressões encerram com erro')
+        parser.add_argument(
+            '--tolerancia', type=float, default=TOLERANCIA,
+            help=f'Aumento relativo de tempo/memória aceito na comparação (padrão: {TOLERANCIA})',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['tamanhos']) < 1 or options['repeticoes'] < 1:
+            raise CommandError('--tamanhos e --repeticoes devem ser positivos')
+
+        anterior = None
+        if options['comparar']:
+            try:
+                anterior = json.loads(Path(options['comparar']).read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Não foi possível ler "{options["comparar"]}": {e}')
+
+        # Libera o host "testserver" usado pelo django.test.Client
+        setup_test_environment()
+        self.stdout.write(
+            'As bases são geradas na primeira execução de cada tamanho e reaproveitadas; '
+            'use um banco dedicado para volumes grandes'
+        )
+
+        def avancar(tamanho, nome, resultado):
+            estilo = self.style.SUCCESS if resultado['status'] < 400 else self.style.ERROR
+            self.stdout.write(
+                f"{tamanho:>9} {nome:<24} {estilo(str(resultado['status']))} "
+                f"mediana {resultado['mediana_ms']:>9.2f} ms  fria {resultado['fria_ms']:>9.2f} ms  "
+                f"{resultado['consultas']:>4} consultas (+{resultado['consultas_cache']} cache)  "
+                f"{resultado['memoria_pico_kb']:>8} KB"
+            )
+
+        relatorio = executar(
+            options['tamanhos'], options['repeticoes'], options['endpoints'], options['semente'], avancar,
+        )
+        Path(options['saida']).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Relatório gravado em {options["saida"]}'))
+
+        if anterior is None:
+            return
+        if anterior.get('versao') != relatorio['versao']:
+            raise CommandError('Os relatórios têm versões diferentes e não podem ser comparados')
+
+        self.stdout.write(f"Comparação com {anterior.get('commit') or options['comparar']}:")
+        regressoes = 0
+        for linha in comparar_relatorios(anterior, relatorio, options['tolerancia']):
+            texto = (
+                f"{linha['tamanho']:>9} {linha['endpoint']:<24} {linha['metrica']:<16} "
+                f"{linha['antes']:>10} -> {linha['depois']:>10} ({linha['variacao']:+.1%})"
+            )
+            if linha['regressao']:
+                regressoes += 1
+                self.stdout.write(self.style.ERROR(texto))
+            else:
+                self.stdout.write(texto)
+        if regressoes:
+            raise CommandError(f'{regressoes} regressão(ões) acima da tolerância')
+        self.stdout.write(self.style.SUCCESS('Nenhuma regressão'))
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.crm.analise import recalcular_scores
+from apps.crm.armazenamento import remover_orfaos
+from apps.crm.models import Cliente
+from apps.crm.processamento import executar_processamento, liberar_travados, limpar_expirados, reservar_proximo
+from apps.crm.uploads import limpar_uploads_abandonados
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de relatórios e exportações em segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Esvazia a fila atual e encerra, em vez de continuar aguardando',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 2)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de relatórios iniciado')
+        ultima_limpeza = ultima_verificacao = 0
+
+        while True:
+            if time.monotonic() - ultima_verificacao > 60:
+                travados = liberar_travados()
+                if travados:
+                    self.stdout.write(f'{travados} processamento(s) interrompido(s) marcado(s) como erro')
+                # Scores que mudaram só com a passagem do tempo (fila de ações)
+                agora = timezone.now()
+                recalcular_scores(Cliente.objects.filter(score_revisar_em__lte=agora), agora)
+                ultima_verificacao = time.monotonic()
+
+            if time.monotonic() - ultima_limpeza > 600:
+                removidos = limpar_expirados()
+                if removidos:
+                    self.stdout.write(f'{removidos} processamento(s) expirado(s) removido(s)')
+                abandonados = limpar_uploads_abandonados()
+                if abandonados:
+                    self.stdout.write(f'{abandonados} upload(s) de documento abandonado(s) removido(s)')
+                orfaos = remover_orfaos()
+                if orfaos:
+                    self.stdout.write(f'{orfaos} arquivo(s) de documento sem referência removido(s)')
+                ultima_limpeza = time.monotonic()
+
+            processamento = reservar_proximo()
+            if processamento is None:
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            executar_processamento(processamento)
+            processamento.refresh_from_db()
+            self.stdout.write(
+                f'{processamento} em {time.monotonic() - inicio:.1f}s '
+                f'({processamento.linhas_processadas} linhas)'
+            )
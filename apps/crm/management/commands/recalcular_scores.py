@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.crm.analise import recalcular_scores
+from apps.crm.models import Cliente
+
+
+class Command(BaseCommand):
+    help = 'Atualiza os scores que mudaram com a passagem do tempo (executar periodicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Recalcula todos os clientes, não só os com revisão vencida',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=50_000,
+            help='Clientes lidos por lote (padrão: 50000)',
+        )
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        clientes = Cliente.objects.all()
+        if not options['todos']:
+            clientes = clientes.filter(score_revisar_em__lte=agora)
+
+        analisados, atualizados = recalcular_scores(clientes, agora, options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{analisados} cliente(s) analisado(s), {atualizados} score(s) atualizado(s)'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.crm.metas import reconciliar_metas
+from apps.crm.models import Meta
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o valor atual das metas automáticas e corrige divergências (executar periodicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Restringe às metas de um usuário (username)')
+
+    def handle(self, *args, **options):
+        metas = Meta.objects.all()
+        if options['usuario']:
+            metas = metas.filter(usuario__username=options['usuario'])
+
+        corrigidas = reconciliar_metas(metas)
+        for meta, anterior, correto in corrigidas:
+            self.stdout.write(f'{meta} (#{meta.id}): {anterior} -> {correto}')
+        self.stdout.write(self.style.SUCCESS(f'{len(corrigidas)} meta(s) corrigida(s)'))
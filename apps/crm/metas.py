@@ -0,0 +1,207 @@
+"""
+Acompanhamento automático do valor atual das metas
+
+O valor das metas muda por diferença: quando uma proposta (ou um cliente
+na última etapa do funil) passa a contar, deixa de contar ou muda de
+valor, apenas o delta é somado com F() às metas do usuário cujo período
+contém a data do fechamento. A reconciliação periódica recalcula tudo
+com agregações e corrige eventuais divergências (ex.: alterações feitas
+com queryset.update, que não passam pelos signals).
+"""
+
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cliente, Funil, Meta, Proposta
+
+
+# Origens de valor que contam cada tipo de fechamento
+ORIGENS_PROPOSTA = ['propostas', 'propostas_clientes']
+ORIGENS_CLIENTE = ['propostas_clientes']
+
+_DECIMAL = DecimalField(max_digits=15, decimal_places=2)
+
+
+def contribuicao_proposta(dados):
+    """
+    Quanto uma proposta soma às metas
+
+    Args:
+        dados: dict com usuario_id, status, valor_total, desconto e data_aceite
+
+    Returns:
+        tuple: (usuario_id, data, valor) ou None se a proposta não conta
+    """
+    if not dados or dados['status'] != 'aceita' or not dados['data_aceite']:
+        return None
+    valor = Decimal(dados['valor_total']) - Decimal(dados['desconto'] or 0)
+    return dados['usuario_id'], timezone.localdate(dados['data_aceite']), valor
+
+
+def contribuicao_cliente(dados, etapas_finais=None):
+    """
+    Quanto um cliente na última etapa do funil soma às metas
+
+    Args:
+        dados: dict com usuario_id, funil_id, etapa, valor_estimado e data_entrada_etapa
+        etapas_finais: dict (opcional) {funil_id: última etapa}, para evitar consultas
+
+    Returns:
+        tuple: (usuario_id, data, valor) ou None se o cliente não conta
+    """
+    if not dados or not dados['funil_id'] or not dados['data_entrada_etapa']:
+        return None
+    if etapas_finais is None or dados['funil_id'] not in etapas_finais:
+        etapas = Funil.objects.filter(id=dados['funil_id']).values_list('etapas', flat=True).first()
+        ultima = etapas[-1] if etapas else None
+    else:
+        ultima = etapas_finais[dados['funil_id']]
+    if dados['etapa'] != ultima:
+        return None
+    return (
+        dados['usuario_id'],
+        timezone.localdate(dados['data_entrada_etapa']),
+        Decimal(dados['valor_estimado'] or 0),
+    )
+
+
+def _somar(contribuicao, sinal, origens):
+    usuario_id, data, valor = contribuicao
+    Meta.objects.filter(
+        usuario_id=usuario_id,
+        data_inicio__lte=data,
+        data_fim__gte=data,
+        origem_valor__in=origens,
+    ).update(valor_atual=F('valor_atual') + sinal * valor)
+
+
+def aplicar_delta(anterior, atual, origens):
+    """
+    Ajusta as metas pela troca de uma contribuição por outra
+
+    Args:
+        anterior: tuple ou None - contribuição antes da alteração
+        atual: tuple ou None - contribuição depois da alteração
+        origens: list - valores de Meta.origem_valor afetados
+    """
+    if anterior == atual:
+        return
+    if anterior and atual and anterior[:2] == atual[:2]:
+        # Mesmo usuário e data: um único UPDATE com a diferença
+        _somar((*atual[:2], atual[2] - anterior[2]), 1, origens)
+        return
+    if anterior:
+        _somar(anterior, -1, origens)
+    if atual:
+        _somar(atual, 1, origens)
+
+
+def _dados(instancia):
+    return {campo: getattr(instancia, campo) for campo in instancia._campos_meta}
+
+
+def registrar_proposta(proposta, criada=False, excluida=False):
+    """Atualiza as metas após salvar ou excluir uma proposta"""
+    if not criada and proposta._original_meta is None:
+        # Estado anterior desconhecido (campos adiados); a reconciliação corrige
+        return
+    anterior = None if criada else contribuicao_proposta(proposta._original_meta)
+    atual = None if excluida else contribuicao_proposta(_dados(proposta))
+    aplicar_delta(anterior, atual, ORIGENS_PROPOSTA)
+    proposta._original_meta = None if excluida else _dados(proposta)
+
+
+def registrar_cliente(cliente, criado=False, excluido=False):
+    """Atualiza as metas após salvar ou excluir um cliente"""
+    if not criado and cliente._original_meta is None:
+        return
+    original = None if criado else cliente._original_meta
+    dados = None if excluido else _dados(cliente)
+    if original == dados:
+        return
+    etapas_finais = {}
+    if dados and cliente.funil_id:
+        etapas_finais[cliente.funil_id] = cliente.funil.etapas[-1] if cliente.funil.etapas else None
+    anterior = contribuicao_cliente(original, etapas_finais)
+    atual = contribuicao_cliente(dados, etapas_finais)
+    aplicar_delta(anterior, atual, ORIGENS_CLIENTE)
+    cliente._original_meta = dados
+
+
+def reconciliar_metas(metas=None):
+    """
+    Recalcula o valor atual das metas automáticas e corrige divergências
+
+    As somas saem de subconsultas correlacionadas, avaliadas no banco em
+    uma única consulta; só as metas com valor diferente são gravadas.
+
+    Args:
+        metas: QuerySet de Meta (opcional) - padrão: todas as automáticas
+
+    Returns:
+        list: [(meta, valor_anterior, valor_correto)] das metas corrigidas
+    """
+    if metas is None:
+        metas = Meta.objects.all()
+    metas = metas.exclude(origem_valor='manual')
+
+    soma_propostas = (
+        Proposta.objects
+        .filter(
+            usuario=OuterRef('usuario'),
+            status='aceita',
+            data_aceite__date__gte=OuterRef('data_inicio'),
+            data_aceite__date__lte=OuterRef('data_fim'),
+        )
+        .order_by()
+        .values('usuario')
+        .annotate(total=Sum(F('valor_total') - F('desconto'), output_field=_DECIMAL))
+        .values('total')
+    )
+    metas = metas.annotate(
+        total_propostas=Coalesce(Subquery(soma_propostas), Value(Decimal('0')), output_field=_DECIMAL)
+    )
+
+    # Clientes contam na última etapa de cada funil; o filtro depende das
+    # etapas, então é montado a partir dos funis dos usuários envolvidos
+    na_ultima_etapa = Q()
+    for funil_id, etapas in Funil.objects.filter(
+        usuario__in=metas.values('usuario')
+    ).values_list('id', 'etapas'):
+        if etapas:
+            na_ultima_etapa |= Q(funil_id=funil_id, etapa=etapas[-1])
+    if na_ultima_etapa:
+        soma_clientes = (
+            Cliente.objects
+            .filter(
+                na_ultima_etapa,
+                usuario=OuterRef('usuario'),
+                data_entrada_etapa__date__gte=OuterRef('data_inicio'),
+                data_entrada_etapa__date__lte=OuterRef('data_fim'),
+            )
+            .order_by()
+            .values('usuario')
+            .annotate(total=Sum('valor_estimado'))
+            .values('total')
+        )
+        metas = metas.annotate(
+            total_clientes=Coalesce(Subquery(soma_clientes), Value(Decimal('0')), output_field=_DECIMAL)
+        )
+    else:
+        metas = metas.annotate(total_clientes=Value(Decimal('0'), output_field=_DECIMAL))
+
+    corrigidas = []
+    for meta in metas:
+        correto = meta.total_propostas
+        if meta.origem_valor == 'propostas_clientes':
+            correto += meta.total_clientes
+        correto = Decimal(correto).quantize(Decimal('0.01'))
+        if meta.valor_atual != correto:
+            corrigidas.append((meta, meta.valor_atual, correto))
+            meta.valor_atual = correto
+
+    Meta.objects.bulk_update([meta for meta, _, _ in corrigidas], ['valor_atual'], batch_size=500)
+    return corrigidas
@@ -0,0 +1,212 @@
+"""
+Métricas do processo no formato de texto do Prometheus (/metrics)
+
+Contadores e histogramas ficam em memória, protegidos por uma trava:
+cada requisição soma sua duração na faixa do histograma da view (nome da
+URL), o status e o número de consultas SQL; os caches da previsão, da
+simulação e dos duplicados somam acertos e falhas. A fila de relatórios
+e o atraso dos lembretes são lidos do banco no momento da coleta.
+
+Os valores são por processo: com vários workers, cada um publica os
+próprios números (o Prometheus agrega as séries por instância).
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import ProcessamentoRelatorio, Tarefa
+
+
+# Limites (segundos) das faixas do histograma de latência
+FAIXAS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rótulo das requisições que não casaram com nenhuma URL (404)
+VIEW_NAO_RESOLVIDA = 'nao_resolvida'
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+_trava = threading.Lock()
+_latencias = {}  # view -> [contagem por faixa..., +Inf, soma]
+_requisicoes = Counter()  # (view, metodo, classe do status)
+_consultas = Counter()  # view
+_cache = Counter()  # (cache, 'acerto' | 'falha')
+_inicio = time.time()
+
+
+def registrar_requisicao(view, metodo, status, duracao, consultas):
+    """Soma uma requisição atendida às métricas da view"""
+    faixa = bisect.bisect_left(FAIXAS_LATENCIA, duracao)
+    with _trava:
+        histograma = _latencias.get(view)
+        if histograma is None:
+            histograma = _latencias[view] = [0] * (len(FAIXAS_LATENCIA) + 1) + [0.0]
+        histograma[faixa] += 1
+        histograma[-1] += duracao
+        _requisicoes[(view, metodo, f'{status // 100}xx')] += 1
+        _consultas[view] += consultas
+
+
+def registrar_cache(nome, acerto):
+    with _trava:
+        _cache[(nome, 'acerto' if acerto else 'falha')] += 1
+
+
+def medir_requisicao(request, get_response):
+    """
+    Executa a requisição contando consultas e tempo
+
+    Returns:
+        HttpResponse
+    """
+    consultas = [0]
+
+    def contar(execute, sql, params, many, context):
+        consultas[0] += 1
+        return execute(sql, params, many, context)
+
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(contar))
+            response = get_response(request)
+        status = response.status_code
+        return response
+    finally:
+        correspondencia = getattr(request, 'resolver_match', None)
+        registrar_requisicao(
+            correspondencia.view_name if correspondencia else VIEW_NAO_RESOLVIDA,
+            request.method, status, time.perf_counter() - inicio, consultas[0],
+        )
+
+
+def limpar_metricas():
+    with _trava:
+        _latencias.clear()
+        _requisicoes.clear()
+        _consultas.clear()
+        _cache.clear()
+
+
+def _rotulos(**rotulos):
+    if not rotulos:
+        return ''
+    pares = ','.join(
+        '{}="{}"'.format(
+            nome, str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'),
+        )
+        for nome, valor in rotulos.items()
+    )
+    return '{' + pares + '}'
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        if math.isinf(valor):
+            return '+Inf' if valor > 0 else '-Inf'
+        return repr(valor)
+    return str(valor)
+
+
+def _serie(linhas, nome, tipo, descricao, amostras):
+    """Acrescenta uma família de métricas (HELP, TYPE e as amostras)"""
+    linhas.append(f'# HELP {nome} {descricao}')
+    linhas.append(f'# TYPE {nome} {tipo}')
+    for sufixo, rotulos, valor in amostras:
+        linhas.append(f'{nome}{sufixo}{_rotulos(**rotulos)} {_numero(valor)}')
+
+
+def _fila_relatorios(agora):
+    """Pedidos pendentes/em processamento e idade do pendente mais antigo"""
+    por_status = dict(
+        ProcessamentoRelatorio.objects.filter(status__in=['pendente', 'processando'])
+        .values_list('status').annotate(total=Count('id')).order_by()
+    )
+    mais_antigo = ProcessamentoRelatorio.objects.filter(status='pendente').aggregate(
+        minimo=Min('criado_em')
+    )['minimo']
+    return por_status, (agora - mais_antigo).total_seconds() if mais_antigo else 0.0
+
+
+def _lembretes(agora):
+    """
+    Lembretes vencidos de tarefas ainda abertas e que ainda não venceram
+
+    Returns:
+        tuple: (quantidade, atraso em segundos do lembrete mais antigo)
+    """
+    resultado = Tarefa.objects.filter(
+        status__in=['pendente', 'em_andamento'], lembrete__lte=agora, data_vencimento__gte=agora,
+    ).aggregate(total=Count('id'), minimo=Min('lembrete'))
+    atraso = (agora - resultado['minimo']).total_seconds() if resultado['minimo'] else 0.0
+    return resultado['total'], atraso
+
+
+def exposicao():
+    """
+    Todas as métricas no formato de texto do Prometheus
+
+    Returns:
+        str
+    """
+    with _trava:
+        latencias = {view: list(histograma) for view, histograma in _latencias.items()}
+        requisicoes = dict(_requisicoes)
+        consultas = dict(_consultas)
+        cache = dict(_cache)
+
+    linhas = []
+    amostras = []
+    for view, histograma in sorted(latencias.items()):
+        acumulado = 0
+        for limite, quantidade in zip(FAIXAS_LATENCIA + (math.inf,), histograma):
+            acumulado += quantidade
+            amostras.append(('_bucket', {'view': view, 'le': _numero(float(limite))}, acumulado))
+        amostras.append(('_sum', {'view': view}, histograma[-1]))
+        amostras.append(('_count', {'view': view}, acumulado))
+    _serie(linhas, 'crm_requisicao_duracao_segundos', 'histogram', 'Latência das requisições por view', amostras)
+
+    _serie(linhas, 'crm_requisicoes_total', 'counter', 'Requisições atendidas por view, método e status', [
+        ('', {'view': view, 'metodo': metodo, 'status': status}, total)
+        for (view, metodo, status), total in sorted(requisicoes.items())
+    ])
+    _serie(linhas, 'crm_consultas_sql_total', 'counter', 'Consultas SQL feitas pelas requisições de cada view', [
+        ('', {'view': view}, total) for view, total in sorted(consultas.items())
+    ])
+
+    nomes_cache = sorted({nome for nome, _ in cache})
+    _serie(linhas, 'crm_cache_acertos_total', 'counter', 'Leituras de cache encontradas', [
+        ('', {'cache': nome}, cache.get((nome, 'acerto'), 0)) for nome in nomes_cache
+    ])
+    _serie(linhas, 'crm_cache_falhas_total', 'counter', 'Leituras de cache recalculadas', [
+        ('', {'cache': nome}, cache.get((nome, 'falha'), 0)) for nome in nomes_cache
+    ])
+
+    agora = timezone.now()
+    por_status, idade = _fila_relatorios(agora)
+    _serie(linhas, 'crm_fila_relatorios', 'gauge', 'Relatórios em segundo plano na fila, por status', [
+        ('', {'status': status}, por_status.get(status, 0)) for status in ('pendente', 'processando')
+    ])
+    _serie(linhas, 'crm_fila_relatorios_espera_segundos', 'gauge', 'Espera do relatório pendente mais antigo', [
+        ('', {}, idade),
+    ])
+
+    atrasados, atraso = _lembretes(agora)
+    _serie(linhas, 'crm_lembretes_vencidos', 'gauge', 'Lembretes já vencidos de tarefas abertas', [
+        ('', {}, atrasados),
+    ])
+    _serie(linhas, 'crm_lembrete_atraso_segundos', 'gauge', 'Atraso do lembrete vencido mais antigo', [
+        ('', {}, atraso),
+    ])
+
+    _serie(linhas, 'crm_processo_inicio_segundos', 'gauge', 'Início do processo (epoch)', [('', {}, _inicio)])
+    return '\n'.join(linhas) + '\n'
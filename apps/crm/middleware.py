@@ -0,0 +1,53 @@
+from .consultas_lentas import monitorar_consultas_lentas
+from .instrumentacao import instrumentar_templates, medir_requisicao
+from .metricas import medir_requisicao as medir_metricas
+from .perfilador import perfilar_requisicao
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede uma amostra das requisições (SQL, templates e Python) e publica
+    o resultado no cabeçalho Server-Timing e no log
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentar_templates()
+
+    def __call__(self, request):
+        return medir_requisicao(request, self.get_response)
+
+
+class ConsultasLentasMiddleware:
+    """Registra as consultas lentas de cada requisição (ver consultas_lentas)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with monitorar_consultas_lentas(request):
+            return self.get_response(request)
+
+
+class MetricasMiddleware:
+    """Soma latência, status e consultas SQL de cada requisição às métricas (/metrics)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return medir_metricas(request, self.get_response)
+
+
+class PerfiladorMiddleware:
+    """
+    Perfila as requisições pedidas por um superusuário (ver perfilador)
+
+    Fica depois do AuthenticationMiddleware, que fornece request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return perfilar_requisicao(request, self.get_response)
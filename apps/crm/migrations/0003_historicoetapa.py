@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def popular_historico(apps, schema_editor):
+    Cliente = apps.get_model('crm', 'Cliente')
+    HistoricoEtapa = apps.get_model('crm', 'HistoricoEtapa')
+    clientes = Cliente.objects.values_list(
+        'id', 'funil_id', 'etapa', 'usuario_id', 'data_entrada_etapa'
+    ).iterator(chunk_size=2000)
+    lote = []
+    for cliente_id, funil_id, etapa, usuario_id, data_entrada in clientes:
+        lote.append(HistoricoEtapa(
+            cliente_id=cliente_id,
+            funil_id=funil_id,
+            etapa=etapa,
+            usuario_id=usuario_id,
+            data_entrada=data_entrada,
+        ))
+        if len(lote) >= 2000:
+            HistoricoEtapa.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        HistoricoEtapa.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_tarefa_cliente_cargo_cliente_cep_cliente_cidade_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoricoEtapa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etapa', models.CharField(max_length=100)),
+                ('data_entrada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data_saida', models.DateTimeField(blank=True, null=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_etapas', to='crm.cliente')),
+                ('funil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_etapas', to='crm.funil')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_etapas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Histórico de Etapa',
+                'verbose_name_plural': 'Histórico de Etapas',
+                'ordering': ['-data_entrada'],
+                'indexes': [models.Index(fields=['funil', 'etapa', 'cliente'], name='crm_histori_funil_i_10d588_idx'), models.Index(fields=['cliente', 'data_saida'], name='crm_histori_cliente_65660c_idx')],
+            },
+        ),
+        migrations.RunPython(popular_historico, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_historicoetapa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessamentoRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('chave', models.CharField(help_text='Hash de tipo + parâmetros + usuário', max_length=64)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('total_linhas', models.IntegerField(default=0)),
+                ('linhas_processadas', models.IntegerField(default=0)),
+                ('arquivo', models.FileField(blank=True, upload_to='relatorios/%Y/%m/')),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('expira_em', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processamentos_relatorio', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Processamento de Relatório',
+                'verbose_name_plural': 'Processamentos de Relatórios',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='crm_process_status_5950d2_idx'), models.Index(fields=['chave', 'status'], name='crm_process_chave_b690a4_idx'), models.Index(fields=['usuario', '-criado_em'], name='crm_process_usuario_8881b4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def agendar_recalculo(apps, schema_editor):
+    """Marca todos os clientes para o próximo `recalcular_scores`"""
+    Cliente = apps.get_model('crm', 'Cliente')
+    Cliente.objects.update(score_revisar_em=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_processamentorelatorio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='score',
+            field=models.PositiveSmallIntegerField(default=50),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='score_revisar_em',
+            field=models.DateTimeField(blank=True, help_text='Próxima vez em que o score muda só pela passagem do tempo', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['usuario', 'funil', '-score'], name='crm_cliente_usuario_badaa1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['score_revisar_em'], name='crm_cliente_score_r_e0af62_idx'),
+        ),
+        migrations.RunPython(agendar_recalculo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_cliente_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Metas existentes tiveram o valor digitado à mão: continuam manuais
+        migrations.AddField(
+            model_name='meta',
+            name='origem_valor',
+            field=models.CharField(choices=[('propostas', 'Propostas aceitas'), ('propostas_clientes', 'Propostas aceitas + clientes na última etapa'), ('manual', 'Manual')], default='manual', help_text='De onde vem o valor atual (atualizado automaticamente, exceto se manual)', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='meta',
+            name='origem_valor',
+            field=models.CharField(choices=[('propostas', 'Propostas aceitas'), ('propostas_clientes', 'Propostas aceitas + clientes na última etapa'), ('manual', 'Manual')], default='propostas', help_text='De onde vem o valor atual (atualizado automaticamente, exceto se manual)', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='meta',
+            index=models.Index(fields=['usuario', 'data_inicio', 'data_fim'], name='crm_meta_usuario_befc7e_idx'),
+        ),
+    ]
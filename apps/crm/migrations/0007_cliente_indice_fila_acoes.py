@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_meta_origem_valor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['usuario', '-score', 'ultimo_contato', 'data_entrada_etapa'], name='crm_cliente_usuario_29d722_idx'),
+        ),
+    ]
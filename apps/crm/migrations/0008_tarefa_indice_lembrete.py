@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_cliente_indice_fila_acoes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['lembrete', 'status'], name='crm_tarefa_lembret_e0b4f1_idx'),
+        ),
+    ]
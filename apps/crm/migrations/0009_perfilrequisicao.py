@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_tarefa_indice_lembrete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(max_length=10)),
+                ('caminho', models.CharField(max_length=500)),
+                ('view', models.CharField(blank=True, max_length=200)),
+                ('status', models.IntegerField(blank=True, null=True)),
+                ('duracao_ms', models.FloatField()),
+                ('amostras', models.IntegerField(default=0)),
+                ('arquivo', models.FileField(upload_to='perfis/%Y/%m/')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='perfis_solicitados', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='perfis_requisicao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil de Requisição',
+                'verbose_name_plural': 'Perfis de Requisições',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
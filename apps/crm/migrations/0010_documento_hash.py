@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_perfilrequisicao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 do conteúdo', max_length=64),
+        ),
+    ]
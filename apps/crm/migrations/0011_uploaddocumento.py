@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_documento_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200)),
+                ('tipo', models.CharField(choices=[('proposta', 'Proposta'), ('contrato', 'Contrato'), ('apresentacao', 'Apresentação'), ('orcamento', 'Orçamento'), ('documento', 'Documento'), ('outros', 'Outros')], default='documento', max_length=20)),
+                ('descricao', models.TextField(blank=True, null=True)),
+                ('tamanho', models.BigIntegerField(help_text='Tamanho total declarado, em bytes')),
+                ('sha256', models.CharField(help_text='SHA-256 declarado do arquivo inteiro', max_length=64)),
+                ('recebido', models.BigIntegerField(default=0, help_text='Bytes já gravados, a partir do início')),
+                ('partes', models.JSONField(blank=True, default=list, help_text='Nomes das partes no storage, em ordem')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads_documento', to='crm.cliente')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads_documento', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload de Documento',
+                'verbose_name_plural': 'Uploads de Documentos',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# SQLite: tabela FTS5 com o conteúdo em crm_textodocumento, mantida por
+# triggers. Alterações em crm_textodocumento que recriem a tabela no SQLite
+# derrubam os triggers; uma migração assim precisa recriá-los.
+FTS5_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE crm_textodocumento_fts USING fts5(
+        texto, content='crm_textodocumento', content_rowid='documento_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER crm_textodocumento_fts_ai AFTER INSERT ON crm_textodocumento BEGIN
+        INSERT INTO crm_textodocumento_fts(rowid, texto) VALUES (new.documento_id, new.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_textodocumento_fts_ad AFTER DELETE ON crm_textodocumento BEGIN
+        INSERT INTO crm_textodocumento_fts(crm_textodocumento_fts, rowid, texto)
+        VALUES ('delete', old.documento_id, old.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER crm_textodocumento_fts_au AFTER UPDATE OF texto ON crm_textodocumento BEGIN
+        INSERT INTO crm_textodocumento_fts(crm_textodocumento_fts, rowid, texto)
+        VALUES ('delete', old.documento_id, old.texto);
+        INSERT INTO crm_textodocumento_fts(rowid, texto) VALUES (new.documento_id, new.texto);
+    END
+    """,
+]
+
+
+def _indice_postgresql():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Mesma expressão usada em extracao.buscar_documentos
+    return GinIndex(SearchVector('texto', config='portuguese'), name='crm_textodocumento_busca_idx')
+
+
+def criar_indice_busca(apps, schema_editor):
+    """Índice de texto completo do banco em uso (outros bancos buscam sem índice)"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in FTS5_SQLITE:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('crm', 'TextoDocumento'), _indice_postgresql())
+
+
+def remover_indice_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS crm_textodocumento_fts')
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('crm', 'TextoDocumento'), _indice_postgresql())
+
+
+def agendar_extracao(apps, schema_editor):
+    """Coloca os documentos já existentes na fila do `extrair_textos`"""
+    Documento = apps.get_model('crm', 'Documento')
+    TextoDocumento = apps.get_model('crm', 'TextoDocumento')
+    TextoDocumento.objects.bulk_create(
+        (TextoDocumento(documento_id=documento_id) for documento_id in Documento.objects.values_list('id', flat=True)),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0011_uploaddocumento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextoDocumento',
+            fields=[
+                ('documento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='texto', serialize=False, to='crm.documento')),
+                ('hash', models.CharField(blank=True, db_index=True, help_text='SHA-256 do conteúdo extraído', max_length=64)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('ignorado', 'Ignorado'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('texto', models.TextField(blank=True)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Texto de Documento',
+                'verbose_name_plural': 'Textos de Documentos',
+                'indexes': [models.Index(fields=['status', 'atualizado_em'], name='crm_textodo_status_fdcc76_idx')],
+            },
+        ),
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+        migrations.RunPython(agendar_extracao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+INDICE_ANTIGO = models.Index(
+    fields=['usuario', '-score', 'ultimo_contato', 'data_entrada_etapa'],
+    name='crm_cliente_usuario_29d722_idx',
+)
+
+INDICE_FILA = models.Index(
+    models.F('usuario'), models.OrderBy(models.F('score'), descending=True),
+    models.OrderBy(models.F('ultimo_contato'), nulls_first=True), models.F('data_entrada_etapa'),
+    name='crm_cliente_fila_acoes_idx',
+)
+
+# O SQLite não aceita NULLS FIRST em índices, mas em ordem crescente já
+# põe os NULLs primeiro: as colunas simples dão a mesma ordem
+INDICE_FILA_SQLITE = models.Index(
+    fields=['usuario', '-score', 'ultimo_contato', 'data_entrada_etapa'],
+    name='crm_cliente_fila_acoes_idx',
+)
+
+
+def _indice_fila(schema_editor):
+    return INDICE_FILA_SQLITE if schema_editor.connection.vendor == 'sqlite' else INDICE_FILA
+
+
+def trocar_indice(apps, schema_editor):
+    Cliente = apps.get_model('crm', 'Cliente')
+    schema_editor.remove_index(Cliente, INDICE_ANTIGO)
+    schema_editor.add_index(Cliente, _indice_fila(schema_editor))
+
+
+def desfazer_troca(apps, schema_editor):
+    Cliente = apps.get_model('crm', 'Cliente')
+    schema_editor.remove_index(Cliente, _indice_fila(schema_editor))
+    schema_editor.add_index(Cliente, INDICE_ANTIGO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_tabela_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(trocar_indice, desfazer_troca)],
+            state_operations=[
+                migrations.RemoveIndex(model_name='cliente', name='crm_cliente_usuario_29d722_idx'),
+                migrations.AddIndex(model_name='cliente', index=INDICE_FILA),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def sinal_dos_em_andamento(apps, schema_editor):
+    # Pedidos já em processamento contam a partir do início, como antes
+    ProcessamentoRelatorio = apps.get_model('crm', 'ProcessamentoRelatorio')
+    ProcessamentoRelatorio.objects.filter(status='processando').update(sinal_vida_em=F('iniciado_em'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0014_cliente_indice_fila_nulls_first'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processamentorelatorio',
+            name='sinal_vida_em',
+            field=models.DateTimeField(blank=True, help_text='Renovado pelo worker enquanto processa; parado indica worker interrompido', null=True),
+        ),
+        migrations.RunPython(sinal_dos_em_andamento, migrations.RunPython.noop),
+    ]
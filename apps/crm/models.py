@@ -1,9 +1,21 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+def guardar_original(instancia, campos):
+    """
+    Copia os campos carregados do banco (ou None se algum foi adiado)
+
+    Permite comparar o estado anterior no post_save sem reconsultar o banco.
+    """
+    if instancia.get_deferred_fields() & set(campos):
+        return None
+    return {campo: getattr(instancia, campo) for campo in campos}
+
+
 class Funil(models.Model):
     """Funil de vendas com etapas personalizáveis"""
     nome = models.CharField(max_length=100)
@@ -107,6 +119,13 @@ class Cliente(models.Model):
         help_text="Probabilidade de conversão (%)"
     )
     
+    # Score de priorização (ver analise.analisar_quadro)
+    score = models.PositiveSmallIntegerField(default=50)
+    score_revisar_em = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Próxima vez em que o score muda só pela passagem do tempo"
+    )
+    
     # Relacionamentos
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='clientes')
     tags = models.ManyToManyField(Tag, blank=True, related_name='clientes')
@@ -127,11 +146,59 @@ class Cliente(models.Model):
             models.Index(fields=['usuario', 'funil', 'etapa']),
             models.Index(fields=['data_entrada_etapa']),
             models.Index(fields=['email']),
+            models.Index(fields=['usuario', 'funil', '-score']),
+            # Mesma ordem de analise.ORDEM_FILA, com os NULLs de
+            # ultimo_contato primeiro (o padrão do PostgreSQL os põe no fim)
+            models.Index(
+                'usuario', F('score').desc(), F('ultimo_contato').asc(nulls_first=True), 'data_entrada_etapa',
+                name='crm_cliente_fila_acoes_idx',
+            ),
+            models.Index(fields=['score_revisar_em']),
         ]
 
+    # Valores carregados do banco, usados para atualizar as metas por diferença
+    _campos_meta = ('usuario_id', 'funil_id', 'etapa', 'valor_estimado', 'data_entrada_etapa')
+    _original_meta = None
+
+    # Campos de que o score depende; se nenhum mudou e a revisão não venceu,
+    # o score salvo continua válido
+    _campos_score = ('funil_id', 'etapa', 'valor_estimado', 'data_entrada_etapa', 'ultimo_contato')
+    _original_score = None
+
     def __str__(self):
         return f"{self.nome} - {self.etapa}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._original_meta = guardar_original(instancia, cls._campos_meta)
+        instancia._original_score = guardar_original(instancia, cls._campos_score)
+        return instancia
+
+    def save(self, *args, **kwargs):
+        # O score depende de valor, etapa, prazo e último contato; recalcular
+        # quando algum deles muda mantém a coluna ordenável sempre coerente
+        if self.score_desatualizado():
+            self.atualizar_score()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'score', 'score_revisar_em'}
+        super().save(*args, **kwargs)
+        self._original_score = guardar_original(self, self._campos_score)
+
+    def score_desatualizado(self, agora=None):
+        """Indica se o score salvo deixou de valer (dados alterados ou revisão vencida)"""
+        if self._original_score is None or self._original_score != guardar_original(self, self._campos_score):
+            return True
+        return self.score_revisar_em is not None and self.score_revisar_em <= (agora or timezone.now())
+
+    def atualizar_score(self, agora=None):
+        """Recalcula score e score_revisar_em a partir dos dados atuais (não salva)"""
+        from .analise import analisar_cliente
+
+        analise = analisar_cliente(self, agora)
+        self.score = analise['score']
+        self.score_revisar_em = analise['score_revisar_em']
+
     def horas_na_etapa(self):
         delta = timezone.now() - self.data_entrada_etapa
         return delta.total_seconds() / 3600
@@ -148,6 +215,40 @@ class Cliente(models.Model):
         prazo = self.funil.get_prazo_etapa(self.etapa)
         return self.horas_na_etapa() - prazo
 
+    def registrar_entrada_etapa(self, momento=None):
+        """Fecha a passagem aberta na etapa anterior e abre uma nova na etapa atual"""
+        momento = momento or self.data_entrada_etapa or timezone.now()
+        self.historico_etapas.filter(data_saida__isnull=True).update(data_saida=momento)
+        return HistoricoEtapa.objects.create(
+            cliente=self,
+            funil=self.funil,
+            etapa=self.etapa,
+            usuario=self.usuario,
+            data_entrada=momento,
+        )
+
+
+class HistoricoEtapa(models.Model):
+    """Passagem de um cliente por uma etapa do funil"""
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='historico_etapas')
+    funil = models.ForeignKey(Funil, on_delete=models.CASCADE, related_name='historico_etapas')
+    etapa = models.CharField(max_length=100)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='historico_etapas')
+    data_entrada = models.DateTimeField(default=timezone.now)
+    data_saida = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Histórico de Etapa"
+        verbose_name_plural = "Histórico de Etapas"
+        ordering = ['-data_entrada']
+        indexes = [
+            models.Index(fields=['funil', 'etapa', 'cliente']),
+            models.Index(fields=['cliente', 'data_saida']),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente_id} - {self.etapa}"
+
 
 class Tarefa(models.Model):
     """Tarefas do CRM"""
@@ -209,6 +310,7 @@ class Tarefa(models.Model):
             models.Index(fields=['usuario', 'status']),
             models.Index(fields=['data_vencimento']),
             models.Index(fields=['cliente']),
+            models.Index(fields=['lembrete', 'status']),
         ]
 
     def __str__(self):
@@ -295,6 +397,7 @@ class Documento(models.Model):
     
     # Metadados
     tamanho = models.IntegerField(help_text="Tamanho em bytes")
+    hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 do conteúdo")
     
     criado_em = models.DateTimeField(auto_now_add=True)
 
@@ -315,6 +418,68 @@ class Documento(models.Model):
         return f"{self.tamanho:.1f} TB"
 
 
+class TextoDocumento(models.Model):
+    """
+    Texto extraído de um Documento para a busca (ver extracao)
+
+    Fica fora de Documento para que as listagens não carreguem o texto. O
+    índice de texto completo é criado na migração 0012 (FTS5 no SQLite,
+    GIN no PostgreSQL).
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('ignorado', 'Ignorado'),
+        ('erro', 'Erro'),
+    ]
+
+    documento = models.OneToOneField(Documento, on_delete=models.CASCADE, primary_key=True, related_name='texto')
+    hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 do conteúdo extraído")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    texto = models.TextField(blank=True)
+    erro = models.TextField(blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Texto de Documento"
+        verbose_name_plural = "Textos de Documentos"
+        indexes = [
+            models.Index(fields=['status', 'atualizado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.documento_id} - {self.get_status_display()}"
+
+
+class UploadDocumento(models.Model):
+    """Upload de documento em partes, ainda não finalizado (ver uploads)"""
+    nome = models.CharField(max_length=200)
+    tipo = models.CharField(max_length=20, choices=Documento.TIPO_CHOICES, default='documento')
+    descricao = models.TextField(blank=True, null=True)
+
+    # Relacionamentos
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='uploads_documento')
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads_documento')
+
+    # Progresso
+    tamanho = models.BigIntegerField(help_text="Tamanho total declarado, em bytes")
+    sha256 = models.CharField(max_length=64, help_text="SHA-256 declarado do arquivo inteiro")
+    recebido = models.BigIntegerField(default=0, help_text="Bytes já gravados, a partir do início")
+    partes = models.JSONField(default=list, blank=True, help_text="Nomes das partes no storage, em ordem")
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Upload de Documento"
+        verbose_name_plural = "Uploads de Documentos"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.nome} ({self.recebido}/{self.tamanho})"
+
+
 class Email(models.Model):
     """Emails enviados/recebidos"""
     TIPO_CHOICES = [
@@ -382,12 +547,22 @@ class Meta(models.Model):
         ('trimestral', 'Trimestral'),
         ('anual', 'Anual'),
     ]
+    
+    ORIGEM_VALOR_CHOICES = [
+        ('propostas', 'Propostas aceitas'),
+        ('propostas_clientes', 'Propostas aceitas + clientes na última etapa'),
+        ('manual', 'Manual'),
+    ]
 
     nome = models.CharField(max_length=200)
     descricao = models.TextField(blank=True, null=True)
     periodo = models.CharField(max_length=20, choices=PERIODO_CHOICES, default='mensal')
     valor_alvo = models.DecimalField(max_digits=15, decimal_places=2)
     valor_atual = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    origem_valor = models.CharField(
+        max_length=20, choices=ORIGEM_VALOR_CHOICES, default='propostas',
+        help_text="De onde vem o valor atual (atualizado automaticamente, exceto se manual)"
+    )
     
     # Relacionamentos
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='metas')
@@ -402,6 +577,9 @@ class Meta(models.Model):
         verbose_name = "Meta"
         verbose_name_plural = "Metas"
         ordering = ['-data_inicio']
+        indexes = [
+            models.Index(fields=['usuario', 'data_inicio', 'data_fim']),
+        ]
 
     def __str__(self):
         return f"{self.nome} - {self.periodo}"
@@ -477,9 +655,26 @@ class Proposta(models.Model):
         verbose_name_plural = "Propostas"
         ordering = ['-criado_em']
 
+    # Valores carregados do banco, usados para atualizar as metas por diferença
+    _campos_meta = ('usuario_id', 'status', 'valor_total', 'desconto', 'data_aceite')
+    _original_meta = None
+
     def __str__(self):
         return f"Proposta {self.numero} - {self.cliente.nome}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._original_meta = guardar_original(instancia, cls._campos_meta)
+        return instancia
+
+    def save(self, *args, **kwargs):
+        if self.status == 'aceita' and not self.data_aceite:
+            self.data_aceite = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'data_aceite'}
+        super().save(*args, **kwargs)
+
     def valor_final(self):
         return self.valor_total - self.desconto
 
@@ -497,4 +692,85 @@ class ItemProposta(models.Model):
         verbose_name_plural = "Itens da Proposta"
 
     def subtotal(self):
-        return (self.quantidade * self.preco_unitario) - self.desconto
\ No newline at end of file
+        return (self.quantidade * self.preco_unitario) - self.desconto
+
+
+class ProcessamentoRelatorio(models.Model):
+    """Relatório ou exportação gerado em segundo plano"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    chave = models.CharField(max_length=64, help_text="Hash de tipo + parâmetros + usuário")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    
+    # Progresso
+    total_linhas = models.IntegerField(default=0)
+    linhas_processadas = models.IntegerField(default=0)
+    
+    # Resultado
+    arquivo = models.FileField(upload_to='relatorios/%Y/%m/', blank=True)
+    erro = models.TextField(blank=True, null=True)
+    
+    # Relacionamentos
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='processamentos_relatorio')
+    
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    sinal_vida_em = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Renovado pelo worker enquanto processa; parado indica worker interrompido"
+    )
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Processamento de Relatório"
+        verbose_name_plural = "Processamentos de Relatórios"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+            models.Index(fields=['chave', 'status']),
+            models.Index(fields=['usuario', '-criado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} - {self.get_status_display()}"
+
+    def progresso(self):
+        if self.status == 'concluido':
+            return 100
+        if not self.total_linhas:
+            return 0
+        return min(int(self.linhas_processadas / self.total_linhas * 100), 99)
+
+
+class PerfilRequisicao(models.Model):
+    """Perfil de uma requisição, em pilhas colapsadas (ver perfilador)"""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='perfis_requisicao')
+    solicitado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='perfis_solicitados'
+    )
+
+    metodo = models.CharField(max_length=10)
+    caminho = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)
+    status = models.IntegerField(null=True, blank=True)
+    duracao_ms = models.FloatField()
+    amostras = models.IntegerField(default=0)
+    arquivo = models.FileField(upload_to='perfis/%Y/%m/')
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Perfil de Requisição"
+        verbose_name_plural = "Perfis de Requisições"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.metodo} {self.caminho} ({self.duracao_ms:.0f} ms)"
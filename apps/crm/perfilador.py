@@ -0,0 +1,225 @@
+"""
+Perfil sob demanda de uma requisição específica
+
+Um superusuário arma o perfil de duas formas:
+
+- no painel admin do CRM, para as próximas requisições de um usuário
+  (opcionalmente só sob um caminho); o agendamento fica no cache
+  compartilhado (settings.CACHES), visível para todos os processos;
+- gerando um link com o parâmetro ?perfil=<token assinado>, válido por
+  settings.CRM_PERFIL_VALIDADE segundos e só para o usuário escolhido.
+
+Durante a requisição escolhida uma thread amostra a pilha da thread que a
+atende a cada settings.CRM_PERFIL_INTERVALO segundos. O resultado vai para
+um PerfilRequisicao no formato de pilhas colapsadas ("a;b;c 12" por linha),
+aceito por flamegraph.pl, speedscope e similares. As demais requisições
+só pagam a checagem do parâmetro e uma consulta a uma cópia local dos
+agendamentos, relida do cache no máximo a cada settings.CRM_PERFIL_RECARGA
+segundos: com o DatabaseCache, cada leitura do cache é uma consulta SQL.
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from .models import PerfilRequisicao
+
+
+PARAMETRO = 'perfil'
+_SAL = 'crm.perfilador'
+_CHAVE_AGENDADOS = 'crm:perfil:agendados'
+_RAIZ = str(settings.BASE_DIR) + '/'
+
+# Cópia dos agendamentos neste processo e quando foi lida (time.monotonic)
+_copia = {'agendados': {}, 'lida_em': None}
+
+
+def assinar_perfil(alvo, solicitado_por):
+    """
+    Token para o parâmetro ?perfil= que perfila uma requisição de alvo
+
+    Returns:
+        str
+    """
+    return signing.dumps({'alvo': alvo.id, 'por': solicitado_por.id}, salt=_SAL)
+
+
+def _token(request):
+    """Dados do token da requisição, se válido para o usuário logado"""
+    try:
+        dados = signing.loads(request.GET[PARAMETRO], salt=_SAL, max_age=settings.CRM_PERFIL_VALIDADE)
+    except signing.BadSignature:
+        return None
+    return dados if dados.get('alvo') == request.user.id else None
+
+
+def perfis_agendados():
+    """
+    Agendamentos ainda válidos
+
+    Returns:
+        dict: usuario_id -> {'caminho', 'restantes', 'expira', 'por'}
+    """
+    agora = time.time()
+    return {
+        usuario_id: agendamento
+        for usuario_id, agendamento in (cache.get(_CHAVE_AGENDADOS) or {}).items()
+        if agendamento['expira'] > agora
+    }
+
+
+def _agendados_processo():
+    """Agendamentos vistos por este processo, relidos do cache a cada CRM_PERFIL_RECARGA segundos"""
+    agora = time.monotonic()
+    if _copia['lida_em'] is None or agora - _copia['lida_em'] >= settings.CRM_PERFIL_RECARGA:
+        _copia['agendados'] = cache.get(_CHAVE_AGENDADOS) or {}
+        _copia['lida_em'] = agora
+    return _copia['agendados']
+
+
+def _gravar_agendados(agendados):
+    cache.set(_CHAVE_AGENDADOS, agendados, settings.CRM_PERFIL_VALIDADE)
+    # Neste processo a mudança vale já; nos demais, na próxima releitura
+    _copia['agendados'] = agendados
+    _copia['lida_em'] = time.monotonic()
+
+
+def agendar_perfil(alvo, solicitado_por, caminho='', requisicoes=1):
+    """Perfila as próximas requisições de alvo cujo caminho comece com caminho"""
+    agendados = perfis_agendados()
+    agendados[alvo.id] = {
+        'caminho': caminho,
+        'restantes': requisicoes,
+        'expira': time.time() + settings.CRM_PERFIL_VALIDADE,
+        'por': solicitado_por.id,
+    }
+    _gravar_agendados(agendados)
+
+
+def cancelar_perfil(usuario_id):
+    agendados = perfis_agendados()
+    if agendados.pop(usuario_id, None) is not None:
+        _gravar_agendados(agendados)
+
+
+def _consumir_agendamento(request):
+    """Id de quem agendou, se esta requisição deve ser perfilada"""
+    agendamento = _agendados_processo().get(request.user.id)
+    if agendamento is None:
+        return None
+    if agendamento['expira'] <= time.time() or not request.path.startswith(agendamento['caminho']):
+        return None
+    # A cópia local pode estar velha: o agendamento é confirmado no cache.
+    # Sem trava entre processos: no pior caso uma requisição a mais é perfilada
+    agendados = perfis_agendados()
+    agendamento = agendados.get(request.user.id)
+    _copia.update(agendados=agendados, lida_em=time.monotonic())
+    if agendamento is None or not request.path.startswith(agendamento['caminho']):
+        return None
+    if agendamento['restantes'] > 1:
+        agendados[request.user.id] = {**agendamento, 'restantes': agendamento['restantes'] - 1}
+    else:
+        agendados.pop(request.user.id, None)
+    _gravar_agendados(agendados)
+    return agendamento['por']
+
+
+class Amostrador:
+    """Amostra periodicamente a pilha de uma thread"""
+
+    def __init__(self, thread_id, intervalo):
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='crm-perfilador', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while quadro is not None:
+                pilha.append(quadro.f_code)
+                quadro = quadro.f_back
+            if pilha:
+                self.pilhas[tuple(reversed(pilha))] += 1
+                self.amostras += 1
+
+    def colapsado(self):
+        """Pilhas no formato "raiz;...;folha quantidade", uma por linha"""
+        nomes = {}
+
+        def nome(codigo):
+            if codigo not in nomes:
+                arquivo = codigo.co_filename
+                if arquivo.startswith(_RAIZ):
+                    arquivo = arquivo[len(_RAIZ):]
+                elif 'site-packages/' in arquivo:
+                    arquivo = arquivo.split('site-packages/', 1)[1]
+                else:
+                    arquivo = Path(arquivo).name
+                funcao = getattr(codigo, 'co_qualname', codigo.co_name)
+                nomes[codigo] = f'{funcao} ({arquivo}:{codigo.co_firstlineno})'.replace(';', ',')
+            return nomes[codigo]
+
+        linhas = [
+            f"{';'.join(nome(codigo) for codigo in pilha)} {quantidade}"
+            for pilha, quantidade in self.pilhas.items()
+        ]
+        return '\n'.join(sorted(linhas)) + '\n'
+
+
+def perfilar_requisicao(request, get_response):
+    """
+    Executa a requisição, perfilando-a se um superusuário pediu
+
+    Returns:
+        HttpResponse
+    """
+    if not request.user.is_authenticated:
+        return get_response(request)
+    if PARAMETRO in request.GET:
+        dados = _token(request)
+        solicitado_por = dados['por'] if dados else None
+    else:
+        solicitado_por = _consumir_agendamento(request)
+    if solicitado_por is None:
+        return get_response(request)
+
+    inicio = time.perf_counter()
+    with Amostrador(threading.get_ident(), settings.CRM_PERFIL_INTERVALO) as amostrador:
+        response = get_response(request)
+    duracao = (time.perf_counter() - inicio) * 1000
+
+    correspondencia = getattr(request, 'resolver_match', None)
+    perfil = PerfilRequisicao(
+        usuario=request.user,
+        solicitado_por_id=solicitado_por,
+        metodo=request.method,
+        caminho=request.path[:500],
+        view=correspondencia.view_name if correspondencia else '',
+        status=response.status_code,
+        duracao_ms=round(duracao, 2),
+        amostras=amostrador.amostras,
+    )
+    perfil.arquivo.save(f'perfil-{request.user.id}-{int(time.time())}.folded', ContentFile(
+        amostrador.colapsado().encode('utf-8')
+    ))
+    response['X-CRM-Perfil'] = str(perfil.id)
+    return response
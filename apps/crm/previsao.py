@@ -0,0 +1,386 @@
+"""
+Previsão ponderada do pipeline e simulação do funil
+
+O valor de cada negócio em aberto é ponderado pela probabilidade do
+cliente ou pelas taxas de conversão do funil e distribuído pelo período
+em que se espera o fechamento (entrada na etapa + prazos das etapas que
+faltam). Tudo é calculado em uma única agregação no banco, agrupada por
+período, funil e responsável, e o resultado fica em cache por usuário
+até que algum cliente ou funil dele mude.
+
+A simulação de Monte Carlo (simular_funil) projeta fechamentos e receita
+semana a semana a partir da distribuição atual de clientes nas etapas.
+"""
+
+import hashlib
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case, Count, DateTimeField, DecimalField, DurationField, ExpressionWrapper,
+    F, Q, Sum, Value, When,
+)
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .metricas import registrar_cache
+from .models import Cliente, Funil
+
+
+MODOS = {
+    'probabilidade': 'Probabilidade do cliente',
+    'funil': 'Taxas de conversão do funil',
+}
+
+AGRUPAMENTOS = {
+    'mes': TruncMonth,
+    'semana': TruncWeek,
+}
+
+
+# Identificador usado no cache para a visão de todos os usuários
+TODOS = 'todos'
+
+
+def versao_dados(usuario_id):
+    """
+    Versão atual dos dados de funil/clientes do usuário
+
+    Muda sempre que um cliente ou funil do usuário é salvo ou excluído
+    (ver signals), invalidando os caches que a usam na chave.
+    """
+    return cache.get_or_set(f'crm:versao:{usuario_id}', time.time_ns, None)
+
+
+def invalidar_dados(usuario_id):
+    """Gera uma nova versão dos dados do usuário (e da visão de todos)"""
+    versao = time.time_ns()
+    cache.set_many({f'crm:versao:{usuario_id}': versao, f'crm:versao:{TODOS}': versao}, None)
+
+
+def chave_cache(prefixo, usuario_id, *partes):
+    """Chave de cache amarrada à versão dos dados do usuário"""
+    return ':'.join(['crm', prefixo, str(usuario_id), str(versao_dados(usuario_id)), *map(str, partes)])
+
+
+_AUSENTE = object()
+
+
+def obter_cache(nome, chave, calcular, ttl):
+    """
+    Como cache.get_or_set, contando acertos e falhas nas métricas
+
+    Args:
+        nome: rótulo do cache nas métricas (ex.: 'previsao')
+        chave: chave de cache (ver chave_cache)
+        calcular: função chamada quando a chave não está no cache
+        ttl: validade em segundos
+    """
+    valor = cache.get(chave, _AUSENTE)
+    registrar_cache(nome, valor is not _AUSENTE)
+    if valor is _AUSENTE:
+        valor = calcular()
+        cache.set(chave, valor, ttl)
+    return valor
+
+
+def probabilidade_fechamento(funil, etapa):
+    """
+    Probabilidade de um cliente na etapa chegar à última etapa do funil
+
+    Produto das taxas de conversão da etapa atual até a penúltima. Sem
+    taxa configurada para alguma dessas etapas, retorna None.
+
+    Args:
+        funil: Instância de Funil
+        etapa: str
+
+    Returns:
+        float ou None: Probabilidade entre 0 e 1
+    """
+    posicao = funil.etapas.index(etapa)
+    probabilidade = 1.0
+    for etapa_seguinte in funil.etapas[posicao:-1]:
+        taxa = funil.taxas_conversao.get(etapa_seguinte)
+        if taxa in (None, ''):
+            return None
+        probabilidade *= float(taxa) / 100
+    return probabilidade
+
+
+def _expressoes_funis(funis, modo):
+    """Monta filtros e expressões CASE por (funil, etapa) para a agregação"""
+    abertos = Q()
+    prazo_restante = []
+    pesos = []
+    for funil in funis:
+        if not funil.etapas:
+            continue
+        abertos |= Q(funil_id=funil.id) & ~Q(etapa=funil.etapas[-1])
+        horas_restantes = 0
+        for etapa in reversed(funil.etapas[:-1]):
+            horas_restantes += float(funil.get_prazo_etapa(etapa))
+            condicao = Q(funil_id=funil.id, etapa=etapa)
+            prazo_restante.append(When(condicao, then=Value(timedelta(hours=horas_restantes))))
+            if modo == 'funil':
+                probabilidade = probabilidade_fechamento(funil, etapa)
+                if probabilidade is not None:
+                    pesos.append(When(condicao, then=Value(Decimal(str(round(probabilidade, 6))))))
+
+    peso_padrao = ExpressionWrapper(
+        F('probabilidade') * Value(Decimal('0.01')),
+        output_field=DecimalField(max_digits=9, decimal_places=6),
+    )
+    peso = Case(*pesos, default=peso_padrao, output_field=DecimalField(max_digits=9, decimal_places=6))
+    fechamento = ExpressionWrapper(
+        F('data_entrada_etapa') + Case(
+            *prazo_restante,
+            default=Value(timedelta(0)),
+            output_field=DurationField(),
+        ),
+        output_field=DateTimeField(),
+    )
+    return abertos, peso, fechamento
+
+
+def previsao_pipeline(usuario, modo='probabilidade', agrupamento='mes', funil_id=None):
+    """
+    Calcula o pipeline ponderado por período de fechamento, funil e responsável
+
+    Args:
+        usuario: User (opcional) - dono dos clientes; None considera todos os usuários
+        modo: str - 'probabilidade' (valor × probabilidade do cliente) ou
+            'funil' (valor × chance de chegar à última etapa pelas taxas do funil;
+            etapas sem taxa usam a probabilidade do cliente)
+        agrupamento: str - 'mes' ou 'semana'
+        funil_id: int (opcional) - restringe a um funil
+
+    Returns:
+        dict: total, por_periodo, por_funil, por_usuario e linhas (período × funil × responsável)
+    """
+    funis = Funil.objects.all()
+    clientes = Cliente.objects.all()
+    if usuario is not None:
+        funis = funis.filter(usuario=usuario)
+        clientes = clientes.filter(usuario=usuario)
+    if funil_id:
+        funis = funis.filter(id=funil_id)
+    funis = list(funis)
+    nomes_funis = {funil.id: funil.nome for funil in funis}
+
+    vazio = {
+        'modo': modo, 'agrupamento': agrupamento,
+        'total': {'quantidade': 0, 'valor': 0.0, 'ponderado': 0.0},
+        'por_periodo': [], 'por_funil': [], 'por_usuario': [], 'linhas': [],
+    }
+    if not funis:
+        return vazio
+
+    abertos, peso, fechamento = _expressoes_funis(funis, modo)
+    if not abertos:
+        return vazio
+
+    linhas = (
+        clientes
+        .filter(abertos)
+        .annotate(periodo=AGRUPAMENTOS[agrupamento](fechamento))
+        .values('periodo', 'funil_id', 'usuario_id', 'usuario__username')
+        .annotate(
+            quantidade=Count('id'),
+            valor=Sum('valor_estimado'),
+            ponderado=Sum(F('valor_estimado') * peso),
+        )
+        .order_by('periodo', 'funil_id', 'usuario_id')
+    )
+
+    resultado = dict(vazio, linhas=[])
+    por_periodo, por_funil, por_usuario = {}, {}, {}
+    for linha in linhas:
+        item = {
+            'periodo': linha['periodo'].date().isoformat() if linha['periodo'] else None,
+            'funil_id': linha['funil_id'],
+            'funil': nomes_funis.get(linha['funil_id']),
+            'usuario_id': linha['usuario_id'],
+            'usuario': linha['usuario__username'],
+            'quantidade': linha['quantidade'],
+            'valor': float(linha['valor'] or 0),
+            'ponderado': float(linha['ponderado'] or 0),
+        }
+        resultado['linhas'].append(item)
+        for grupo, chave, rotulo in (
+            (por_periodo, item['periodo'], 'periodo'),
+            (por_funil, item['funil_id'], 'funil'),
+            (por_usuario, item['usuario_id'], 'usuario'),
+        ):
+            acumulado = grupo.setdefault(chave, {rotulo: item[rotulo], 'quantidade': 0, 'valor': 0.0, 'ponderado': 0.0})
+            acumulado['quantidade'] += item['quantidade']
+            acumulado['valor'] += item['valor']
+            acumulado['ponderado'] += item['ponderado']
+        for campo in ('quantidade', 'valor', 'ponderado'):
+            resultado['total'][campo] += item[campo]
+
+    resultado['por_periodo'] = list(por_periodo.values())
+    resultado['por_funil'] = list(por_funil.values())
+    resultado['por_usuario'] = list(por_usuario.values())
+    return resultado
+
+
+def previsao_pipeline_cache(usuario, modo='probabilidade', agrupamento='mes', funil_id=None):
+    """
+    previsao_pipeline com cache por usuário
+
+    A chave inclui a versão dos dados do usuário, então qualquer alteração
+    em seus clientes ou funis gera um novo cálculo; CRM_PREVISAO_TTL limita
+    a idade máxima do resultado (o período de fechamento depende da data).
+    """
+    chave = chave_cache('previsao', usuario.id if usuario else TODOS, modo, agrupamento, funil_id or '')
+    return obter_cache(
+        'previsao',
+        chave,
+        lambda: previsao_pipeline(usuario, modo, agrupamento, funil_id),
+        settings.CRM_PREVISAO_TTL,
+    )
+
+
+# Percentis devolvidos pela simulação
+PERCENTIS = [10, 50, 90]
+
+
+def distribuicao_funil(funil):
+    """
+    Clientes, valor médio e probabilidade média por etapa do funil
+
+    Args:
+        funil: Instância de Funil
+
+    Returns:
+        dict: {etapa: {'quantidade', 'valor_medio', 'probabilidade_media'}}
+    """
+    linhas = (
+        Cliente.objects.filter(funil=funil)
+        .order_by()
+        .values('etapa')
+        .annotate(quantidade=Count('id'), valor=Sum('valor_estimado'), probabilidade=Sum('probabilidade'))
+    )
+    return {
+        linha['etapa']: {
+            'quantidade': linha['quantidade'],
+            'valor_medio': float(linha['valor'] or 0) / linha['quantidade'],
+            'probabilidade_media': float(linha['probabilidade'] or 0) / linha['quantidade'],
+        }
+        for linha in linhas
+    }
+
+
+def simular_funil(funil, semanas=12, iteracoes=10_000, taxas=None, prazos=None, semente=None):
+    """
+    Simulação de Monte Carlo da evolução do funil nas próximas semanas
+
+    Cada negócio em aberto fica na etapa um tempo exponencial com média
+    igual ao prazo da etapa e, ao sair, avança com a taxa de conversão da
+    etapa (ou é perdido). Chegar à última etapa conta como fechamento.
+    Como negócios na mesma etapa são equivalentes, a simulação sorteia
+    contagens (binomiais) por coorte de etapa de origem em vez de sortear
+    negócio a negócio, então o custo não depende do número de clientes.
+    A receita de cada fechamento é o valor médio da etapa de origem.
+
+    Args:
+        funil: Instância de Funil
+        semanas: int - horizonte da simulação
+        iteracoes: int - trajetórias simuladas
+        taxas: dict (opcional) - {etapa: %} substitui Funil.taxas_conversao (cenário "e se")
+        prazos: dict (opcional) - {etapa: horas} substitui Funil.prazos
+        semente: int (opcional) - para resultados reproduzíveis
+
+    Returns:
+        dict: parâmetros usados e, por semana, percentis acumulados de
+        negócios fechados e receita fechada
+    """
+    etapas = funil.etapas
+    abertas = etapas[:-1]
+    distribuicao = distribuicao_funil(funil)
+    taxas = {**funil.taxas_conversao, **(taxas or {})}
+    prazos = {**funil.prazos, **(prazos or {})}
+
+    resultado = {
+        'funil_id': funil.id,
+        'semanas': semanas,
+        'iteracoes': iteracoes,
+        'percentis': PERCENTIS,
+        'etapas': [],
+        'por_semana': [],
+    }
+    if not abertas:
+        return resultado
+
+    quantidade = np.array([distribuicao.get(etapa, {}).get('quantidade', 0) for etapa in abertas])
+    valor_medio = np.array([distribuicao.get(etapa, {}).get('valor_medio', 0.0) for etapa in abertas])
+
+    taxa = np.empty(len(abertas))
+    saida = np.empty(len(abertas))
+    for indice, etapa in enumerate(abertas):
+        # Sem taxa configurada, usa a probabilidade média dos clientes da etapa
+        taxa_etapa = taxas.get(etapa)
+        if taxa_etapa in (None, ''):
+            taxa_etapa = distribuicao.get(etapa, {}).get('probabilidade_media', 50)
+        taxa[indice] = min(max(float(taxa_etapa) / 100, 0.0), 1.0)
+
+        # Prazo 0 (etapa sem prazo) é tratado como uma semana
+        prazo_etapa = float(prazos.get(etapa, 24) or 168)
+        saida[indice] = 1 - np.exp(-168 / prazo_etapa)
+
+        resultado['etapas'].append({
+            'etapa': etapa,
+            'quantidade': int(quantidade[indice]),
+            'valor_medio': float(valor_medio[indice]),
+            'taxa_conversao': taxa[indice] * 100,
+            'prazo': prazo_etapa,
+            'saida_semanal': saida[indice] * 100,
+        })
+
+    rng = np.random.default_rng(semente)
+    # Contagens por (iteração, etapa de origem, etapa atual)
+    estado = np.zeros((iteracoes, len(abertas), len(abertas)), dtype=np.int64)
+    estado[:, np.arange(len(abertas)), np.arange(len(abertas))] = quantidade
+    fechados = np.zeros((iteracoes, len(abertas)), dtype=np.int64)
+
+    for semana in range(1, semanas + 1):
+        saem = rng.binomial(estado, saida)
+        avancam = rng.binomial(saem, taxa)
+        estado -= saem
+        estado[:, :, 1:] += avancam[:, :, :-1]
+        fechados += avancam[:, :, -1]
+
+        negocios = fechados.sum(axis=1)
+        receita = fechados @ valor_medio
+        resultado['por_semana'].append({
+            'semana': semana,
+            'negocios': dict(zip(map(str, PERCENTIS), np.percentile(negocios, PERCENTIS).tolist())),
+            'receita': dict(zip(map(str, PERCENTIS), np.percentile(receita, PERCENTIS).round(2).tolist())),
+            'receita_media': float(receita.mean()),
+        })
+
+    return resultado
+
+
+def simular_funil_cache(funil, semanas=12, iteracoes=10_000, taxas=None, prazos=None, semente=None):
+    """
+    simular_funil com cache até que o funil ou seus clientes mudem
+
+    Args e Returns: ver simular_funil
+    """
+    cenario = json.dumps({'taxas': taxas or {}, 'prazos': prazos or {}}, sort_keys=True)
+    chave = chave_cache(
+        'simulacao', funil.usuario_id, funil.id, semanas, iteracoes, semente,
+        hashlib.sha256(cenario.encode('utf-8')).hexdigest()[:16],
+    )
+    return obter_cache(
+        'simulacao',
+        chave,
+        lambda: simular_funil(funil, semanas, iteracoes, taxas, prazos, semente),
+        settings.CRM_SIMULACAO_TTL,
+    )
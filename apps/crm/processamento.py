@@ -0,0 +1,336 @@
+"""
+Fila de relatórios e exportações processados em segundo plano
+
+Os pedidos ficam em ProcessamentoRelatorio; o comando
+`python manage.py processar_relatorios` consome a fila, grava o resultado
+em MEDIA_ROOT e atualiza o progresso.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exportacao import EXPORTACOES, TAMANHO_LOTE, Eco, consulta_exportacao, linhas_csv
+from .exportacao_colunar import escrever_parquet
+from .importacao import contar_linhas, importar_clientes
+from .models import Funil, ProcessamentoRelatorio
+from .relatorios import metricas_funil
+
+logger = logging.getLogger(__name__)
+
+
+def _gerar_exportacao(processamento, destino, avancar):
+    parametros = processamento.parametros
+    conjunto = parametros['conjunto']
+    filtros = {}
+    if parametros.get('funil') and conjunto == 'clientes':
+        filtros['funil_id'] = parametros['funil']
+
+    _, consulta = consulta_exportacao(conjunto, processamento.usuario, parametros.get('colunas'), filtros)
+    avancar(0, consulta.count())
+
+    linhas = linhas_csv(conjunto, processamento.usuario, parametros.get('colunas'), filtros)
+    destino.write(next(linhas).encode('utf-8'))
+    pendentes = 0
+    for linha in linhas:
+        destino.write(linha.encode('utf-8'))
+        pendentes += 1
+        if pendentes == TAMANHO_LOTE:
+            avancar(pendentes)
+            pendentes = 0
+    avancar(pendentes)
+    return f"{conjunto}.csv"
+
+
+def _gerar_exportacao_parquet(processamento, destino, avancar):
+    parametros = processamento.parametros
+    conjunto = parametros['conjunto']
+    filtros = {}
+    if parametros.get('funil') and conjunto == 'clientes':
+        filtros['funil_id'] = parametros['funil']
+
+    _, consulta = consulta_exportacao(conjunto, processamento.usuario, parametros.get('colunas'), filtros)
+    avancar(0, consulta.count())
+
+    escrever_parquet(
+        conjunto, destino, processamento.usuario, parametros.get('colunas'), filtros,
+        avancar=avancar,
+    )
+    return f"{conjunto}.parquet"
+
+
+def _gerar_relatorio_funil(processamento, destino, avancar):
+    parametros = processamento.parametros
+    funis = Funil.objects.filter(usuario=processamento.usuario, ativo=True)
+    if parametros.get('funil'):
+        funis = funis.filter(id=parametros['funil'])
+    funis = list(funis)
+    avancar(0, len(funis))
+
+    data_inicio = data_fim = None
+    if parametros.get('periodo'):
+        data_fim = timezone.now()
+        data_inicio = data_fim - timedelta(days=parametros['periodo'])
+
+    escritor = csv.writer(Eco())
+    destino.write(('\ufeff' + escritor.writerow([
+        'Funil', 'Etapa', 'Entradas', 'Avançaram', 'Conversão (%)', 'Conversão Esperada (%)',
+        'Abandono', 'Na Etapa Hoje', 'Tempo Médio (h)', 'Mediana (h)', 'P90 (h)', 'Prazo (h)',
+    ])).encode('utf-8'))
+    for funil in funis:
+        metricas = metricas_funil(funil, processamento.usuario, data_inicio, data_fim)
+        for etapa in metricas['etapas']:
+            destino.write(escritor.writerow([
+                funil.nome, etapa['etapa'], etapa['entradas'], etapa['avancaram'] or '',
+                f"{etapa['conversao']:.1f}" if etapa['conversao'] is not None else '',
+                etapa['conversao_esperada'] if etapa['conversao_esperada'] is not None else '',
+                etapa['abandono'], etapa['clientes_atuais'],
+                f"{etapa['tempo_medio']:.1f}", f"{etapa['tempo_mediana']:.1f}",
+                f"{etapa['tempo_p90']:.1f}", etapa['prazo'],
+            ]).encode('utf-8'))
+        avancar(1)
+    return 'relatorio_funil.csv'
+
+
+def _gerar_importacao_clientes(processamento, destino, avancar):
+    parametros = processamento.parametros
+    funil = None
+    if parametros.get('funil'):
+        funil = Funil.objects.get(id=parametros['funil'], usuario=processamento.usuario)
+
+    # O resultado do processamento é o relatório das linhas recusadas
+    relatorio = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='', write_through=True)
+    try:
+        with default_storage.open(parametros['arquivo'], 'rb') as arquivo:
+            avancar(0, contar_linhas(arquivo, parametros['nome']))
+            importar_clientes(
+                arquivo, parametros['nome'], processamento.usuario, relatorio, funil,
+                avancar=avancar,
+            )
+    finally:
+        relatorio.detach()
+        default_storage.delete(parametros['arquivo'])
+    return 'importacao_erros.csv'
+
+
+# Tipos de processamento aceitos: tipo -> (rótulo, gerador)
+GERADORES = {
+    'exportacao': ('Exportação CSV', _gerar_exportacao),
+    'exportacao_parquet': ('Exportação Parquet', _gerar_exportacao_parquet),
+    'relatorio_funil': ('Relatório de Funil', _gerar_relatorio_funil),
+    'importacao_clientes': ('Importação de Clientes', _gerar_importacao_clientes),
+}
+
+
+def calcular_chave(usuario, tipo, parametros):
+    """Hash que identifica pedidos idênticos do mesmo usuário"""
+    conteudo = json.dumps(
+        {'usuario': usuario.pk, 'tipo': tipo, 'parametros': parametros},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def solicitar_processamento(usuario, tipo, parametros):
+    """
+    Enfileira um relatório, reaproveitando um pedido idêntico ainda válido
+
+    Pedidos iguais (mesmo usuário, tipo e parâmetros) que estejam na fila,
+    em andamento com sinal de vida nos últimos CRM_RELATORIOS_TEMPO_MAXIMO
+    segundos ou
+    concluídos há menos de CRM_RELATORIOS_TTL segundos são devolvidos no
+    lugar de um novo processamento.
+
+    Args:
+        usuario: User
+        tipo: str - chave em GERADORES
+        parametros: dict - parâmetros do gerador
+
+    Returns:
+        tuple: (ProcessamentoRelatorio, bool criado)
+    """
+    if tipo not in GERADORES:
+        raise ValueError(f'Tipo de relatório "{tipo}" inválido')
+    if tipo.startswith('exportacao') and parametros.get('conjunto') not in EXPORTACOES:
+        raise ValueError('Conjunto de exportação inválido')
+    if tipo == 'importacao_clientes' and not parametros.get('arquivo'):
+        raise ValueError('Arquivo de importação não informado')
+
+    chave = calcular_chave(usuario, tipo, parametros)
+    agora = timezone.now()
+    existente = ProcessamentoRelatorio.objects.filter(
+        Q(status='pendente') |
+        Q(status='processando', sinal_vida_em__gt=agora - timedelta(seconds=settings.CRM_RELATORIOS_TEMPO_MAXIMO)) |
+        Q(status='concluido', expira_em__gt=agora),
+        chave=chave,
+    ).order_by('-criado_em').first()
+    if existente:
+        return existente, False
+
+    processamento = ProcessamentoRelatorio.objects.create(
+        usuario=usuario,
+        tipo=tipo,
+        parametros=parametros,
+        chave=chave,
+    )
+    return processamento, True
+
+
+def reservar_proximo():
+    """
+    Reserva o próximo pedido pendente para este worker
+
+    A reserva é um UPDATE condicionado ao status, então dois workers
+    nunca processam o mesmo pedido, em qualquer banco.
+
+    Returns:
+        ProcessamentoRelatorio ou None
+    """
+    candidatos = ProcessamentoRelatorio.objects.filter(status='pendente').order_by('criado_em')
+    for processamento_id in candidatos.values_list('id', flat=True)[:10]:
+        reservado = ProcessamentoRelatorio.objects.filter(
+            id=processamento_id, status='pendente'
+        ).update(status='processando', iniciado_em=timezone.now(), sinal_vida_em=timezone.now())
+        if reservado:
+            return ProcessamentoRelatorio.objects.select_related('usuario').get(id=processamento_id)
+    return None
+
+
+class _SinalDeVida(threading.Thread):
+    """
+    Renova ProcessamentoRelatorio.sinal_vida_em enquanto o pedido roda
+
+    Fica em uma thread para não depender do ritmo do gerador: um lote
+    grande de importação ou a gravação do arquivo final podem passar
+    minutos sem chamar avancar. Se o worker morre, a thread morre junto e
+    o sinal para.
+    """
+
+    def __init__(self, processamento_id):
+        super().__init__(name=f'sinal-vida-{processamento_id}', daemon=True)
+        self.processamento_id = processamento_id
+        self._parar = threading.Event()
+
+    def run(self):
+        try:
+            while not self._parar.wait(settings.CRM_RELATORIOS_SINAL_VIDA):
+                try:
+                    ProcessamentoRelatorio.objects.filter(
+                        id=self.processamento_id, status='processando'
+                    ).update(sinal_vida_em=timezone.now())
+                except DatabaseError:
+                    # Banco ocupado (ex.: SQLite travado por um lote); tenta no próximo ciclo
+                    logger.warning(f"Sinal de vida do processamento {self.processamento_id} não gravado")
+        finally:
+            connection.close()
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def executar_processamento(processamento):
+    """
+    Gera o arquivo de um pedido reservado e registra o resultado
+
+    O resultado só é gravado se o pedido ainda está em processamento: um
+    pedido dado como interrompido (liberar_travados) não volta a concluído.
+
+    Args:
+        processamento: ProcessamentoRelatorio com status 'processando'
+    """
+    _, gerador = GERADORES[processamento.tipo]
+    registros = ProcessamentoRelatorio.objects.filter(id=processamento.id)
+    em_andamento = registros.filter(status='processando')
+
+    def avancar(linhas, total=None):
+        campos = {'linhas_processadas': F('linhas_processadas') + linhas}
+        if total is not None:
+            campos['total_linhas'] = total
+        registros.update(**campos)
+
+    sinal = _SinalDeVida(processamento.id)
+    sinal.start()
+    try:
+        with tempfile.TemporaryFile() as destino:
+            nome_arquivo = gerador(processamento, destino, avancar)
+            destino.seek(0)
+            processamento.arquivo.save(
+                f"{processamento.id}_{nome_arquivo}", File(destino), save=False
+            )
+    except Exception as e:
+        logger.exception(f"Erro no processamento {processamento.id}")
+        agora = timezone.now()
+        em_andamento.update(
+            status='erro',
+            erro=str(e),
+            concluido_em=agora,
+            expira_em=agora + timedelta(seconds=settings.CRM_RELATORIOS_TTL),
+        )
+        return
+    finally:
+        sinal.parar()
+
+    agora = timezone.now()
+    gravado = em_andamento.update(
+        status='concluido',
+        arquivo=processamento.arquivo.name,
+        concluido_em=agora,
+        expira_em=agora + timedelta(seconds=settings.CRM_RELATORIOS_TTL),
+    )
+    if not gravado:
+        logger.warning(f"Processamento {processamento.id} já não estava em andamento; resultado descartado")
+        processamento.arquivo.delete(save=False)
+
+
+def liberar_travados():
+    """
+    Marca como erro os pedidos em processamento sem sinal de vida há mais
+    de CRM_RELATORIOS_TEMPO_MAXIMO segundos (worker interrompido)
+
+    Não voltam para a fila: um pedido que derruba o worker derrubaria o
+    próximo também. Um novo pedido idêntico gera um processamento novo.
+
+    Returns:
+        int
+    """
+    agora = timezone.now()
+    limite = agora - timedelta(seconds=settings.CRM_RELATORIOS_TEMPO_MAXIMO)
+    return ProcessamentoRelatorio.objects.filter(status='processando', sinal_vida_em__lt=limite).update(
+        status='erro',
+        erro='Processamento interrompido; solicite novamente',
+        concluido_em=agora,
+        expira_em=agora + timedelta(seconds=settings.CRM_RELATORIOS_TTL),
+    )
+
+
+def limpar_expirados():
+    """
+    Remove os arquivos e registros de processamentos expirados
+
+    Returns:
+        int: Quantidade de processamentos removidos
+    """
+    expirados = ProcessamentoRelatorio.objects.filter(
+        status__in=['concluido', 'erro'],
+        expira_em__lt=timezone.now(),
+    )
+    removidos = 0
+    for processamento in expirados.iterator():
+        if processamento.arquivo:
+            processamento.arquivo.delete(save=False)
+        processamento.delete()
+        removidos += 1
+    return removidos
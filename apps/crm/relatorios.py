@@ -0,0 +1,342 @@
+"""
+Consultas agregadas para os relatórios do CRM
+"""
+
+from datetime import datetime, timedelta
+
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import ExtractHour, ExtractWeekDay, RowNumber
+from django.utils import timezone
+
+from .models import Atividade, Cliente, HistoricoEtapa
+
+
+def _horas(duracao):
+    """Converte um timedelta (ou None) em horas"""
+    if duracao is None:
+        return 0
+    return duracao.total_seconds() / 3600
+
+
+def _passagens(funil, usuario=None, data_inicio=None, data_fim=None):
+    historico = HistoricoEtapa.objects.filter(funil=funil)
+    if usuario:
+        historico = historico.filter(usuario=usuario)
+    if data_inicio:
+        historico = historico.filter(data_entrada__gte=data_inicio)
+    if data_fim:
+        historico = historico.filter(data_entrada__lte=data_fim)
+    return historico
+
+
+def tempos_por_etapa(funil, usuario=None, data_inicio=None, data_fim=None):
+    """
+    Calcula média, mediana e p90 do tempo de permanência em cada etapa
+
+    As passagens já encerradas são numeradas por duração dentro de cada
+    etapa com funções de janela, e só as linhas da mediana e do p90 saem
+    do banco.
+
+    Args:
+        funil: Instância de Funil
+        usuario: User (opcional) - filtra por usuário
+        data_inicio: DateTime (opcional) - passagens iniciadas a partir desta data
+        data_fim: DateTime (opcional) - passagens iniciadas até esta data
+
+    Returns:
+        dict: {etapa: {'media': float, 'mediana': float, 'p90': float, 'passagens': int}} em horas
+    """
+    fechadas = _passagens(funil, usuario, data_inicio, data_fim).filter(
+        data_saida__isnull=False
+    ).annotate(
+        duracao=ExpressionWrapper(F('data_saida') - F('data_entrada'), output_field=DurationField())
+    ).order_by()
+
+    tempos = {
+        linha['etapa']: {
+            'media': _horas(linha['media']),
+            'mediana': 0,
+            'p90': 0,
+            'passagens': linha['passagens'],
+        }
+        for linha in fechadas.values('etapa').annotate(media=Avg('duracao'), passagens=Count('id'))
+    }
+
+    # Percentil pelo método do posto mais próximo: a linha de posição
+    # ceil(corte * n) dentro da etapa, escolhida por ROW_NUMBER/COUNT OVER
+    distribuicao = fechadas.annotate(
+        posicao=Window(RowNumber(), partition_by=[F('etapa')], order_by=F('duracao').asc()),
+        total_etapa=Window(Count('id'), partition_by=[F('etapa')]),
+    )
+    cortes = (('mediana', 0.5), ('p90', 0.9))
+    filtro = Q()
+    for _, corte in cortes:
+        filtro |= Q(posicao__gte=F('total_etapa') * corte, posicao__lt=F('total_etapa') * corte + 1)
+    linhas = distribuicao.filter(filtro).values_list('etapa', 'duracao', 'posicao', 'total_etapa')
+    for etapa, duracao, posicao, total in linhas:
+        if etapa not in tempos:
+            continue
+        for chave, corte in cortes:
+            if total * corte <= posicao < total * corte + 1:
+                tempos[etapa][chave] = _horas(duracao)
+
+    return tempos
+
+
+def metricas_funil(funil, usuario=None, data_inicio=None, data_fim=None):
+    """
+    Gera as métricas de conversão e velocidade de um funil
+
+    Todas as contagens e tempos saem de agregações no banco sobre o
+    histórico de etapas e sobre a posição atual dos clientes; nenhum
+    cliente é carregado individualmente.
+
+    Args:
+        funil: Instância de Funil
+        usuario: User (opcional) - filtra por usuário
+        data_inicio: DateTime (opcional)
+        data_fim: DateTime (opcional)
+
+    Returns:
+        dict: {'etapas': [...], 'total_entradas': int, 'conversao_total': float}
+    """
+    entradas = dict(
+        _passagens(funil, usuario, data_inicio, data_fim)
+        .order_by()
+        .values('etapa')
+        .annotate(total=Count('cliente', distinct=True))
+        .values_list('etapa', 'total')
+    )
+
+    clientes = Cliente.objects.filter(funil=funil)
+    if usuario:
+        clientes = clientes.filter(usuario=usuario)
+    agora = timezone.now()
+    atuais = {
+        linha['etapa']: linha
+        for linha in clientes.order_by().values('etapa').annotate(
+            total=Count('id'),
+            valor=Sum('valor_estimado'),
+            entrada_mais_antiga=Min('data_entrada_etapa'),
+            entrada_mais_recente=Max('data_entrada_etapa'),
+        )
+    }
+
+    tempos = tempos_por_etapa(funil, usuario, data_inicio, data_fim)
+
+    etapas = []
+    for posicao, etapa in enumerate(funil.etapas):
+        entraram = entradas.get(etapa, 0)
+        proxima = funil.etapas[posicao + 1] if posicao + 1 < len(funil.etapas) else None
+        avancaram = entradas.get(proxima, 0) if proxima else None
+        atual = atuais.get(etapa, {})
+        tempo = tempos.get(etapa, {})
+        prazo = funil.get_prazo_etapa(etapa)
+
+        if avancaram is not None and entraram:
+            conversao = min(avancaram / entraram * 100, 100)
+            abandono = max(entraram - avancaram, 0)
+        else:
+            conversao = None
+            abandono = 0
+
+        esperada = funil.taxas_conversao.get(etapa) if proxima else None
+        etapas.append({
+            'etapa': etapa,
+            'entradas': entraram,
+            'avancaram': avancaram,
+            'conversao': conversao,
+            'conversao_esperada': esperada,
+            'diferenca_conversao': (
+                conversao - float(esperada)
+                if conversao is not None and esperada is not None else None
+            ),
+            'abandono': abandono,
+            'taxa_abandono': (abandono / entraram * 100) if entraram and proxima else 0,
+            'clientes_atuais': atual.get('total', 0),
+            'valor_atual': atual.get('valor') or 0,
+            'horas_mais_antigo': _horas(agora - atual['entrada_mais_antiga']) if atual else 0,
+            'tempo_medio': tempo.get('media', 0),
+            'tempo_mediana': tempo.get('mediana', 0),
+            'tempo_p90': tempo.get('p90', 0),
+            'passagens_concluidas': tempo.get('passagens', 0),
+            'prazo': prazo,
+            'acima_prazo': bool(prazo) and tempo.get('mediana', 0) > prazo,
+        })
+
+    primeira = etapas[0]['entradas'] if etapas else 0
+    ultima = etapas[-1]['entradas'] if etapas else 0
+    return {
+        'funil': funil,
+        'etapas': etapas,
+        'total_entradas': primeira,
+        'total_concluidos': ultima,
+        'conversao_total': (ultima / primeira * 100) if primeira else 0,
+    }
+
+
+def periodo_relatorio(request, padrao=30):
+    """
+    Lê o período dos parâmetros GET (periodo em dias ou data_inicio/data_fim)
+
+    Returns:
+        tuple: (data_inicio, data_fim, periodo)
+    """
+    periodo = request.GET.get('periodo', str(padrao))
+    data_fim = timezone.now()
+    try:
+        data_inicio = data_fim - timedelta(days=int(periodo))
+    except ValueError:
+        periodo = str(padrao)
+        data_inicio = data_fim - timedelta(days=padrao)
+
+    inicio_param = request.GET.get('data_inicio')
+    fim_param = request.GET.get('data_fim')
+    try:
+        if inicio_param:
+            data_inicio = timezone.make_aware(
+                datetime.strptime(inicio_param, '%Y-%m-%d')
+            )
+        if fim_param:
+            data_fim = timezone.make_aware(
+                datetime.strptime(fim_param, '%Y-%m-%d')
+            ) + timedelta(days=1)
+    except ValueError:
+        pass
+
+    return data_inicio, data_fim, periodo
+
+
+DIAS_SEMANA = ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb']
+
+
+def metricas_atividades(usuario, data_inicio=None, data_fim=None):
+    """
+    Agrega as atividades do usuário por tipo, resultado, dia da semana e hora
+
+    Uma única consulta agrupa por (tipo, resultado, dia, hora) com a
+    extração de data feita no banco, percorrendo o índice
+    (usuario, -data_atividade); os totais por dimensão são somados a partir
+    dessas linhas já agrupadas (no máximo tipos x resultados x 7 x 24).
+
+    Args:
+        usuario: User
+        data_inicio: DateTime (opcional)
+        data_fim: DateTime (opcional)
+
+    Returns:
+        dict: Totais gerais, rollups por dimensão e matriz dia x hora
+    """
+    atividades = Atividade.objects.filter(usuario=usuario)
+    if data_inicio:
+        atividades = atividades.filter(data_atividade__gte=data_inicio)
+    if data_fim:
+        atividades = atividades.filter(data_atividade__lt=data_fim)
+
+    linhas = atividades.order_by().annotate(
+        dia=ExtractWeekDay('data_atividade'),
+        hora=ExtractHour('data_atividade'),
+    ).values('tipo', 'resultado', 'dia', 'hora').annotate(
+        total=Count('id'),
+        duracao=Sum('duracao_minutos'),
+    )
+
+    tipos = dict(Atividade.TIPO_CHOICES)
+    resultados = dict(Atividade.RESULTADO_CHOICES)
+    por_tipo = {}
+    por_resultado = {}
+    por_dia = [{'dia': nome, 'total': 0, 'duracao': 0} for nome in DIAS_SEMANA]
+    por_hora = [{'hora': hora, 'total': 0, 'duracao': 0} for hora in range(24)]
+    mapa_calor = [[0] * 24 for _ in DIAS_SEMANA]
+    total = 0
+    duracao_total = 0
+
+    for linha in linhas:
+        quantidade = linha['total']
+        duracao = linha['duracao'] or 0
+        dia = linha['dia'] - 1
+        hora = linha['hora']
+
+        total += quantidade
+        duracao_total += duracao
+
+        tipo = por_tipo.setdefault(linha['tipo'], {
+            'tipo': tipos.get(linha['tipo'], linha['tipo']), 'total': 0, 'duracao': 0,
+        })
+        tipo['total'] += quantidade
+        tipo['duracao'] += duracao
+
+        chave_resultado = linha['resultado'] or ''
+        resultado = por_resultado.setdefault(chave_resultado, {
+            'resultado': resultados.get(linha['resultado'], 'Sem resultado'), 'total': 0, 'duracao': 0,
+        })
+        resultado['total'] += quantidade
+        resultado['duracao'] += duracao
+
+        por_dia[dia]['total'] += quantidade
+        por_dia[dia]['duracao'] += duracao
+        por_hora[hora]['total'] += quantidade
+        por_hora[hora]['duracao'] += duracao
+        mapa_calor[dia][hora] += quantidade
+
+    maximo_celula = max((max(linha) for linha in mapa_calor), default=0)
+    return {
+        'total': total,
+        'duracao_total': duracao_total,
+        'por_tipo': sorted(por_tipo.values(), key=lambda item: -item['total']),
+        'por_resultado': sorted(por_resultado.values(), key=lambda item: -item['total']),
+        'por_dia': por_dia,
+        'por_hora': por_hora,
+        'mapa_calor': [
+            {
+                'dia': DIAS_SEMANA[indice],
+                'total': por_dia[indice]['total'],
+                # Opacidade em texto com ponto decimal para uso direto no CSS
+                'horas': [
+                    {'total': valor, 'opacidade': f"{valor / maximo_celula:.2f}" if maximo_celula else '0'}
+                    for valor in horas
+                ],
+            }
+            for indice, horas in enumerate(mapa_calor)
+        ],
+        'maximo_celula': maximo_celula,
+    }
+
+
+def frequencia_contato_clientes(usuario, data_inicio, data_fim, limite=20):
+    """
+    Calcula a frequência de contato por cliente no período
+
+    Args:
+        usuario: User
+        data_inicio: DateTime
+        data_fim: DateTime
+        limite: int - quantidade de clientes retornados
+
+    Returns:
+        list: Clientes mais contatados com total, duração e contatos por semana
+    """
+    semanas = max((data_fim - data_inicio).total_seconds() / (7 * 24 * 3600), 1)
+    linhas = Atividade.objects.filter(
+        usuario=usuario,
+        data_atividade__gte=data_inicio,
+        data_atividade__lt=data_fim,
+    ).order_by().values('cliente_id', 'cliente__nome').annotate(
+        total=Count('id'),
+        duracao=Sum('duracao_minutos'),
+        primeiro=Min('data_atividade'),
+        ultimo=Max('data_atividade'),
+    ).order_by('-total', '-ultimo')[:limite]
+
+    return [
+        {
+            'cliente_id': linha['cliente_id'],
+            'nome': linha['cliente__nome'],
+            'total': linha['total'],
+            'duracao': linha['duracao'] or 0,
+            'primeiro': linha['primeiro'],
+            'ultimo': linha['ultimo'],
+            'por_semana': linha['total'] / semanas,
+        }
+        for linha in linhas
+    ]
@@ -0,0 +1,86 @@
+"""
+Reações a alterações nos modelos do CRM
+
+- Invalidação dos caches de análises quando clientes ou funis mudam
+- Atualização incremental do valor atual das metas
+- Armazenamento dos documentos por conteúdo e remoção dos arquivos sem
+  referência
+- Fila de extração do texto dos documentos para a busca
+- Remoção das partes gravadas de uploads em partes excluídos
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .armazenamento import guardar_conteudo, liberar_conteudo
+from .extracao import enfileirar_extracao
+from .metas import registrar_cliente, registrar_proposta
+from .models import Cliente, Documento, Funil, Proposta, UploadDocumento
+from .previsao import invalidar_dados
+from .uploads import remover_partes
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver([post_save, post_delete], sender=Funil)
+def invalidar_cache_usuario(sender, instance, **kwargs):
+    invalidar_dados(instance.usuario_id)
+
+
+@receiver(post_save, sender=Proposta)
+def metas_proposta_salva(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        registrar_proposta(instance, criada=created)
+
+
+@receiver(post_delete, sender=Proposta)
+def metas_proposta_excluida(sender, instance, **kwargs):
+    registrar_proposta(instance, excluida=True)
+
+
+@receiver(post_save, sender=Cliente)
+def metas_cliente_salvo(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        registrar_cliente(instance, criado=created)
+
+
+@receiver(post_delete, sender=Cliente)
+def metas_cliente_excluido(sender, instance, **kwargs):
+    registrar_cliente(instance, excluido=True)
+
+
+@receiver(pre_save, sender=Documento)
+def documento_conteudo(sender, instance, raw=False, **kwargs):
+    """Troca um arquivo recém-enviado pelo arquivo do seu conteúdo"""
+    if raw or not instance.arquivo or instance.arquivo._committed:
+        return
+    if instance.pk:
+        instance._arquivo_anterior = (
+            Documento.objects.filter(pk=instance.pk).values_list('arquivo', flat=True).first()
+        )
+    arquivo = instance.arquivo.file
+    nome, instance.hash, _ = guardar_conteudo(arquivo)
+    instance.tamanho = arquivo.size
+    instance.arquivo = nome
+
+
+@receiver(post_save, sender=Documento)
+def documento_arquivo_substituido(sender, instance, created, raw=False, **kwargs):
+    anterior = instance.__dict__.pop('_arquivo_anterior', None)
+    if anterior and anterior != instance.arquivo.name:
+        transaction.on_commit(lambda: liberar_conteudo(anterior))
+    if not raw and (created or anterior):
+        enfileirar_extracao(instance)
+
+
+@receiver(post_delete, sender=Documento)
+def documento_excluido(sender, instance, **kwargs):
+    nome = instance.arquivo.name
+    transaction.on_commit(lambda: liberar_conteudo(nome))
+
+
+@receiver(post_delete, sender=UploadDocumento)
+def upload_excluido(sender, instance, **kwargs):
+    # Também na exclusão em cascata do cliente ou do usuário
+    partes = instance.partes
+    transaction.on_commit(lambda: remover_partes(partes))
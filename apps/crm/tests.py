@@ -0,0 +1,366 @@
+"""
+Testes do CRM
+
+Orçamentos de desempenho das views (ver desempenho.ORCAMENTOS):
+
+Cada endpoint é chamado no banco de testes em duas bases geradas com a
+mesma semente (desempenho.TAMANHOS_ORCAMENTO clientes). O teste falha se
+um endpoint responde com erro, passa do limite de consultas ou de tempo,
+ou faz mais consultas na base grande do que o crescimento permitido (N+1).
+Com o DatabaseCache de settings.CACHES, as consultas ao cache têm
+orçamento próprio. As views cujo template ainda não está no repositório
+renderizam um template mínimo (TEMPLATES_MINIMOS) que percorre o mesmo
+contexto, para que as consultas adiadas dos QuerySets também contem.
+"""
+
+import hashlib
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from itertools import product
+
+import pandas as pd
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.conf import settings
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .analise import analisar_cliente, analisar_clientes
+from .armazenamento import storage_documentos
+from .desempenho import (
+    ORCAMENTOS, TAMANHOS_ORCAMENTO, medir_orcamento, preparar_base, requisicoes, violacoes_orcamento,
+)
+from .duplicados import mesclar_clientes
+from .metas import reconciliar_metas
+from .models import (
+    Cliente, Documento, Funil, HistoricoEtapa, Meta, Nota, PerfilRequisicao, Proposta, Tag, UploadDocumento,
+)
+from .perfilador import agendar_perfil, perfilar_requisicao
+
+
+class MidiaTemporariaTestCase(TestCase):
+    """Arquivos gravados pelo teste vão para um MEDIA_ROOT temporário"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        midia = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, midia, ignore_errors=True)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=midia))
+
+
+# Templates usados só quando o do repositório não existe: percorrem o
+# contexto como a página real, com as relações que ela exibe
+TEMPLATES_MINIMOS = {
+    'crm/dashboard.html': (
+        '{% for tarefa in tarefas_hoje %}{{ tarefa.titulo }}{% endfor %}'
+        '{% for atividade in atividades_recentes %}{{ atividade.titulo }} {{ atividade.cliente.nome }}{% endfor %}'
+        '{% for cliente in clientes_atrasados %}{{ cliente.nome }} {{ cliente.funil.nome }}{% endfor %}'
+        '{% for meta in metas_ativas %}{{ meta.nome }} {{ meta.percentual_atingido }}{% endfor %}'
+    ),
+    'crm/busca.html': (
+        '{% for cliente in clientes %}{{ cliente.nome }} {{ cliente.etapa }}{% endfor %}'
+        '{% for tarefa in tarefas %}{{ tarefa.titulo }}{% endfor %}'
+        '{% for item in documentos %}{{ item.documento.nome }} {{ item.documento.cliente.nome }}{% endfor %}'
+    ),
+    'crm/cliente/detalhes.html': (
+        '{{ cliente.nome }} {{ cliente.funil.nome }}'
+        '{% for tag in cliente.tags.all %}{{ tag.nome }}{% endfor %}'
+        '{% for atividade in atividades %}{{ atividade.titulo }}{% endfor %}'
+        '{% for tarefa in tarefas %}{{ tarefa.titulo }}{% endfor %}'
+        '{% for documento in documentos %}{{ documento.nome }}{% endfor %}'
+        '{% for nota in notas %}{{ nota.conteudo }}{% endfor %}'
+        '{% for proposta in propostas %}{{ proposta.titulo }}{% endfor %}'
+    ),
+}
+
+TEMPLATES_TESTES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+            ('django.template.loaders.locmem.Loader', TEMPLATES_MINIMOS),
+        ],
+    },
+}]
+
+
+@override_settings(TEMPLATES=TEMPLATES_TESTES, CRM_INSTRUMENTACAO_AMOSTRAGEM=0, CRM_PERFIL_RECARGA=60 * 60)
+class OrcamentosDesempenhoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pequena, cls.grande = (preparar_base(tamanho) for tamanho in sorted(TAMANHOS_ORCAMENTO))
+
+    def _medir(self, usuario, medir_tempo):
+        cliente_http = Client()
+        cliente_http.force_login(usuario)
+        # A primeira requisição do processo carrega os agendamentos de perfil
+        # (ver perfilador), o que não é custo do endpoint que estiver sendo medido
+        cliente_http.get(reverse('crm:api_tarefas_stats'))
+        return {
+            nome: medir_orcamento(cliente_http, usuario, metodo, url, dados, medir_tempo)
+            for nome, metodo, url, dados in requisicoes(usuario)
+        }
+
+    def test_endpoints_dentro_do_orcamento(self):
+        pequena = self._medir(self.pequena, medir_tempo=False)
+        grande = self._medir(self.grande, medir_tempo=True)
+        self.assertEqual(set(grande), set(ORCAMENTOS), 'todo endpoint com orçamento precisa ser exercitado')
+
+        for nome in ORCAMENTOS:
+            with self.subTest(endpoint=nome):
+                self.assertEqual(violacoes_orcamento(nome, pequena[nome], grande[nome]), [])
+
+
+class AnaliseClienteTests(TestCase):
+    """analisar_cliente (um cliente, a cada save) concorda com analisar_quadro (lote)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agora = timezone.now().replace(microsecond=0)
+        usuario = User.objects.create_user('analise', password='x')
+        # Prazo fracionário, etapa sem prazo (0) e etapa sem prazo configurado (PRAZO_PADRAO)
+        funil = Funil.objects.create(
+            nome='Vendas', usuario=usuario,
+            etapas=['Lead', 'Proposta', 'Negociação', 'Fechado'],
+            prazos={'Lead': 10.5, 'Proposta': 0, 'Fechado': 48},
+        )
+        etapas = ['Lead', 'Proposta', 'Negociação', 'Fechado', 'Removida do funil']
+        horas_na_etapa = [1, 11, 30, 100]
+        contatos = [None, timedelta(days=3), timedelta(days=20), timedelta(days=60)]
+        valores = [0, 25000, 60000]
+        Cliente.objects.bulk_create(
+            Cliente(
+                nome=f'Cliente {i}', usuario=usuario, funil=funil, etapa=etapa, valor_estimado=valor,
+                data_entrada_etapa=cls.agora - timedelta(hours=horas),
+                ultimo_contato=cls.agora - contato if contato else None,
+            )
+            for i, (etapa, horas, contato, valor) in enumerate(product(etapas, horas_na_etapa, contatos, valores))
+        )
+        cls.clientes = Cliente.objects.filter(usuario=usuario).select_related('funil')
+
+    def test_mesmo_resultado_que_o_lote(self):
+        lote = analisar_clientes(self.clientes, self.agora)
+        for cliente in self.clientes:
+            individual = analisar_cliente(cliente, self.agora)
+            linha = lote.loc[cliente.id]
+            with self.subTest(etapa=cliente.etapa, valor=cliente.valor_estimado,
+                              entrada=cliente.data_entrada_etapa, contato=cliente.ultimo_contato):
+                for coluna in ('horas_na_etapa', 'prazo', 'horas_restantes', 'horas_atraso'):
+                    self.assertAlmostEqual(individual[coluna], linha[coluna], places=6, msg=coluna)
+                for coluna in ('dentro_prazo', 'score', 'codigo_acao', 'prioridade', 'acao'):
+                    self.assertEqual(individual[coluna], linha[coluna], coluna)
+                revisar_em = linha['score_revisar_em']
+                self.assertEqual(individual['score_revisar_em'], None if pd.isna(revisar_em) else revisar_em)
+
+
+class MesclarClientesTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('mesclar', password='x')
+        self.funil = Funil.objects.create(nome='Vendas', usuario=self.usuario, etapas=['Lead', 'Proposta', 'Fechado'])
+        hoje = timezone.localdate()
+        self.meta = Meta.objects.create(
+            nome='Mês', usuario=self.usuario, valor_alvo=10000, origem_valor='propostas_clientes',
+            data_inicio=hoje - timedelta(days=1), data_fim=hoje + timedelta(days=1),
+        )
+        self.principal = Cliente.objects.create(
+            nome='Maria Souza', usuario=self.usuario, funil=self.funil, etapa='Lead',
+            email='maria@exemplo.com', empresa='Souza ME',
+        )
+        self.duplicado = Cliente.objects.create(
+            nome='Maria S.', usuario=self.usuario, funil=self.funil, etapa='Fechado', valor_estimado=1000,
+            email='maria.souza@exemplo.com', telefone='(11) 98765-4321', cidade='Campinas', empresa='Outra',
+        )
+        comum, so_duplicado = (Tag.objects.create(nome=nome, usuario=self.usuario) for nome in ('VIP', 'Indicação'))
+        self.principal.tags.add(comum)
+        self.duplicado.tags.add(comum, so_duplicado)
+
+        self.entrada_principal = self._passagem(self.principal, 'Lead', dias=10)
+        self._passagem(self.duplicado, 'Lead', dias=8, saida=2)
+        self._passagem(self.duplicado, 'Fechado', dias=2)
+        self.nota = Nota.objects.create(cliente=self.duplicado, usuario=self.usuario, conteudo='Ligar de manhã')
+        self.proposta = Proposta.objects.create(
+            numero='P-1', titulo='Plano anual', cliente=self.duplicado, usuario=self.usuario,
+            status='aceita', valor_total=500, data_aceite=timezone.now(), data_validade=hoje,
+        )
+
+    def _passagem(self, cliente, etapa, dias, saida=None):
+        agora = timezone.now()
+        return HistoricoEtapa.objects.create(
+            cliente=cliente, funil=self.funil, etapa=etapa, usuario=self.usuario,
+            data_entrada=agora - timedelta(days=dias), data_saida=agora - timedelta(days=saida) if saida else None,
+        )
+
+    def test_mesclar(self):
+        self.meta.refresh_from_db()
+        self.assertEqual(self.meta.valor_atual, 1500)
+
+        transferidos = mesclar_clientes(self.principal, self.duplicado)
+
+        self.assertFalse(Cliente.objects.filter(id=self.duplicado.id).exists())
+        self.nota.refresh_from_db()
+        self.proposta.refresh_from_db()
+        self.assertEqual((self.nota.cliente_id, self.proposta.cliente_id), (self.principal.id, self.principal.id))
+        self.assertEqual(set(self.principal.tags.values_list('nome', flat=True)), {'VIP', 'Indicação'})
+
+        self.principal.refresh_from_db()
+        self.assertEqual(self.principal.nome, 'Maria Souza')
+        self.assertEqual(self.principal.empresa, 'Souza ME')
+        self.assertEqual(self.principal.telefone, '(11) 98765-4321')
+        self.assertEqual(self.principal.cidade, 'Campinas')
+        self.assertEqual(self.principal.email_alternativo, 'maria.souza@exemplo.com')
+
+        # A passagem do duplicado por Lead repetiria a do principal; só Fechado é nova
+        self.assertEqual(transferidos['Histórico de Etapas'], 1)
+        historico = self.principal.historico_etapas.all()
+        self.assertEqual(sorted(historico.values_list('etapa', flat=True)), ['Fechado', 'Lead'])
+        self.assertEqual(historico.get(etapa='Lead').id, self.entrada_principal.id)
+        self.assertFalse(HistoricoEtapa.objects.filter(cliente_id=self.duplicado.id).exists())
+
+        # A proposta continua contando; o duplicado fechado sai da meta
+        self.meta.refresh_from_db()
+        self.assertEqual(self.meta.valor_atual, 500)
+        self.assertEqual(reconciliar_metas(Meta.objects.filter(id=self.meta.id)), [])
+
+
+class PerfiladorTests(MidiaTemporariaTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('perfilado', password='x')
+        cls.admin = User.objects.create_superuser('admin_perfil', password='x')
+
+    def _perfilar(self, caminho='/crm/'):
+        request = RequestFactory().get(caminho)
+        request.user = self.usuario
+        return perfilar_requisicao(request, lambda request: HttpResponse())
+
+    @override_settings(CRM_PERFIL_RECARGA=60)
+    def test_requisicao_sem_perfil_nao_consulta_o_banco(self):
+        # Com o DatabaseCache, ler os agendamentos do cache seria uma consulta
+        self._perfilar()
+        with self.assertNumQueries(0):
+            self._perfilar()
+
+    def test_agendamento_perfila_as_proximas_requisicoes(self):
+        agendar_perfil(self.usuario, self.admin, caminho='/crm/api/', requisicoes=2)
+        respostas = [self._perfilar(caminho) for caminho in ('/crm/', '/crm/api/a/', '/crm/api/b/', '/crm/api/c/')]
+        self.assertEqual(['X-CRM-Perfil' in resposta for resposta in respostas], [False, True, True, False])
+        self.assertEqual(PerfilRequisicao.objects.filter(usuario=self.usuario, solicitado_por=self.admin).count(), 2)
+
+
+@override_settings(CRM_INSTRUMENTACAO_AMOSTRAGEM=0)
+class UploadDocumentosTests(MidiaTemporariaTestCase):
+    """Protocolo de upload em partes (ver uploads)"""
+
+    CONTEUDO = b'0123456789'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario, cls.outro = (User.objects.create_user(nome, password='x') for nome in ('dono', 'outro'))
+        cls.clientes = {
+            usuario: Cliente.objects.create(
+                nome='Cliente', usuario=usuario, etapa='Lead',
+                funil=Funil.objects.create(nome='Vendas', usuario=usuario, etapas=['Lead']),
+            )
+            for usuario in (cls.usuario, cls.outro)
+        }
+
+    def _http(self, usuario=None):
+        cliente_http = Client()
+        cliente_http.force_login(usuario or self.usuario)
+        return cliente_http
+
+    def _iniciar(self, cliente_http, usuario=None, conteudo=CONTEUDO, sha256=None):
+        cliente = self.clientes[usuario or self.usuario]
+        return cliente_http.post(
+            reverse('crm:documento_upload_iniciar', args=[cliente.id]),
+            json.dumps({
+                'nome': 'contrato.txt', 'tamanho': len(conteudo),
+                'sha256': sha256 or hashlib.sha256(conteudo).hexdigest(),
+            }),
+            content_type='application/json',
+        )
+
+    def _parte(self, cliente_http, upload_id, inicio, fim, conteudo=CONTEUDO):
+        return cliente_http.put(
+            reverse('crm:documento_upload_parte', args=[upload_id]), conteudo[inicio:fim + 1],
+            content_type='application/octet-stream', HTTP_CONTENT_RANGE=f'bytes {inicio}-{fim}/{len(conteudo)}',
+        )
+
+    def _finalizar(self, cliente_http, upload_id):
+        return cliente_http.post(reverse('crm:documento_upload_finalizar', args=[upload_id]))
+
+    def _enviar(self, cliente_http, usuario=None):
+        """Upload completo em uma parte; devolve o Documento"""
+        upload_id = self._iniciar(cliente_http, usuario).json()['upload_id']
+        self._parte(cliente_http, upload_id, 0, len(self.CONTEUDO) - 1)
+        return Documento.objects.get(id=self._finalizar(cliente_http, upload_id).json()['documento_id'])
+
+    def test_partes_fora_de_ordem_ou_repetidas(self):
+        cliente_http = self._http()
+        upload_id = self._iniciar(cliente_http).json()['upload_id']
+
+        resposta = self._parte(cliente_http, upload_id, 4, 9)
+        self.assertEqual((resposta.status_code, resposta.json()['recebido']), (409, 0))
+        self.assertEqual(self._parte(cliente_http, upload_id, 0, 3).status_code, 200)
+        resposta = self._parte(cliente_http, upload_id, 0, 3)
+        self.assertEqual((resposta.status_code, resposta.json()['recebido']), (409, 4))
+        self.assertEqual(self._parte(cliente_http, upload_id, 4, 9).json()['recebido'], 10)
+
+        resposta = self._finalizar(cliente_http, upload_id)
+        self.assertEqual(resposta.status_code, 201)
+        documento = Documento.objects.get(id=resposta.json()['documento_id'])
+        with documento.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.CONTEUDO)
+
+    def test_sha256_divergente_recomeca_o_upload(self):
+        cliente_http = self._http()
+        upload_id = self._iniciar(cliente_http, sha256='0' * 64).json()['upload_id']
+        self._parte(cliente_http, upload_id, 0, 9)
+        partes = UploadDocumento.objects.get(id=upload_id).partes
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self._finalizar(cliente_http, upload_id)
+        self.assertEqual((resposta.status_code, resposta.json()['recebido']), (400, 0))
+        self.assertEqual(UploadDocumento.objects.get(id=upload_id).partes, [])
+        self.assertFalse(any(storage_documentos().exists(parte) for parte in partes))
+        self.assertFalse(Documento.objects.exists())
+
+    def test_atalho_so_para_conteudo_do_proprio_usuario(self):
+        documento_outro = self._enviar(self._http(self.outro), self.outro)
+
+        # O mesmo conteúdo de outro usuário não dispensa o envio
+        cliente_http = self._http()
+        resposta = self._iniciar(cliente_http)
+        self.assertEqual(resposta.status_code, 201)
+        self.assertNotIn('concluido', resposta.json())
+        self._parte(cliente_http, resposta.json()['upload_id'], 0, 9)
+        self._finalizar(cliente_http, resposta.json()['upload_id'])
+
+        # Já tendo o conteúdo, o documento é criado sem nenhum byte enviado
+        resposta = self._iniciar(cliente_http)
+        self.assertEqual(resposta.status_code, 201)
+        self.assertTrue(resposta.json()['concluido'])
+        documento = Documento.objects.get(id=resposta.json()['documento_id'])
+        self.assertEqual((documento.usuario, documento.arquivo.name), (self.usuario, documento_outro.arquivo.name))
+
+    def test_exclusao_do_cliente_remove_as_partes(self):
+        cliente_http = self._http()
+        upload_id = self._iniciar(cliente_http).json()['upload_id']
+        self._parte(cliente_http, upload_id, 0, 3)
+        partes = UploadDocumento.objects.get(id=upload_id).partes
+        self.assertTrue(partes and all(storage_documentos().exists(parte) for parte in partes))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clientes[self.usuario].delete()
+        self.assertFalse(UploadDocumento.objects.filter(id=upload_id).exists())
+        self.assertFalse(any(storage_documentos().exists(parte) for parte in partes))
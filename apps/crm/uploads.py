@@ -0,0 +1,228 @@
+"""
+Upload de documentos em partes, com retomada
+
+1. iniciar_upload recebe nome, tipo, tamanho e SHA-256 do arquivo. Se o
+   próprio usuário já tem um documento com esse conteúdo, o novo documento
+   é criado na hora, sem enviar nenhum byte. Conteúdo de outros usuários
+   não conta: bastaria conhecer o hash de um arquivo alheio para obtê-lo
+   (e a resposta revelaria quem o tem armazenado).
+2. receber_parte grava cada parte, em ordem, direto do corpo da requisição
+   para o storage (uploads/<id>/...), sem passar pelo request.FILES. Se a
+   conexão cai, o cliente consulta UploadDocumento.recebido e continua
+   daquele byte.
+3. finalizar_upload lê as partes em sequência para conferir o SHA-256; só
+   então o Documento é criado e as partes são removidas.
+
+Toda exclusão de UploadDocumento (cancelamento, finalização, exclusão do
+cliente) remove as partes do storage depois do commit (ver signals).
+"""
+
+import hashlib
+import io
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .armazenamento import conteudo_existente, storage_documentos
+from .models import Documento, UploadDocumento
+
+
+PREFIXO_PARTES = 'uploads'
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class _Partes(io.RawIOBase):
+    """Leitura sequencial das partes de um upload como um único arquivo"""
+
+    def __init__(self, storage, nomes):
+        super().__init__()
+        self.storage = storage
+        self.nomes = nomes
+        self._indice = 0
+        self._atual = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, posicao, whence=io.SEEK_SET):
+        # Só volta ao início (File.chunks faz seek(0) antes de ler)
+        if posicao != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('só é possível voltar ao início')
+        self._fechar_atual()
+        self._indice = 0
+        return 0
+
+    def readinto(self, buffer):
+        while self._indice < len(self.nomes):
+            if self._atual is None:
+                self._atual = self.storage.open(self.nomes[self._indice], 'rb')
+            dados = self._atual.read(len(buffer))
+            if dados:
+                buffer[:len(dados)] = dados
+                return len(dados)
+            self._fechar_atual()
+            self._indice += 1
+        return 0
+
+    def _fechar_atual(self):
+        if self._atual is not None:
+            self._atual.close()
+            self._atual = None
+
+    def close(self):
+        self._fechar_atual()
+        super().close()
+
+
+def _arquivo_partes(upload):
+    arquivo = File(io.BufferedReader(_Partes(storage_documentos(), upload.partes), 64 * 1024), name=upload.nome)
+    arquivo.size = upload.tamanho
+    return arquivo
+
+
+def remover_partes(nomes):
+    storage = storage_documentos()
+    for nome in nomes:
+        storage.delete(nome)
+
+
+def iniciar_upload(usuario, cliente, nome, tipo, descricao, tamanho, sha256):
+    """
+    Abre um upload em partes
+
+    Raises:
+        ValueError: dados inválidos
+
+    Returns:
+        tuple: (UploadDocumento, None), ou (None, Documento) se o usuário
+        já tinha um documento com esse conteúdo
+    """
+    nome = (nome or '').strip()
+    sha256 = (sha256 or '').lower()
+    if not nome:
+        raise ValueError('Informe o nome do documento')
+    if tipo not in dict(Documento.TIPO_CHOICES):
+        raise ValueError(f'Tipo "{tipo}" inválido')
+    if not isinstance(tamanho, int) or not 0 < tamanho <= settings.CRM_UPLOAD_TAMANHO_MAXIMO:
+        raise ValueError(f'O tamanho deve estar entre 1 e {settings.CRM_UPLOAD_TAMANHO_MAXIMO} bytes')
+    if not _SHA256.match(sha256):
+        raise ValueError('sha256 deve ter 64 dígitos hexadecimais')
+
+    dados = {'nome': nome[:200], 'tipo': tipo, 'descricao': descricao or None, 'cliente': cliente, 'usuario': usuario}
+    existente = None
+    if Documento.objects.filter(hash=sha256, usuario=usuario).exists():
+        existente = conteudo_existente(sha256, tamanho)
+    if existente:
+        # Nome já gravado é atribuído como texto: o signal não regrava o conteúdo
+        return None, Documento.objects.create(arquivo=existente, hash=sha256, tamanho=tamanho, **dados)
+    return UploadDocumento.objects.create(tamanho=tamanho, sha256=sha256, **dados), None
+
+
+def receber_parte(upload, inicio, fim, total, corpo, comprimento):
+    """
+    Grava a parte [inicio, fim] do upload, lida de corpo
+
+    Args:
+        corpo: objeto com read() (o próprio HttpRequest)
+        comprimento: Content-Length da requisição
+
+    Raises:
+        ValueError: intervalo inválido ou parte incompleta
+
+    Returns:
+        bool: False se inicio não é o próximo byte esperado; o cliente
+        deve retomar de upload.recebido (atualizado)
+    """
+    esperado = fim - inicio + 1
+    if total != upload.tamanho or inicio < 0 or esperado < 1 or fim >= total:
+        raise ValueError(f'Content-Range inválido para um arquivo de {upload.tamanho} bytes')
+    if esperado > settings.CRM_UPLOAD_PARTE_MAXIMA:
+        raise ValueError(f'Partes devem ter no máximo {settings.CRM_UPLOAD_PARTE_MAXIMA} bytes')
+    if comprimento != esperado:
+        raise ValueError('Content-Length não confere com o Content-Range')
+    if inicio != upload.recebido:
+        return False
+
+    storage = storage_documentos()
+    nome = storage.save(f'{PREFIXO_PARTES}/{upload.id}/{inicio:015d}', File(corpo))
+    if storage.size(nome) != esperado:
+        storage.delete(nome)
+        raise ValueError('Parte incompleta; envie-a novamente')
+
+    with transaction.atomic():
+        atual = UploadDocumento.objects.select_for_update().get(id=upload.id)
+        if atual.recebido != inicio:
+            # Outra requisição gravou esta parte antes
+            storage.delete(nome)
+            upload.recebido = atual.recebido
+            return False
+        atual.partes.append(nome)
+        atual.recebido = fim + 1
+        atual.save(update_fields=['partes', 'recebido', 'atualizado_em'])
+    upload.partes, upload.recebido = atual.partes, atual.recebido
+    return True
+
+
+def finalizar_upload(upload):
+    """
+    Confere o SHA-256 das partes e cria o Documento
+
+    Raises:
+        ValueError: faltam bytes ou o SHA-256 não confere (neste caso as
+            partes são descartadas e o upload recomeça do zero)
+
+    Returns:
+        Documento
+    """
+    if upload.recebido != upload.tamanho:
+        raise ValueError(f'Faltam {upload.tamanho - upload.recebido} bytes')
+
+    sha256 = hashlib.sha256()
+    with _arquivo_partes(upload) as arquivo:
+        for bloco in arquivo.chunks():
+            sha256.update(bloco)
+    if sha256.hexdigest() != upload.sha256:
+        partes = upload.partes
+        upload.partes, upload.recebido = [], 0
+        upload.save(update_fields=['partes', 'recebido', 'atualizado_em'])
+        transaction.on_commit(lambda: remover_partes(partes))
+        raise ValueError('O SHA-256 do arquivo recebido não confere; envie o arquivo novamente')
+
+    arquivo = _arquivo_partes(upload)
+    # Já conferido: armazenamento.guardar_conteudo não lê as partes de novo
+    arquivo.sha256 = upload.sha256
+    with arquivo, transaction.atomic():
+        documento = Documento.objects.create(
+            nome=upload.nome, tipo=upload.tipo, descricao=upload.descricao,
+            cliente_id=upload.cliente_id, usuario_id=upload.usuario_id, tamanho=upload.tamanho,
+            arquivo=arquivo,
+        )
+        # As partes saem do storage pelo signal de exclusão
+        upload.delete()
+    return documento
+
+
+def cancelar_upload(upload):
+    upload.delete()
+
+
+def limpar_uploads_abandonados():
+    """
+    Remove uploads sem partes novas há mais de settings.CRM_UPLOAD_VALIDADE segundos
+
+    Returns:
+        int: Quantidade de uploads removidos
+    """
+    limite = timezone.now() - timedelta(seconds=settings.CRM_UPLOAD_VALIDADE)
+    removidos = 0
+    for upload in UploadDocumento.objects.filter(atualizado_em__lt=limite).iterator():
+        cancelar_upload(upload)
+        removidos += 1
+    return removidos
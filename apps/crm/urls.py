@@ -13,6 +13,9 @@ urlpatterns = [
     
     # Clientes
     path('cadastro/', views.cadastro_cliente, name='cadastro_cliente'),
+    path('clientes/importar/', views.importar_clientes, name='importar_clientes'),
+    path('clientes/duplicados/', views.clientes_duplicados, name='clientes_duplicados'),
+    path('clientes/mesclar/', views.clientes_mesclar, name='clientes_mesclar'),
     path('cliente/<int:cliente_id>/', views.cliente_detalhes, name='cliente_detalhes'),
     path('editar-cliente/<int:cliente_id>/', views.editar_cliente, name='editar_cliente'),
     path('excluir-cliente/<int:cliente_id>/', views.excluir_cliente, name='excluir_cliente'),
@@ -36,6 +39,9 @@ urlpatterns = [
     
     # Documentos
     path('cliente/<int:cliente_id>/documento/', views.documento_upload, name='documento_upload'),
+    path('cliente/<int:cliente_id>/documento/upload/', views.documento_upload_iniciar, name='documento_upload_iniciar'),
+    path('documento/upload/<int:upload_id>/', views.documento_upload_parte, name='documento_upload_parte'),
+    path('documento/upload/<int:upload_id>/finalizar/', views.documento_upload_finalizar, name='documento_upload_finalizar'),
     path('documento/<int:documento_id>/download/', views.documento_download, name='documento_download'),
     path('documento/<int:documento_id>/excluir/', views.documento_excluir, name='documento_excluir'),
     
@@ -74,6 +80,10 @@ urlpatterns = [
     path('relatorios/atividades/', views.relatorio_atividades, name='relatorio_atividades'),
     path('relatorios/funil/', views.relatorio_funil, name='relatorio_funil'),
     path('relatorios/exportar/', views.relatorio_exportar, name='relatorio_exportar'),
+    path('relatorios/solicitar/', views.relatorio_solicitar, name='relatorio_solicitar'),
+    path('relatorios/processamentos/', views.processamentos_list, name='processamentos_list'),
+    path('relatorios/processamentos/<int:processamento_id>/', views.processamento_status, name='processamento_status'),
+    path('relatorios/processamentos/<int:processamento_id>/download/', views.processamento_download, name='processamento_download'),
     
     # Calendário
     path('calendario/', views.calendario, name='calendario'),
@@ -83,9 +93,16 @@ urlpatterns = [
     
     # Admin
     path('admin/', views.admin_crm, name='admin_crm'),
+    path('admin/consultas-lentas/limpar/', views.admin_consultas_lentas_limpar, name='admin_consultas_lentas_limpar'),
+    path('admin/perfis/agendar/', views.admin_perfil_agendar, name='admin_perfil_agendar'),
+    path('admin/perfis/cancelar/<int:usuario_id>/', views.admin_perfil_cancelar, name='admin_perfil_cancelar'),
+    path('admin/perfis/<int:perfil_id>/download/', views.admin_perfil_download, name='admin_perfil_download'),
     
     # API endpoints (para AJAX)
     path('api/cliente/<int:cliente_id>/info/', views.api_cliente_info, name='api_cliente_info'),
     path('api/tarefas/stats/', views.api_tarefas_stats, name='api_tarefas_stats'),
     path('api/pipeline/stats/', views.api_pipeline_stats, name='api_pipeline_stats'),
+    path('api/pipeline/previsao/', views.api_pipeline_previsao, name='api_pipeline_previsao'),
+    path('api/funil/<int:funil_id>/simulacao/', views.api_funil_simulacao, name='api_funil_simulacao'),
+    path('api/fila-acoes/', views.api_fila_acoes, name='api_fila_acoes'),
 ]
\ No newline at end of file
@@ -6,6 +6,9 @@ from datetime import timedelta
 from django.utils import timezone
 from decimal import Decimal, InvalidOperation
 
+import numpy as np
+import pandas as pd
+
 
 def calcular_horas_na_etapa(data_entrada):
     """
@@ -66,7 +69,7 @@ def verificar_prazo_etapa(cliente, funil):
     Verifica se um cliente está dentro do prazo da etapa
     
     Args:
-        cliente: Instância de CRMCliente
+        cliente: Instância de Cliente
         funil: Instância de Funil
         
     Returns:
@@ -77,10 +80,11 @@ def verificar_prazo_etapa(cliente, funil):
         }
     """
     horas_na_etapa = calcular_horas_na_etapa(cliente.data_entrada_etapa)
-    prazo_etapa = funil.prazos.get(cliente.etapa, 24)
+    prazo_etapa = funil.get_prazo_etapa(cliente.etapa)
     
     return {
-        'dentro_prazo': horas_na_etapa <= prazo_etapa,
+        # Prazo 0 significa etapa sem prazo (ver Cliente.esta_atrasado)
+        'dentro_prazo': prazo_etapa == 0 or horas_na_etapa <= prazo_etapa,
         'horas_restantes': prazo_etapa - horas_na_etapa,
         'horas_na_etapa': horas_na_etapa
     }
@@ -97,27 +101,22 @@ def gerar_estatisticas_funil(funil, usuario=None):
     Returns:
         dict: Estatísticas do funil
     """
-    from .models import CRMCliente
+    from .analise import analisar_clientes
+    from .models import Cliente
     
     # Filtrar clientes
-    clientes_query = CRMCliente.objects.filter(funil=funil)
+    clientes_query = Cliente.objects.filter(funil=funil)
     if usuario:
         clientes_query = clientes_query.filter(usuario=usuario)
     
-    total_clientes = clientes_query.count()
+    analise = analisar_clientes(clientes_query)
+    total_clientes = len(analise)
     
     # Contar clientes por etapa
-    clientes_por_etapa = {}
-    for etapa in funil.etapas:
-        count = clientes_query.filter(etapa=etapa).count()
-        clientes_por_etapa[etapa] = count
-    
-    # Calcular clientes atrasados
-    clientes_atrasados = 0
-    for cliente in clientes_query:
-        status = verificar_prazo_etapa(cliente, funil)
-        if not status['dentro_prazo']:
-            clientes_atrasados += 1
+    contagem = analise['etapa'].value_counts()
+    clientes_por_etapa = {etapa: int(contagem.get(etapa, 0)) for etapa in funil.etapas}
+    
+    clientes_atrasados = int((~analise['dentro_prazo']).sum())
     
     return {
         'total_clientes': total_clientes,
@@ -194,6 +193,77 @@ def validar_cnpj(cnpj):
     return int(cnpj[12]) == primeiro_digito and int(cnpj[13]) == segundo_digito
 
 
+# Pesos dos dígitos verificadores (ver validar_cpf e validar_cnpj)
+PESOS_CPF = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+PESOS_CNPJ = (
+    np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]),
+    np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]),
+)
+
+
+def _matriz_digitos(documentos, tamanho):
+    """Documentos do mesmo tamanho para uma matriz (n, tamanho) de inteiros"""
+    bruto = np.frombuffer(''.join(documentos).encode('ascii'), dtype=np.uint8)
+    return bruto.reshape(-1, tamanho).astype(np.int64) - ord('0')
+
+
+def digito_verificador_cpf(matriz, pesos):
+    """Dígito verificador de CPF para cada linha da matriz de dígitos"""
+    return (matriz[:, :len(pesos)] @ pesos) * 10 % 11 % 10
+
+
+def digito_verificador_cnpj(matriz, pesos):
+    """Dígito verificador de CNPJ para cada linha da matriz de dígitos"""
+    resto = (matriz[:, :len(pesos)] @ pesos) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+
+def _verificadores_cpf(matriz):
+    return (
+        (digito_verificador_cpf(matriz, PESOS_CPF[0]) == matriz[:, 9])
+        & (digito_verificador_cpf(matriz, PESOS_CPF[1]) == matriz[:, 10])
+    )
+
+
+def _verificadores_cnpj(matriz):
+    return (
+        (digito_verificador_cnpj(matriz, PESOS_CNPJ[0]) == matriz[:, 12])
+        & (digito_verificador_cnpj(matriz, PESOS_CNPJ[1]) == matriz[:, 13])
+    )
+
+
+def validar_documentos(documentos):
+    """
+    Valida vários CPFs/CNPJs de uma vez
+    
+    Mesmas regras de validar_cpf e validar_cnpj, calculadas para todos os
+    documentos com operações de matriz em vez de um laço por documento.
+    
+    Args:
+        documentos: lista (ou Series) de strings, formatadas ou não; None é aceito
+        
+    Returns:
+        tuple: (array bool com True para documentos válidos,
+                array com os documentos só com dígitos)
+    """
+    digitos = pd.Series(documentos, dtype=object).fillna('').astype(str)
+    digitos = digitos.str.replace(r'[^0-9]', '', regex=True)
+    normalizados = digitos.to_numpy(dtype=object)
+    validos = np.zeros(len(normalizados), dtype=bool)
+    tamanhos = digitos.str.len().to_numpy()
+    
+    for tamanho, verificar in ((11, _verificadores_cpf), (14, _verificadores_cnpj)):
+        posicoes = np.flatnonzero(tamanhos == tamanho)
+        if not len(posicoes):
+            continue
+        matriz = _matriz_digitos(normalizados[posicoes], tamanho)
+        # Sequências de um só dígito (000..., 111...) passam no cálculo mas são inválidas
+        repetidos = (matriz == matriz[:, :1]).all(axis=1)
+        validos[posicoes] = verificar(matriz) & ~repetidos
+    
+    return validos, normalizados
+
+
 def formatar_telefone(telefone):
     """
     Formata um telefone brasileiro
@@ -246,58 +316,30 @@ def gerar_relatorio_usuario(usuario):
     }
 
 
-def exportar_funil_csv(funil, usuario=None):
+def exportar_funil_csv(funil, usuario=None, colunas=None):
     """
     Exporta dados do funil para CSV
     
     Args:
         funil: Instância de Funil
         usuario: User (opcional) - filtra por usuário
+        colunas: list (opcional) - colunas de exportacao.EXPORTACOES['clientes']
         
     Returns:
-        str: Conteúdo CSV
+        iterator: Linhas CSV geradas sob demanda (ver exportacao.linhas_csv)
     """
-    import csv
-    from io import StringIO
-    from .models import CRMCliente
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Cabeçalho
-    writer.writerow([
-        'Nome', 'Telefone', 'Empresa', 'Ramo', 
-        'TPV Médio', 'Etapa', 'Horas na Etapa', 
-        'Data Entrada', 'Observações'
-    ])
-    
-    # Filtrar clientes
-    clientes_query = CRMCliente.objects.filter(funil=funil)
-    if usuario:
-        clientes_query = clientes_query.filter(usuario=usuario)
-    
-    # Adicionar linhas
-    for cliente in clientes_query:
-        horas = calcular_horas_na_etapa(cliente.data_entrada_etapa)
-        writer.writerow([
-            cliente.nome,
-            cliente.telefone or '',
-            cliente.empresa or '',
-            cliente.ramo_atividade or '',
-            f"{cliente.tpv_medio:.2f}",
-            cliente.etapa,
-            f"{horas:.1f}",
-            cliente.data_entrada_etapa.strftime('%d/%m/%Y %H:%M'),
-            cliente.obs_livre or ''
-        ])
+    from .exportacao import linhas_csv
     
-    return output.getvalue()
+    return linhas_csv('clientes', usuario, colunas, {'funil': funil})
 
 
 def calcular_tempo_medio_funil(funil, usuario=None):
     """
     Calcula o tempo médio que clientes levam em cada etapa
     
+    Usa as passagens já encerradas do histórico de etapas, agregadas
+    no banco (ver relatorios.tempos_por_etapa).
+    
     Args:
         funil: Instância de Funil
         usuario: User (opcional)
@@ -305,27 +347,13 @@ def calcular_tempo_medio_funil(funil, usuario=None):
     Returns:
         dict: Tempo médio por etapa em horas
     """
-    from .models import CRMCliente
-    from django.db.models import Avg
-    
-    clientes_query = CRMCliente.objects.filter(funil=funil)
-    if usuario:
-        clientes_query = clientes_query.filter(usuario=usuario)
+    from .relatorios import tempos_por_etapa
     
-    tempos_por_etapa = {}
-    
-    for etapa in funil.etapas:
-        clientes_etapa = clientes_query.filter(etapa=etapa)
-        if clientes_etapa.exists():
-            tempo_total = sum(
-                calcular_horas_na_etapa(c.data_entrada_etapa) 
-                for c in clientes_etapa
-            )
-            tempos_por_etapa[etapa] = tempo_total / clientes_etapa.count()
-        else:
-            tempos_por_etapa[etapa] = 0
-    
-    return tempos_por_etapa
+    tempos = tempos_por_etapa(funil, usuario)
+    return {
+        etapa: tempos.get(etapa, {}).get('media', 0)
+        for etapa in funil.etapas
+    }
 
 
 def notificar_prazo_vencido(cliente):
@@ -333,7 +361,7 @@ def notificar_prazo_vencido(cliente):
     Envia notificação quando prazo é vencido (placeholder para futuras implementações)
     
     Args:
-        cliente: Instância de CRMCliente
+        cliente: Instância de Cliente
     """
     # TODO: Implementar envio de email ou notificação push
     print(f"ALERTA: Cliente {cliente.nome} está com prazo vencido na etapa {cliente.etapa}")
@@ -347,26 +375,29 @@ def buscar_clientes_atrasados(usuario=None):
         usuario: User (opcional) - filtra por usuário
         
     Returns:
-        list: Lista de clientes atrasados com informações
+        list: Lista de clientes atrasados com informações, do maior atraso ao menor
     """
-    from .models import CRMCliente
+    from .analise import analisar_clientes
+    from .models import Cliente
     
-    clientes_query = CRMCliente.objects.all()
+    clientes_query = Cliente.objects.all()
     if usuario:
         clientes_query = clientes_query.filter(usuario=usuario)
     
-    clientes_atrasados = []
+    analise = analisar_clientes(clientes_query)
+    atrasados = analise[~analise['dentro_prazo']].sort_values('horas_atraso', ascending=False)
     
-    for cliente in clientes_query:
-        status = verificar_prazo_etapa(cliente, cliente.funil)
-        if not status['dentro_prazo']:
-            clientes_atrasados.append({
-                'cliente': cliente,
-                'horas_atraso': abs(status['horas_restantes']),
-                'horas_na_etapa': status['horas_na_etapa']
-            })
-    
-    return clientes_atrasados
+    clientes = Cliente.objects.select_related('funil').in_bulk(atrasados.index.tolist())
+    return [
+        {
+            'cliente': clientes[cliente_id],
+            'horas_atraso': horas_atraso,
+            'horas_na_etapa': horas_na_etapa
+        }
+        for cliente_id, horas_atraso, horas_na_etapa in zip(
+            atrasados.index, atrasados['horas_atraso'], atrasados['horas_na_etapa']
+        )
+    ]
 
 
 def sugerir_proxima_acao(cliente):
@@ -374,51 +405,42 @@ def sugerir_proxima_acao(cliente):
     Sugere próxima ação com base no status do cliente
     
     Args:
-        cliente: Instância de CRMCliente
+        cliente: Instância de Cliente
         
     Returns:
         dict: Sugestão de ação
     """
-    funil = cliente.funil
-    status = verificar_prazo_etapa(cliente, funil)
+    from .analise import analisar_cliente, descrever_acao
     
-    # Cliente está na última etapa
-    if cliente.etapa == funil.etapas[-1]:
-        return {
-            'prioridade': 'ALTA',
-            'acao': 'Registrar como cliente ativo',
-            'descricao': 'Cliente chegou na última etapa do funil'
-        }
+    linha = analisar_cliente(cliente)
+    return {
+        'prioridade': linha['prioridade'],
+        'acao': linha['acao'],
+        'descricao': descrever_acao(linha)
+    }
+
+
+def sugerir_proximas_acoes(clientes):
+    """
+    Sugere a próxima ação de vários clientes de uma vez
     
-    # Cliente está atrasado
-    if not status['dentro_prazo']:
-        horas_atraso = abs(status['horas_restantes'])
-        if horas_atraso > 72:  # Mais de 3 dias
-            return {
-                'prioridade': 'CRÍTICA',
-                'acao': 'Contato urgente ou marcar como perdido',
-                'descricao': f'Cliente atrasado há {horas_atraso:.0f} horas'
-            }
-        else:
-            return {
-                'prioridade': 'ALTA',
-                'acao': 'Entrar em contato',
-                'descricao': f'Cliente atrasado há {horas_atraso:.0f} horas'
-            }
-    
-    # Cliente está dentro do prazo
-    horas_restantes = status['horas_restantes']
-    if horas_restantes < 12:  # Menos de 12h para vencer
-        return {
-            'prioridade': 'MÉDIA',
-            'acao': 'Acompanhar progresso',
-            'descricao': f'Prazo vence em {horas_restantes:.0f} horas'
-        }
+    Args:
+        clientes: QuerySet de Cliente
+        
+    Returns:
+        dict: {cliente_id: sugestão no formato de sugerir_proxima_acao}
+    """
+    from .analise import analisar_clientes, descrever_acao
     
+    analise = analisar_clientes(clientes)
+    colunas = ['prioridade', 'acao', 'codigo_acao', 'horas_atraso', 'horas_restantes']
     return {
-        'prioridade': 'BAIXA',
-        'acao': 'Acompanhamento normal',
-        'descricao': f'{horas_restantes:.0f} horas restantes no prazo'
+        cliente_id: {
+            'prioridade': linha['prioridade'],
+            'acao': linha['acao'],
+            'descricao': descrever_acao(linha)
+        }
+        for cliente_id, linha in zip(analise.index, analise[colunas].to_dict('records'))
     }
 
 
@@ -426,38 +448,33 @@ def gerar_score_cliente(cliente):
     """
     Gera um score para priorização do cliente
     
+    Considera o valor estimado do negócio, o atraso na etapa e o
+    avanço no funil (ver analise.analisar_quadro).
+    
     Args:
-        cliente: Instância de CRMCliente
+        cliente: Instância de Cliente
         
     Returns:
         int: Score de 0 a 100
     """
-    score = 50  # Base
-    
-    # Valor do TPV
-    if cliente.tpv_medio > 50000:
-        score += 20
-    elif cliente.tpv_medio > 20000:
-        score += 10
+    from .analise import analisar_cliente
     
-    # Status do prazo
-    status = verificar_prazo_etapa(cliente, cliente.funil)
-    if not status['dentro_prazo']:
-        horas_atraso = abs(status['horas_restantes'])
-        if horas_atraso > 72:
-            score += 30
-        else:
-            score += 15
+    return int(analisar_cliente(cliente)['score'])
+
+
+def gerar_scores_clientes(clientes):
+    """
+    Gera o score de vários clientes de uma vez
     
-    # Posição no funil (mais avançado = maior score)
-    try:
-        posicao = cliente.funil.etapas.index(cliente.etapa)
-        total_etapas = len(cliente.funil.etapas)
-        score += int((posicao / total_etapas) * 20)
-    except (ValueError, ZeroDivisionError):
-        pass
+    Args:
+        clientes: QuerySet de Cliente
+        
+    Returns:
+        dict: {cliente_id: score}
+    """
+    from .analise import analisar_clientes
     
-    return min(score, 100)  # Máximo 100
+    return analisar_clientes(clientes)['score'].to_dict()
 
 
 def limpar_dados_telefone(telefone):
@@ -1,14 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
 from django.utils import timezone
 from django.contrib import messages
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db.models import Q, Count, Sum
 from datetime import datetime, timedelta
+import hmac
 import json
+import math
+import re
 from .models import *
 from .forms import *
+from .downloads import servir_arquivo
+from .duplicados import duplicados_usuario, mesclar_clientes
+from .exportacao import EXPORTACOES, linhas_csv
+from .analise import fila_acoes
+from .consultas_lentas import consultas_lentas, limpar_consultas_lentas
+from .exportacao_colunar import parquet_disponivel
+from .extracao import buscar_documentos
+from .importacao import CAMPOS_IMPORTACAO, COLUNAS_ESPECIAIS, xlsx_disponivel
+from .metas import reconciliar_metas
+from .metricas import TIPO_CONTEUDO, exposicao
+from .perfilador import PARAMETRO, agendar_perfil, assinar_perfil, cancelar_perfil, perfis_agendados
+from .previsao import AGRUPAMENTOS, MODOS, previsao_pipeline_cache, simular_funil_cache
+from .processamento import GERADORES, solicitar_processamento
+from .relatorios import (
+    metricas_funil, metricas_atividades, frequencia_contato_clientes, periodo_relatorio
+)
+from .uploads import cancelar_upload, finalizar_upload, iniciar_upload, receber_parte
 
 
 # ==================== DASHBOARD ====================
@@ -59,7 +82,7 @@ def dashboard(request):
     ).select_related('cliente')[:10]
     
     clientes_atrasados = []
-    for cliente in Cliente.objects.filter(usuario=request.user):
+    for cliente in Cliente.objects.filter(usuario=request.user).select_related('funil'):
         if cliente.esta_atrasado():
             clientes_atrasados.append(cliente)
     
@@ -103,6 +126,7 @@ def funil_vendas(request):
     """View principal - Kanban board"""
     funis_usuario = Funil.objects.filter(usuario=request.user, ativo=True)
     funis_selecionados_ids = request.GET.getlist('funis_selecionados')
+    ordenar = request.GET.get('ordenar', 'recentes')
     
     if not funis_selecionados_ids and funis_usuario.exists():
         funis_selecionados_ids = [str(f.id) for f in funis_usuario]
@@ -114,6 +138,8 @@ def funil_vendas(request):
                 funil=funil,
                 usuario=request.user
             ).select_related('funil').prefetch_related('tags')
+            if ordenar == 'score':
+                clientes = clientes.order_by('-score', '-data_entrada_etapa')
             
             contagem = {}
             for etapa in funil.etapas:
@@ -128,6 +154,7 @@ def funil_vendas(request):
         'todos_funis': funis_usuario,
         'funis_selecionados_ids': funis_selecionados_ids,
         'funis_para_exibir': funis_para_exibir,
+        'ordenar': ordenar,
     }
     
     return render(request, 'crm/funil.html', context)
@@ -159,6 +186,7 @@ def mover_cliente(request):
         cliente.etapa = nova_etapa
         cliente.data_entrada_etapa = timezone.now()
         cliente.save()
+        cliente.registrar_entrada_etapa()
         
         # Registrar atividade
         Atividade.objects.create(
@@ -202,6 +230,7 @@ def cadastro_cliente(request):
             
             cliente.save()
             form.save_m2m()  # Salvar tags
+            cliente.registrar_entrada_etapa()
             
             messages.success(request, f'Cliente {cliente.nome} cadastrado com sucesso!')
             return redirect('crm:funil_vendas')
@@ -211,6 +240,77 @@ def cadastro_cliente(request):
     return render(request, 'crm/cadastro_cliente.html', {'form': form})
 
 
+@login_required
+def importar_clientes(request):
+    """Importar clientes em massa de CSV/XLSX, processado em segundo plano"""
+    funis = Funil.objects.filter(usuario=request.user, ativo=True)
+    extensoes = ['.csv', '.xlsx'] if xlsx_disponivel() else ['.csv']
+    
+    if request.method == 'POST':
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo or not any(arquivo.name.lower().endswith(ext) for ext in extensoes):
+            messages.error(request, f'Envie um arquivo {" ou ".join(extensoes)}.')
+            return redirect('crm:importar_clientes')
+        
+        parametros = {'nome': arquivo.name}
+        funil_id = request.POST.get('funil')
+        if funil_id:
+            parametros['funil'] = _funil_do_usuario(request.user, funil_id).id
+        # O arquivo fica no storage até o worker terminar a importação
+        parametros['arquivo'] = default_storage.save(
+            f'importacoes/{request.user.id}/{arquivo.name}', arquivo
+        )
+        
+        solicitar_processamento(request.user, 'importacao_clientes', parametros)
+        messages.success(
+            request,
+            'Importação enviada para processamento. As linhas recusadas ficam no relatório gerado.'
+        )
+        return redirect('crm:processamentos_list')
+    
+    context = {
+        'funis': funis,
+        'extensoes': extensoes,
+        'colunas': CAMPOS_IMPORTACAO + COLUNAS_ESPECIAIS,
+    }
+    return render(request, 'crm/cliente/importar.html', context)
+
+
+@login_required
+def clientes_duplicados(request):
+    """Pares de clientes possivelmente duplicados, para revisão e mesclagem"""
+    pares = duplicados_usuario(request.user)
+    ids = {par['id_a'] for par in pares} | {par['id_b'] for par in pares}
+    clientes = Cliente.objects.filter(usuario=request.user).select_related('funil').in_bulk(ids)
+    
+    context = {
+        'pares': [
+            {**par, 'cliente_a': clientes[par['id_a']], 'cliente_b': clientes[par['id_b']]}
+            for par in pares
+            if par['id_a'] in clientes and par['id_b'] in clientes
+        ],
+    }
+    return render(request, 'crm/cliente/duplicados.html', context)
+
+
+@login_required
+@require_POST
+def clientes_mesclar(request):
+    """Mescla um cliente duplicado no cliente mantido"""
+    principal = get_object_or_404(
+        Cliente.objects.select_related('funil'), id=request.POST.get('principal'), usuario=request.user
+    )
+    duplicado = get_object_or_404(Cliente, id=request.POST.get('duplicado'), usuario=request.user)
+    
+    try:
+        mesclar_clientes(principal, duplicado)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f'Cliente {duplicado.nome} mesclado em {principal.nome}!')
+    return redirect('crm:clientes_duplicados')
+
+
 @login_required
 def cliente_detalhes(request, cliente_id):
     """Detalhes completos do cliente"""
@@ -244,11 +344,19 @@ def cliente_detalhes(request, cliente_id):
 def editar_cliente(request, cliente_id):
     """Editar cliente"""
     cliente = get_object_or_404(Cliente, id=cliente_id, usuario=request.user)
+    posicao_anterior = (cliente.funil_id, cliente.etapa)
     
     if request.method == 'POST':
         form = ClienteForm(request.POST, instance=cliente, user=request.user)
         if form.is_valid():
-            form.save()
+            cliente = form.save(commit=False)
+            mudou_etapa = (cliente.funil_id, cliente.etapa) != posicao_anterior
+            if mudou_etapa:
+                cliente.data_entrada_etapa = timezone.now()
+            cliente.save()
+            form.save_m2m()
+            if mudou_etapa:
+                cliente.registrar_entrada_etapa()
             messages.success(request, 'Cliente atualizado com sucesso!')
             return redirect('crm:cliente_detalhes', cliente_id=cliente.id)
     else:
@@ -287,8 +395,8 @@ def tarefas_list(request):
     status_filtro = request.GET.getlist('status_filtro', ['pendente', 'em_andamento'])
     prioridade_filtro = request.GET.getlist('prioridade_filtro')
     
-    # Tarefas base
-    tarefas = Tarefa.objects.filter(usuario=request.user)
+    # Tarefas base (o card mostra o nome do cliente)
+    tarefas = Tarefa.objects.filter(usuario=request.user).select_related('cliente')
     
     # Aplicar filtros
     if status_filtro:
@@ -560,9 +668,94 @@ def documento_upload(request, cliente_id):
 def documento_download(request, documento_id):
     """Download de documento"""
     documento = get_object_or_404(Documento, id=documento_id, cliente__usuario=request.user)
-    response = HttpResponse(documento.arquivo, content_type='application/octet-stream')
-    response['Content-Disposition'] = f'attachment; filename="{documento.nome}"'
-    return response
+    # Sem Last-Modified: criado_em não muda quando o arquivo do documento é trocado
+    return servir_arquivo(request, documento.arquivo, documento.nome)
+
+
+def _json_upload(upload, status=200, **extra):
+    return JsonResponse({
+        'success': True,
+        'upload_id': upload.id,
+        'recebido': upload.recebido,
+        'tamanho': upload.tamanho,
+        'url': reverse('crm:documento_upload_parte', args=[upload.id]),
+        **extra,
+    }, status=status)
+
+
+@login_required
+@require_POST
+def documento_upload_iniciar(request, cliente_id):
+    """API: Abre um upload de documento em partes (ver uploads)"""
+    cliente = get_object_or_404(Cliente, id=cliente_id, usuario=request.user)
+    try:
+        data = json.loads(request.body)
+        upload, documento = iniciar_upload(
+            request.user, cliente, data.get('nome'), data.get('tipo', 'documento'), data.get('descricao'),
+            data.get('tamanho'), data.get('sha256'),
+        )
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if documento is not None:
+        return JsonResponse({
+            'success': True,
+            'concluido': True,
+            'documento_id': documento.id,
+            'url': reverse('crm:documento_download', args=[documento.id]),
+        }, status=201)
+    return _json_upload(upload, tamanho_parte=settings.CRM_UPLOAD_PARTE_MAXIMA, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def documento_upload_parte(request, upload_id):
+    """
+    API: Upload em partes
+
+    GET devolve quantos bytes já foram gravados (para retomar), PUT grava
+    a parte indicada em Content-Range (bytes inicio-fim/total) e DELETE
+    cancela o upload.
+    """
+    upload = get_object_or_404(UploadDocumento, id=upload_id, usuario=request.user)
+    if request.method == 'GET':
+        return _json_upload(upload)
+    if request.method == 'DELETE':
+        cancelar_upload(upload)
+        return JsonResponse({'success': True})
+
+    intervalo = re.match(r'^bytes (\d+)-(\d+)/(\d+)$', request.headers.get('Content-Range', ''))
+    if intervalo is None:
+        return JsonResponse({'success': False, 'error': 'Informe Content-Range: bytes inicio-fim/total'}, status=400)
+    try:
+        gravada = receber_parte(
+            upload, *map(int, intervalo.groups()), request, int(request.META.get('CONTENT_LENGTH') or 0),
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    if not gravada:
+        return JsonResponse({
+            'success': False,
+            'error': f'Parte fora de ordem; continue a partir do byte {upload.recebido}',
+            'recebido': upload.recebido,
+        }, status=409)
+    return _json_upload(upload)
+
+
+@login_required
+@require_POST
+def documento_upload_finalizar(request, upload_id):
+    """API: Confere o SHA-256 das partes e cria o documento"""
+    upload = get_object_or_404(UploadDocumento, id=upload_id, usuario=request.user)
+    try:
+        documento = finalizar_upload(upload)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'recebido': upload.recebido}, status=400)
+    return JsonResponse({
+        'success': True,
+        'documento_id': documento.id,
+        'url': reverse('crm:documento_download', args=[documento.id]),
+    }, status=201)
 
 
 @login_required
@@ -646,6 +839,13 @@ def produto_editar(request, produto_id):
 
 
 # ==================== FUNIS ====================
+def _funil_do_usuario(usuario, funil_id):
+    """Funil do usuário pelo id vindo de GET/POST; 404 também para ids que não são números"""
+    if not str(funil_id).isdigit():
+        raise Http404('Funil inválido')
+    return get_object_or_404(Funil, id=funil_id, usuario=usuario)
+
+
 @login_required
 def gerenciar_funis(request):
     """Criar e gerenciar funis"""
@@ -735,15 +935,39 @@ def metas_list(request):
 @login_required
 def meta_criar(request):
     """Criar meta"""
-    messages.info(request, 'Funcionalidade em desenvolvimento')
-    return redirect('crm:metas_list')
+    if request.method == 'POST':
+        form = MetaForm(request.POST)
+        if form.is_valid():
+            meta = form.save(commit=False)
+            meta.usuario = request.user
+            meta.save()
+            # O valor inicial é calculado uma vez aqui; depois segue por deltas
+            reconciliar_metas(Meta.objects.filter(id=meta.id))
+            messages.success(request, 'Meta criada!')
+            return redirect('crm:metas_list')
+    else:
+        form = MetaForm()
+    
+    return render(request, 'crm/metas/form.html', {'form': form})
 
 
 @login_required
 def meta_editar(request, meta_id):
     """Editar meta"""
-    messages.info(request, 'Funcionalidade em desenvolvimento')
-    return redirect('crm:metas_list')
+    meta = get_object_or_404(Meta, id=meta_id, usuario=request.user)
+    
+    if request.method == 'POST':
+        form = MetaForm(request.POST, instance=meta)
+        if form.is_valid():
+            meta = form.save()
+            # Período ou origem podem ter mudado: recalcular esta meta
+            reconciliar_metas(Meta.objects.filter(id=meta.id))
+            messages.success(request, 'Meta atualizada!')
+            return redirect('crm:metas_list')
+    else:
+        form = MetaForm(instance=meta)
+    
+    return render(request, 'crm/metas/form.html', {'form': form, 'meta': meta})
 
 
 # ==================== TAGS ====================
@@ -785,23 +1009,167 @@ def relatorio_vendas(request):
 
 @login_required
 def relatorio_atividades(request):
-    """Relatório de atividades"""
-    messages.info(request, 'Funcionalidade em desenvolvimento')
-    return redirect('crm:relatorios')
+    """Relatório de atividades: volume e duração por tipo, resultado, dia e hora"""
+    data_inicio, data_fim, periodo = periodo_relatorio(request)
+    
+    context = {
+        'periodo': periodo,
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'metricas': metricas_atividades(request.user, data_inicio, data_fim),
+        'clientes_frequencia': frequencia_contato_clientes(request.user, data_inicio, data_fim),
+    }
+    
+    return render(request, 'crm/relatorios/atividades.html', context)
 
 
 @login_required
 def relatorio_funil(request):
-    """Relatório de funil"""
-    messages.info(request, 'Funcionalidade em desenvolvimento')
-    return redirect('crm:relatorios')
+    """Relatório de funil: conversão entre etapas, abandono e tempo por etapa"""
+    data_inicio, data_fim, periodo = periodo_relatorio(request)
+    funis = Funil.objects.filter(usuario=request.user, ativo=True)
+    
+    funil_id = request.GET.get('funil')
+    if funil_id:
+        funis_relatorio = [_funil_do_usuario(request.user, funil_id)]
+    else:
+        funis_relatorio = list(funis)
+    
+    relatorios_funil = [
+        metricas_funil(funil, request.user, data_inicio, data_fim)
+        for funil in funis_relatorio
+    ]
+    
+    context = {
+        'periodo': periodo,
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'funis': funis,
+        'funil_id': funil_id,
+        'relatorios_funil': relatorios_funil,
+    }
+    
+    return render(request, 'crm/relatorios/funil.html', context)
 
 
 @login_required
 def relatorio_exportar(request):
-    """Exportar relatórios"""
-    messages.info(request, 'Funcionalidade em desenvolvimento')
-    return redirect('crm:relatorios')
+    """Exportar dados em CSV por streaming (colunas selecionáveis)"""
+    dados = request.POST if request.method == 'POST' else request.GET
+    conjunto = dados.get('conjunto')
+    
+    if conjunto not in EXPORTACOES:
+        context = {
+            'exportacoes': EXPORTACOES,
+            'funis': Funil.objects.filter(usuario=request.user),
+            'parquet_disponivel': parquet_disponivel(),
+        }
+        return render(request, 'crm/relatorios/exportar.html', context)
+    
+    filtros = {}
+    funil_id = dados.get('funil')
+    if funil_id and conjunto == 'clientes':
+        filtros['funil'] = _funil_do_usuario(request.user, funil_id)
+    
+    linhas = linhas_csv(conjunto, request.user, dados.getlist('colunas'), filtros)
+    response = StreamingHttpResponse(linhas, content_type='text/csv; charset=utf-8')
+    nome_arquivo = f"{conjunto}_{timezone.localtime():%Y%m%d_%H%M}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+@login_required
+@require_POST
+def relatorio_solicitar(request):
+    """Enfileira um relatório/exportação para o worker de segundo plano"""
+    tipo = request.POST.get('tipo', 'exportacao')
+    parametros = {}
+    if request.POST.get('conjunto'):
+        parametros['conjunto'] = request.POST['conjunto']
+    colunas = request.POST.getlist('colunas')
+    if colunas:
+        parametros['colunas'] = colunas
+    funil_id = request.POST.get('funil')
+    if funil_id:
+        parametros['funil'] = _funil_do_usuario(request.user, funil_id).id
+    periodo = request.POST.get('periodo', '')
+    if periodo.isdigit():
+        parametros['periodo'] = int(periodo)
+    
+    try:
+        processamento, criado = solicitar_processamento(request.user, tipo, parametros)
+    except ValueError as e:
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('crm:relatorio_exportar')
+    
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'success': True,
+            'id': processamento.id,
+            'reaproveitado': not criado,
+            'status_url': reverse('crm:processamento_status', args=[processamento.id]),
+        })
+    
+    if criado:
+        messages.success(request, 'Relatório enviado para processamento.')
+    else:
+        messages.info(request, 'Um relatório idêntico já existe e foi reaproveitado.')
+    return redirect('crm:processamentos_list')
+
+
+@login_required
+def processamentos_list(request):
+    """Relatórios gerados em segundo plano pelo usuário"""
+    processamentos = ProcessamentoRelatorio.objects.filter(
+        usuario=request.user
+    ).order_by('-criado_em')[:50]
+    
+    context = {
+        'processamentos': processamentos,
+        'tipos': {tipo: rotulo for tipo, (rotulo, _) in GERADORES.items()},
+        'em_andamento': any(p.status in ('pendente', 'processando') for p in processamentos),
+    }
+    
+    return render(request, 'crm/relatorios/processamentos.html', context)
+
+
+@login_required
+def processamento_status(request, processamento_id):
+    """API: Progresso de um relatório em segundo plano"""
+    processamento = get_object_or_404(
+        ProcessamentoRelatorio, id=processamento_id, usuario=request.user
+    )
+    data = {
+        'id': processamento.id,
+        'status': processamento.status,
+        'progresso': processamento.progresso(),
+        'linhas_processadas': processamento.linhas_processadas,
+        'total_linhas': processamento.total_linhas,
+        'erro': processamento.erro,
+        'download_url': (
+            reverse('crm:processamento_download', args=[processamento.id])
+            if processamento.status == 'concluido' else None
+        ),
+    }
+    return JsonResponse(data)
+
+
+@login_required
+def processamento_download(request, processamento_id):
+    """Download do resultado de um relatório em segundo plano"""
+    processamento = get_object_or_404(
+        ProcessamentoRelatorio, id=processamento_id, usuario=request.user, status='concluido'
+    )
+    if not processamento.arquivo:
+        raise Http404('Arquivo não disponível')
+    return servir_arquivo(
+        request,
+        processamento.arquivo,
+        processamento.arquivo.name.rsplit('/', 1)[-1],
+        processamento.concluido_em or processamento.criado_em,
+    )
 
 
 # ==================== CALENDÁRIO ====================
@@ -824,6 +1192,7 @@ def calendario(request):
 def busca_global(request):
     """Busca global no CRM"""
     query = request.GET.get('q', '')
+    ordenar = request.GET.get('ordenar', 'relevancia')
     
     if not query:
         return redirect('crm:dashboard')
@@ -835,7 +1204,11 @@ def busca_global(request):
         Q(email__icontains=query) |
         Q(telefone__icontains=query) |
         Q(empresa__icontains=query)
-    )[:10]
+    )
+    if ordenar == 'score':
+        # Como no Kanban: os de maior score primeiro, antes de cortar em 10
+        clientes = clientes.order_by('-score', '-data_entrada_etapa')
+    clientes = clientes[:10]
     
     tarefas = Tarefa.objects.filter(
         usuario=request.user
@@ -844,10 +1217,24 @@ def busca_global(request):
         Q(descricao__icontains=query)
     )[:10]
     
+    # Texto dos documentos (índice de texto completo; ver extracao)
+    documentos = buscar_documentos(request.user, query)
+    clientes = list(clientes)
+    clientes_ids = {cliente.id for cliente in clientes}
+    for item in documentos:
+        cliente = item['documento'].cliente
+        if cliente.id not in clientes_ids:
+            clientes.append(cliente)
+            clientes_ids.add(cliente.id)
+    if ordenar == 'score':
+        clientes.sort(key=lambda cliente: (-cliente.score, -cliente.data_entrada_etapa.timestamp()))
+    
     context = {
         'query': query,
+        'ordenar': ordenar,
         'clientes': clientes,
         'tarefas': tarefas,
+        'documentos': documentos,
     }
     
     return render(request, 'crm/busca.html', context)
@@ -861,7 +1248,105 @@ def admin_crm(request):
         messages.error(request, 'Acesso negado. Apenas administradores.')
         return redirect('crm:dashboard')
     
-    return render(request, 'crm/admin.html', {})
+    agendados = perfis_agendados()
+    usuarios_agendados = User.objects.in_bulk(agendados.keys())
+    context = {
+        'consultas_lentas': consultas_lentas(),
+        'limite_consultas_lentas': settings.CRM_CONSULTAS_LENTAS_MS,
+        'perfis': PerfilRequisicao.objects.select_related('usuario')[:20],
+        'perfis_agendados': [
+            {'usuario': usuarios_agendados[usuario_id], **agendamento}
+            for usuario_id, agendamento in agendados.items()
+            if usuario_id in usuarios_agendados
+        ],
+    }
+    return render(request, 'crm/admin.html', context)
+
+
+@login_required
+@require_POST
+def admin_consultas_lentas_limpar(request):
+    """Esvazia o registro de consultas lentas deste processo"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Acesso negado. Apenas administradores.')
+        return redirect('crm:dashboard')
+    
+    limpar_consultas_lentas()
+    messages.success(request, 'Registro de consultas lentas limpo.')
+    return redirect('crm:admin_crm')
+
+
+@login_required
+@require_POST
+def admin_perfil_agendar(request):
+    """Agenda o perfil das próximas requisições de um usuário ou gera um link assinado"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Acesso negado. Apenas administradores.')
+        return redirect('crm:dashboard')
+    
+    alvo = User.objects.filter(username=request.POST.get('usuario', '').strip()).first()
+    caminho = request.POST.get('caminho', '').strip()
+    try:
+        requisicoes = min(max(int(request.POST.get('requisicoes') or 1), 1), 20)
+    except ValueError:
+        requisicoes = 1
+    if alvo is None:
+        messages.error(request, 'Usuário não encontrado.')
+    elif caminho and not caminho.startswith('/'):
+        messages.error(request, 'O caminho deve começar com "/".')
+    elif request.POST.get('acao') == 'link':
+        link = request.build_absolute_uri(caminho or reverse('crm:funil_vendas'))
+        token = assinar_perfil(alvo, request.user)
+        messages.success(
+            request, f'Link de perfil para {alvo.username}: {link}?{PARAMETRO}={token}'
+        )
+    else:
+        agendar_perfil(alvo, request.user, caminho, requisicoes)
+        messages.success(
+            request, f'Perfil agendado para as próximas {requisicoes} requisição(ões) de {alvo.username}.'
+        )
+    return redirect('crm:admin_crm')
+
+
+@login_required
+@require_POST
+def admin_perfil_cancelar(request, usuario_id):
+    """Cancela o perfil agendado de um usuário"""
+    if not request.user.is_superuser:
+        messages.error(request, 'Acesso negado. Apenas administradores.')
+        return redirect('crm:dashboard')
+    
+    cancelar_perfil(usuario_id)
+    messages.success(request, 'Perfil cancelado.')
+    return redirect('crm:admin_crm')
+
+
+@login_required
+def admin_perfil_download(request, perfil_id):
+    """Download das pilhas colapsadas de um perfil (flamegraph.pl, speedscope)"""
+    if not request.user.is_superuser:
+        raise Http404
+    
+    perfil = get_object_or_404(PerfilRequisicao, id=perfil_id)
+    return FileResponse(
+        perfil.arquivo.open('rb'),
+        as_attachment=True,
+        filename=perfil.arquivo.name.rsplit('/', 1)[-1],
+        content_type='text/plain; charset=utf-8',
+    )
+
+
+def metricas(request):
+    """Métricas do processo para o Prometheus (ver settings.CRM_METRICAS_TOKEN)"""
+    token = settings.CRM_METRICAS_TOKEN
+    autorizacao = request.headers.get('Authorization', '')
+    if token:
+        permitido = hmac.compare_digest(autorizacao.encode(), f'Bearer {token}'.encode())
+    else:
+        permitido = request.user.is_authenticated and request.user.is_superuser
+    if not permitido:
+        return HttpResponse('Acesso negado', status=403, content_type='text/plain; charset=utf-8')
+    return HttpResponse(exposicao(), content_type=TIPO_CONTEUDO)
 
 
 # ==================== API ENDPOINTS ====================
@@ -900,4 +1385,85 @@ def api_pipeline_stats(request):
         'total': clientes.count(),
         'valor_total': float(clientes.aggregate(Sum('valor_estimado'))['valor_estimado__sum'] or 0),
     }
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+
+@login_required
+def api_pipeline_previsao(request):
+    """API: Previsão ponderada do pipeline por período, funil e responsável"""
+    modo = request.GET.get('modo', 'probabilidade')
+    agrupamento = request.GET.get('agrupamento', 'mes')
+    if modo not in MODOS or agrupamento not in AGRUPAMENTOS:
+        return JsonResponse({'success': False, 'error': 'Parâmetros inválidos'}, status=400)
+    
+    # Superusuários podem ver a previsão consolidada de todos os usuários
+    usuario = request.user
+    funis = Funil.objects.filter(usuario=request.user)
+    if request.GET.get('escopo') == 'todos' and request.user.is_superuser:
+        usuario = None
+        funis = Funil.objects.all()
+    
+    funil_id = request.GET.get('funil')
+    if funil_id:
+        if not funil_id.isdigit():
+            return JsonResponse({'success': False, 'error': 'Parâmetros inválidos'}, status=400)
+        funil_id = get_object_or_404(funis, id=funil_id).id
+    
+    data = previsao_pipeline_cache(usuario, modo, agrupamento, funil_id)
+    return JsonResponse(data)
+
+
+@login_required
+def api_funil_simulacao(request, funil_id):
+    """
+    API: Simulação de Monte Carlo do funil (cenário "e se")
+    
+    Parâmetros GET: semanas (1-52), iteracoes (100-50000), semente (>= 0)
+    e, para testar cenários, taxa_<etapa> (0-100 %) e prazo_<etapa> (horas,
+    maior que zero).
+    """
+    funil = get_object_or_404(Funil, id=funil_id, usuario=request.user)
+    
+    try:
+        semanas = min(max(int(request.GET.get('semanas', 12)), 1), 52)
+        iteracoes = min(max(int(request.GET.get('iteracoes', 10000)), 100), 50000)
+        semente = int(request.GET['semente']) if request.GET.get('semente') else None
+        taxas = {
+            etapa: float(request.GET[f'taxa_{etapa}'])
+            for etapa in funil.etapas if request.GET.get(f'taxa_{etapa}')
+        }
+        prazos = {
+            etapa: float(request.GET[f'prazo_{etapa}'])
+            for etapa in funil.etapas if request.GET.get(f'prazo_{etapa}')
+        }
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parâmetros inválidos'}, status=400)
+    
+    if semente is not None and semente < 0:
+        return JsonResponse({'success': False, 'error': 'A semente deve ser maior ou igual a zero'}, status=400)
+    if not all(math.isfinite(taxa) and 0 <= taxa <= 100 for taxa in taxas.values()):
+        return JsonResponse({'success': False, 'error': 'As taxas devem estar entre 0 e 100'}, status=400)
+    if not all(math.isfinite(prazo) and prazo > 0 for prazo in prazos.values()):
+        return JsonResponse({'success': False, 'error': 'Os prazos devem ser maiores que zero'}, status=400)
+    
+    data = simular_funil_cache(funil, semanas, iteracoes, taxas, prazos, semente)
+    return JsonResponse(data)
+
+
+@login_required
+def api_fila_acoes(request):
+    """API: Fila priorizada de próximas ações do usuário"""
+    try:
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+        por_pagina = min(max(int(request.GET.get('por_pagina', 25)), 1), 100)
+        funil_id = int(request.GET['funil']) if request.GET.get('funil') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parâmetros inválidos'}, status=400)
+    
+    if funil_id is not None:
+        funil_id = get_object_or_404(Funil, id=funil_id, usuario=request.user).id
+    
+    data = fila_acoes(request.user, pagina, por_pagina, funil_id)
+    for item in data['itens']:
+        item['url'] = reverse('crm:cliente_detalhes', args=[item['cliente_id']])
+    return JsonResponse(data)
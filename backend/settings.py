@@ -23,11 +23,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro, para que a medição inclua os demais middlewares
+    'apps.crm.middleware.MetricasMiddleware',
+    'apps.crm.middleware.InstrumentacaoMiddleware',
+    'apps.crm.middleware.ConsultasLentasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.crm.middleware.PerfiladorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,6 +62,26 @@ DATABASES = {
     }
 }
 
+# Cache compartilhado por todos os processos (workers do gunicorn): as
+# versões que invalidam previsão, simulação e duplicados e os agendamentos
+# de perfil precisam valer em todos eles. Com REDIS_URL usa o Redis (pacote
+# redis); sem ele, a tabela crm_cache do banco (criada pela migração 0013).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'crm_cache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -81,6 +106,95 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'frontend/static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploads com o SHA-256 calculado durante o recebimento (documentos são
+# guardados pelo conteúdo, ver apps.crm.armazenamento)
+FILE_UPLOAD_HANDLERS = [
+    'apps.crm.armazenamento.HashMemoriaUploadHandler',
+    'apps.crm.armazenamento.HashTemporarioUploadHandler',
+]
+
+# Relatórios em segundo plano: por quanto tempo (segundos) um resultado
+# idêntico é reaproveitado em vez de gerado de novo, a cada quantos
+# segundos o worker renova o sinal de vida do pedido em processamento e
+# depois de quantos segundos sem sinal o pedido é dado como interrompido
+CRM_RELATORIOS_TTL = 60 * 60
+CRM_RELATORIOS_SINAL_VIDA = 30
+CRM_RELATORIOS_TEMPO_MAXIMO = 5 * 60
+
+# Previsão do pipeline: idade máxima (segundos) do resultado em cache;
+# alterações em clientes/funis já invalidam o cache antes disso
+CRM_PREVISAO_TTL = 15 * 60
+
+# Simulação do funil: o resultado só muda com o funil/clientes, que já
+# invalidam o cache (CACHES compartilhado); o TTL apenas libera o espaço
+# de cenários antigos
+CRM_SIMULACAO_TTL = 24 * 60 * 60
+
+# Duplicados de clientes: a varredura é refeita quando os clientes mudam
+# (versão no cache) ou depois deste tempo
+CRM_DUPLICADOS_TTL = 60 * 60
+
+# Instrumentação de requisições: fração medida (0 desliga, 1 mede todas),
+# publicada no cabeçalho Server-Timing e no logger apps.crm.instrumentacao,
+# e quantas das consultas mais lentas entram no log. A fração vem da
+# variável de ambiente CRM_INSTRUMENTACAO_AMOSTRAGEM (ex.: 1 ao investigar
+# uma lentidão local); os testes usam 0
+CRM_INSTRUMENTACAO_AMOSTRAGEM = float(os.environ.get('CRM_INSTRUMENTACAO_AMOSTRAGEM', 0.01))
+CRM_INSTRUMENTACAO_CONSULTAS_LENTAS = 3
+
+# Consultas acima deste tempo (ms) entram no registro de consultas lentas,
+# com o plano de execução, visível no painel admin do CRM (None desliga);
+# o registro guarda até CRM_CONSULTAS_LENTAS_MAXIMO consultas distintas
+CRM_CONSULTAS_LENTAS_MS = 100
+CRM_CONSULTAS_LENTAS_MAXIMO = 100
+
+# /metrics (formato Prometheus): com um token, o coletor envia
+# "Authorization: Bearer <token>"; sem token, só superusuários logados
+CRM_METRICAS_TOKEN = os.environ.get('CRM_METRICAS_TOKEN')
+
+# Perfil sob demanda (painel admin do CRM): validade (segundos) dos links
+# ?perfil= e dos agendamentos, intervalo (segundos) entre as amostras e a
+# cada quantos segundos cada processo relê os agendamentos do cache (um
+# agendamento feito no painel pode levar esse tempo para valer nos demais)
+CRM_PERFIL_VALIDADE = 60 * 60
+CRM_PERFIL_INTERVALO = 0.001
+CRM_PERFIL_RECARGA = 5
+
+# Downloads de documentos e relatórios: None serve o arquivo pelo Django
+# (em blocos, com Range); 'x-accel' (nginx) ou 'x-sendfile' (Apache)
+# entregam o arquivo ao proxy. No nginx, CRM_DOWNLOAD_ACCEL_PREFIXO é uma
+# location "internal" com alias para o MEDIA_ROOT
+CRM_DOWNLOAD_OFFLOAD = os.environ.get('CRM_DOWNLOAD_OFFLOAD') or None
+CRM_DOWNLOAD_ACCEL_PREFIXO = '/protegido/'
+
+# Upload de documentos em partes: tamanho máximo do arquivo e de cada parte
+# (bytes) e por quanto tempo (segundos) um upload parado é mantido
+CRM_UPLOAD_TAMANHO_MAXIMO = 1024 * 1024 * 1024
+CRM_UPLOAD_PARTE_MAXIMA = 16 * 1024 * 1024
+CRM_UPLOAD_VALIDADE = 24 * 60 * 60
+
+# Extração de texto dos documentos (comando extrair_textos): arquivos
+# maiores que CRM_EXTRACAO_TAMANHO_MAXIMO bytes são ignorados, o texto é
+# cortado em CRM_EXTRACAO_MAXIMO_CARACTERES e um documento em processamento
+# há mais de CRM_EXTRACAO_TEMPO_MAXIMO segundos volta para a fila
+CRM_EXTRACAO_TAMANHO_MAXIMO = 50 * 1024 * 1024
+CRM_EXTRACAO_MAXIMO_CARACTERES = 1_000_000
+CRM_EXTRACAO_TEMPO_MAXIMO = 15 * 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'apps.crm.instrumentacao': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
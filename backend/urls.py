@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
+from apps.crm.views import metricas
 from frontend.views import configuracoes_view, CustomLoginView, CadastroView, logout_view, alterar_senha
 
 urlpatterns = [
@@ -13,4 +14,5 @@ urlpatterns = [
     path('cadastro/', CadastroView.as_view(), name='cadastro'),
     path('configuracoes/', configuracoes_view, name='configuracoes'),
     path('alterar-senha/', alterar_senha, name='alterar_senha'),
+    path('metrics', metricas, name='metricas'),
 ]
\ No newline at end of file